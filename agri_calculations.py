@@ -3,9 +3,11 @@ Modulo Calcoli Agricoli - Parametri agrivoltaico (microclima rimosso)
 Analizza l'impatto dei pannelli FV sulle colture sottostanti tramite DLI
 """
 # sito enea per DLI mensile italiano: https://www.solaritaly.enea.it/DLI/DLIMappeEn.php#:~:text=Maps%20of%20Daily%20Light%20Integral%20in%20Italy.,moles%20per%20square%20meter%20per%20day:%20mol/(m%C2%B2%C2%B7d).
+import numpy as np
 import pandas as pd
 import math
 from config import HECTARE_M2
+from time_grid import simulation_days
 
 # ==================== COSTANTI AGRONOMICHE ====================
 
@@ -17,6 +19,8 @@ TRANSMISSION_COEFF = {
 
 PAR_FRACTION = 0.45  # PAR = 45% GHI
 
+PAR_TO_UMOL = 4.6  # µmol/J: conversione media da PAR in W/m² a µmol/m²/s
+
 DLI_REQUIREMENTS = {
     "Piante basse": {
         "Microgreens": {"DLI_min": 8, "DLI_opt": 12, "unit": "mol/m²/d"},
@@ -94,24 +98,135 @@ def calculate_shaded_fraction(shadow_df: pd.DataFrame, num_panels: int, superfic
     return shaded_fraction.clip(upper=1.0)
 
 
+def calculate_shaded_fraction_batch(sun_elevation: np.ndarray, sun_azimuth: np.ndarray,
+                                    params: dict) -> np.ndarray:
+    """
+    Frazione ombreggiata come calculate_shadow_projection + calculate_shaded_fraction,
+    vettoriale: tilt, azimuth, altezza e pitch in params possono essere array (n, 1)
+    e il risultato è (n × istanti)
+    """
+    tilt_rad = np.radians(params["tilt_pannello"])
+    area_pannello = params["lato_maggiore"] * params["lato_minore"]
+    H = params["altezza_suolo"] + params["lato_minore"] * np.sin(tilt_rad)
+
+    day = sun_elevation > 0
+    delta_azimuth = np.abs(sun_azimuth - params["azimuth_pannello"])
+    delta_azimuth = np.where(delta_azimuth > 180, 360 - delta_azimuth, delta_azimuth)
+
+    L_shadow = np.where(day, H / np.tan(np.radians(np.where(day, sun_elevation, 90))), 0)
+    W_shadow = (area_pannello * np.cos(tilt_rad)) / np.maximum(L_shadow, 1e-6)
+    W_shadow = W_shadow * np.abs(np.cos(np.radians(delta_azimuth)))
+    A_shadow = np.where(day, L_shadow * W_shadow, 0)
+
+    pitch = params["pitch_laterale"]
+    overlap_factor = np.where((L_shadow <= pitch) | (L_shadow == 0), 1.0, pitch / np.maximum(L_shadow, 1e-12))
+    shaded = A_shadow * params["num_panels_total"] * overlap_factor / (params["hectares"] * HECTARE_M2)
+    return np.minimum(shaded, 1.0)
+
+
 # ==================== DLI ====================
 
-def calculate_dli(ghi: pd.Series, shaded_fraction: pd.Series,
-                  transmission_under: float = TRANSMISSION_COEFF["under_panel"]) -> pd.Series:
+def calculate_dli_samples(ghi: pd.Series, shaded_fraction: pd.Series,
+                          transmission_under: float = TRANSMISSION_COEFF["under_panel"],
+                          weights: pd.Series = None) -> pd.Series:
     """
-    Calcola il DLI giornaliero in mol/m²/d considerando la frazione di ombra
+    Contributo di ogni campione al DLI [mol/m²]: la somma su una giornata è il suo DLI
+    weights: durata [h] di ogni campione (senza pesi campioni orari)
     """
+    hours = 1.0 if weights is None else weights
     # PAR disponibile
     par_total = ghi * PAR_FRACTION
     par_weighted = par_total * (shaded_fraction * transmission_under + (1 - shaded_fraction) * 1.0)
 
-    # Conversione da W/m² a µmol/m²/s: fattore medio 4.6
-    par_umol = par_weighted * 4.6
+    # Conversione da W/m² a µmol/m²/s
+    par_umol = par_weighted * PAR_TO_UMOL
 
-    # DLI giornaliero (µmol/m²/s → mol/m²/d)
-    dli_mol = (par_umol.sum() * 3600) / 1e6
+    # µmol/m²/s per la durata del campione → mol/m²
+    return par_umol * hours * 3600 / 1e6
 
-    return dli_mol
+
+def calculate_dli(ghi: pd.Series, shaded_fraction: pd.Series,
+                  transmission_under: float = TRANSMISSION_COEFF["under_panel"],
+                  weights: pd.Series = None) -> pd.Series:
+    """
+    Calcola il DLI giornaliero in mol/m²/d considerando la frazione di ombra
+    weights: durata [h] di ogni campione (senza pesi campioni orari)
+    """
+    return calculate_dli_samples(ghi, shaded_fraction, transmission_under, weights).sum()
+
+def calculate_dli_raster(params: dict, ghi: pd.Series, solpos: pd.DataFrame,
+                         resolution: int = 96,
+                         transmission_under: float = TRANSMISSION_COEFF["under_panel"],
+                         weights: pd.Series = None) -> np.ndarray:
+    """
+    Calcola la distribuzione spaziale del DLI sul terreno (mol/m²/d per cella)
+    
+    La griglia copre l'area del terreno della vista 3D (campo × 1.5, centrato):
+    righe da nord (z negativa) a sud, colonne da ovest a est. Per ogni ora di
+    luce l'ombra di ciascun pannello è la sua proiezione orizzontale traslata
+    di H/tan(elevazione) in direzione opposta al sole; il test di appartenenza
+    usa il pannello più vicino del reticolo, così ore × celle si valutano in
+    un unico passaggio vettoriale. weights è la durata [h] di ogni campione
+    (senza pesi campioni orari).
+    """
+    n_cols = int(params["num_panels_per_row"])
+    n_rows = int(params["num_rows"])
+    pitch = params["pitch_laterale"]
+    row_spacing = params["lato_minore"] + params["carreggiata"]
+    tilt_rad = math.radians(params["tilt_pannello"])
+
+    # Estensione del terreno (coerente con la scena 3D)
+    larghezza = n_cols * pitch
+    profondita = n_rows * row_spacing
+    ext_x, ext_z = larghezza * 1.5, profondita * 1.5
+    if ext_x >= ext_z:
+        nx, nz = resolution, max(8, round(resolution * ext_z / ext_x))
+    else:
+        nx, nz = max(8, round(resolution * ext_x / ext_z)), resolution
+
+    x = (np.arange(nx) + 0.5) / nx * ext_x - ext_x / 2
+    z = (np.arange(nz) + 0.5) / nz * ext_z - ext_z / 2
+
+    # Solo ore di luce: PAR di ogni campione in mol/m²
+    elev = solpos["elevation"].to_numpy(dtype=float)
+    day = elev > 0
+    if not day.any():
+        return np.zeros((nz, nx))
+    hours = np.ones(len(elev)) if weights is None else np.asarray(weights, dtype=float)
+    par_mol = ghi.to_numpy(dtype=float)[day] * hours[day] * PAR_FRACTION * PAR_TO_UMOL * 3600 / 1e6
+
+    # Spostamento dell'ombra del centro pannello per ogni ora
+    H = params["altezza_suolo"] + (params["lato_minore"] / 2) * math.sin(tilt_rad)
+    L_shadow = H / np.tan(np.radians(elev[day]))
+    sun_az = np.radians(solpos["azimuth"].to_numpy(dtype=float)[day])
+    off_x = -L_shadow * np.sin(sun_az)
+    off_z = L_shadow * np.cos(sun_az)
+
+    # Punto del pannello che proietta ombra su ogni cella: (ore, nz, nx)
+    qx = x[None, None, :] - off_x[:, None, None]
+    qz = z[None, :, None] - off_z[:, None, None]
+
+    start_x = -larghezza / 2 + pitch / 2
+    start_z = -profondita / 2 + row_spacing / 2
+    col = np.rint((qx - start_x) / pitch)
+    row = np.rint((qz - start_z) / row_spacing)
+    in_layout = (col >= 0) & (col < n_cols) & (row >= 0) & (row < n_rows)
+
+    # Coordinate locali rispetto al pannello più vicino (rotazione azimutale)
+    dx = qx - (start_x + col * pitch)
+    dz = qz - (start_z + row * row_spacing)
+    theta = math.radians(params["azimuth_pannello"] - 180)
+    u = dx * math.cos(theta) - dz * math.sin(theta)
+    w = dx * math.sin(theta) + dz * math.cos(theta)
+
+    shaded = (
+        in_layout
+        & (np.abs(u) <= params["lato_maggiore"] / 2)
+        & (np.abs(w) <= params["lato_minore"] * math.cos(tilt_rad) / 2)
+    )
+    transmission = np.where(shaded, transmission_under, 1.0)
+
+    return np.tensordot(par_mol, transmission, axes=1)
 
 def evaluate_crop_suitability(dli_value: float, crop_name: str) -> dict:
     """
@@ -157,6 +272,32 @@ def evaluate_crop_suitability(dli_value: float, crop_name: str) -> dict:
 
 # ==================== FUNZIONE PRINCIPALE ====================
 
+def assemble_agri_results(times: pd.DatetimeIndex, shadow_df: pd.DataFrame,
+                          shaded_fraction: pd.Series, crop_eval: dict,
+                          weights: pd.Series = None, period_hours: float = None) -> dict:
+    """
+    Compone il dizionario risultati agricoli dagli output dei singoli calcoli
+    Con weights e period_hours l'ombreggiamento medio è sull'intero periodo (di notte nullo)
+    """
+    return {
+        "times": times,
+        "shaded_fraction": shaded_fraction,
+        "shadow_length_m": shadow_df['shadow_length_m'],
+        "shadow_area_m2": shadow_df['shadow_area_m2'],
+        "shaded_fraction_avg": shaded_fraction.mean() if weights is None
+        else (shaded_fraction * weights).sum() / period_hours,
+        "shadow_area_max_m2": shadow_df['shadow_area_m2'].max(),
+        "shadow_length_max_m": shadow_df['shadow_length_m'].max(),
+        "DLI_mol_m2_day": crop_eval["DLI"],
+        "crop_status": crop_eval["status"],
+        "crop_status_color": crop_eval["color"],
+        "crop_light_adequacy_pct": crop_eval["percentage"],
+        "DLI_min": crop_eval["DLI_min"],
+        "DLI_opt": crop_eval["DLI_opt"],
+        "unit": crop_eval["unit"]
+    }
+
+
 def calculate_all_agri(params: dict, pv_results: dict) -> dict:
 
     ghi = pv_results['GHI_Wm2']
@@ -180,25 +321,11 @@ def calculate_all_agri(params: dict, pv_results: dict) -> dict:
         params.get('pitch_laterale', 1.0)  # usa il pitch definito nel sidebar
     )
 
-    # Calcolo DLI giornaliero
-    dli_value = calculate_dli(ghi, shaded_fraction)
+    # Calcolo DLI giornaliero (media sul periodo)
+    dli_value = calculate_dli(ghi, shaded_fraction, weights=pv_results.get("sample_weights_h"))
+    dli_value /= len(simulation_days(params))  # come lo stadio "dli" della pipeline
 
     # Valutazione coltura
     crop_eval = evaluate_crop_suitability(dli_value, params.get("crops", "Cereali"))
 
-    return {
-        "times": pv_results['times'],
-        "shaded_fraction": shaded_fraction,
-        "shadow_length_m": shadow_df['shadow_length_m'],
-        "shadow_area_m2": shadow_df['shadow_area_m2'],
-        "shaded_fraction_avg": shaded_fraction.mean(),
-        "shadow_area_max_m2": shadow_df['shadow_area_m2'].max(),
-        "shadow_length_max_m": shadow_df['shadow_length_m'].max(),
-        "DLI_mol_m2_day": crop_eval["DLI"],
-        "crop_status": crop_eval["status"],
-        "crop_status_color": crop_eval["color"],
-        "crop_light_adequacy_pct": crop_eval["percentage"],
-        "DLI_min": crop_eval["DLI_min"],
-        "DLI_opt": crop_eval["DLI_opt"],
-        "unit": crop_eval["unit"]
-    }
+    return assemble_agri_results(pv_results['times'], shadow_df, shaded_fraction, crop_eval)
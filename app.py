@@ -1,13 +1,31 @@
 import streamlit as st
+import profiling
 from config import CSS, PAGE_CONFIG
 from sidebar import sidebar_inputs
-from calculations import calculate_all_pv
-from metrics import display_metrics
+from compute_pool import compute
+from metrics import display_metrics, display_performance_panel
 from maps import display_map_section
 from guida import show_pv_guide
-from agri_calculations import calculate_all_agri
+from period_analysis import display_period_analysis, display_yield_ensemble
+from uncertainty_analysis import display_uncertainty
+from sensitivity_analysis import display_sensitivity
+from pareto_analysis import display_pareto
 from visualization_3d import display_3d_field  # <--- AGGIUNGI QUESTA RIGA
 
+# ==================== SEZIONI (FRAGMENT) ====================
+# Ogni sezione riceve come argomenti i dati da cui dipende: un'interazione al suo
+# interno riesegue solo la sezione, con gli argomenti dell'ultimo run completo
+guide_section = st.fragment(show_pv_guide)
+map_section = st.fragment(display_map_section)
+metrics_section = st.fragment(display_metrics)
+period_section = st.fragment(display_period_analysis)
+ensemble_section = st.fragment(display_yield_ensemble)
+uncertainty_section = st.fragment(display_uncertainty)
+sensitivity_section = st.fragment(display_sensitivity)
+pareto_section = st.fragment(display_pareto)
+field3d_section = st.fragment(display_3d_field)
+
+
 def setup_page():
     """Configura la pagina Streamlit e applica CSS globale"""
     st.set_page_config(**PAGE_CONFIG)
@@ -16,27 +34,33 @@ def setup_page():
 def main():
     """Funzione principale dell'applicazione"""
     setup_page()
+    profiling.start_run()
 
     # --- Collect user inputs ---
     params = sidebar_inputs()
     
-    show_pv_guide()
-    
-    # --- PV calculations ---
-    results = calculate_all_pv(params)
-
-    # --- Agricultural calculations (requires PV results) ---
-    agri_results = calculate_all_agri(params, results)
+    guide_section()
     
-    # Merge agricultural results into PV results
-    results["agri_results"] = agri_results
+    # --- PV + agricultural calculations (only stages whose inputs changed) ---
+    results = compute(params, st.session_state.setdefault("pipeline_memo", {}))
     
     # --- Map and metrics ---
-    display_map_section(params)
-    display_metrics(results, params)
+    map_section(params)
+    metrics_section(results, params)
+    uncertainty_section(params)
+    sensitivity_section(params)
+    pareto_section(params)
+
+    # --- Multi-day simulation and P50/P90 synthetic years (background jobs) ---
+    period_section(params)
+    ensemble_section(params)
 
     # --- 3D Visualization ---
-    display_3d_field(params)  # <--- AGGIUNGI QUESTA RIGA
+    field3d_section(params, results)
+
+    # --- Performance (APV_PROFILING=1) ---
+    if perf := profiling.finish_run():
+        display_performance_panel(perf)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Modulo Atlante - Irradianza cielo sereno e posizione solare annuali per comune
+Posizione solare e irradianza Ineichen dipendono solo da luogo e istante: per
+ogni comune del gazetteer (oggi i 112 capoluoghi di provincia distribuiti)
+vengono precalcolate una volta le 8760 ore di un anno di riferimento (UTC) in un
+unico file float16 in memory-map, con layout (comune, grandezza, ora) così l'anno
+di un sito è un blocco contiguo. A runtime l'anno di un comune è una vista sul
+file, senza calcoli; si copiano solo gli istanti richiesti, convertiti in float64
+perché i calcoli a valle in float16 perderebbero precisione.
+
+Costruzione (dopo il gazetteer):
+    python -m atlas build [--year 2025]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pvlib
+from config import ATLAS_CONFIG
+from gazetteer import load_gazetteer
+
+VARIABLES = ("ghi", "dni", "dhi", "elevation", "azimuth")
+HOURS = 8760
+
+
+def _meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def gazetteer_digest() -> str:
+    """Impronta dei comuni nel gazetteer: l'atlante vale solo per lo stesso elenco"""
+    index = load_gazetteer()
+    ident = "|".join(f"{k},{la:.4f},{lo:.4f}" for k, la, lo in zip(index["keys"], index["lat"], index["lon"]))
+    return hashlib.sha1(ident.encode()).hexdigest()[:16]
+
+
+# ==================== COSTRUZIONE ====================
+
+def compute_site_year(lat: float, lon: float, year: int) -> np.ndarray:
+    """Grandezze orarie (VARIABLES × 8760) per un sito nell'anno di riferimento"""
+    times = pd.date_range(f"{year}-01-01", periods=HOURS, freq="h", tz="UTC")
+    solpos = pvlib.solarposition.get_solarposition(times, lat, lon)
+    clearsky = pvlib.location.Location(lat, lon).get_clearsky(times, model="ineichen", solar_position=solpos)
+    return np.stack([
+        clearsky["ghi"], clearsky["dni"], clearsky["dhi"],
+        solpos["elevation"], solpos["azimuth"]
+    ])
+
+
+def build_atlas(path: str = ATLAS_CONFIG["path"], year: int = ATLAS_CONFIG["year"]) -> int:
+    """Scrive l'atlante per tutti i comuni del gazetteer; ritorna il numero di comuni"""
+    if pd.Timestamp(f"{year}-12-31").dayofyear != 365:
+        raise ValueError("L'anno di riferimento non deve essere bisestile")
+
+    index = load_gazetteer()
+    n_sites = len(index["keys"])
+    tmp_path = path + ".tmp.npy"
+    data = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16,
+                                     shape=(n_sites, len(VARIABLES), HOURS))
+    for i in range(n_sites):
+        data[i] = compute_site_year(float(index["lat"][i]), float(index["lon"][i]), year)
+        if (i + 1) % 100 == 0:
+            print(f"{i + 1}/{n_sites} comuni")
+    data.flush()
+    del data
+
+    os.replace(tmp_path, path)
+    with open(_meta_path(path), "w", encoding="utf-8") as f:
+        json.dump({"year": year, "variables": VARIABLES, "sites": n_sites,
+                   "gazetteer": gazetteer_digest()}, f)
+    return n_sites
+
+
+# ==================== LETTURA ====================
+
+@lru_cache(maxsize=1)
+def load_atlas(path: str = ATLAS_CONFIG["path"]):
+    """Atlante in memory-map, o None se manca o non corrisponde al gazetteer attuale"""
+    try:
+        with open(_meta_path(path), encoding="utf-8") as f:
+            meta = json.load(f)
+        data = np.load(path, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+    if meta["gazetteer"] != gazetteer_digest() or data.shape[0] != meta["sites"]:
+        return None
+    return {"data": data, "meta": meta}
+
+
+def site_year(site_id: int):
+    """Vista (VARIABLES × 8760, float16) sull'anno del comune, senza copia; None se assente"""
+    atlas = load_atlas()
+    if atlas is None or not 0 <= site_id < atlas["data"].shape[0]:
+        return None
+    return atlas["data"][site_id]
+
+
+def hour_of_year(times: pd.DatetimeIndex):
+    """
+    Ora dell'anno di riferimento per ogni istante (stesso giorno dell'anno e ora UTC)
+
+    Il 29 febbraio degli anni bisestili usa il 28; None se gli istanti non cadono
+    allo scoccare dell'ora.
+    """
+    utc = times.tz_convert("UTC")
+    if (utc.minute != 0).any() or (utc.second != 0).any():
+        return None
+    doy = utc.dayofyear.to_numpy()
+    doy = doy - (utc.is_leap_year & (doy >= 60))
+    return (doy - 1) * 24 + utc.hour.to_numpy()
+
+
+def site_series(site_id: int, times: pd.DatetimeIndex):
+    """
+    Posizione solare e irradianza del comune sugli istanti dati
+    Le ore consecutive sono una vista convertita in float64 con una sola copia;
+    le ore sparse (es. solo ore di luce) si selezionano prima, con una seconda
+    copia del solo sottoinsieme in float16.
+
+    Returns:
+        tuple: (solpos con elevation/azimuth/zenith, irradianza ghi/dni/dhi),
+               o None se il comune non è nell'atlante o gli istanti non sono orari
+    """
+    year = site_year(site_id)
+    idx = hour_of_year(times) if year is not None else None
+    if idx is None:
+        return None
+
+    if len(idx) and idx[-1] - idx[0] == len(idx) - 1 and (np.diff(idx) == 1).all():
+        block = year[:, idx[0]:idx[-1] + 1]  # ore consecutive: vista, copiata solo da astype
+    else:
+        block = year[:, idx]
+    values = dict(zip(VARIABLES, block.astype(np.float64)))
+
+    solpos = pd.DataFrame({
+        "elevation": values["elevation"],
+        "azimuth": values["azimuth"],
+        "zenith": 90 - values["elevation"],
+    }, index=times)
+    irradiance = pd.DataFrame({k: values[k] for k in ("ghi", "dni", "dhi")}, index=times)
+    return solpos, irradiance
+
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Atlante annuale di irradianza per comune")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Precalcola l'atlante dai comuni del gazetteer")
+    build.add_argument("-o", "--output", default=ATLAS_CONFIG["path"])
+    build.add_argument("--year", type=int, default=ATLAS_CONFIG["year"])
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_atlas(args.output, args.year)
+        print(f"{count} comuni scritti in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
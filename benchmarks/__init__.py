@@ -0,0 +1,3 @@
+"""
+Benchmark del simulatore: eseguibili offline con `python -m benchmarks.<modulo>`
+"""
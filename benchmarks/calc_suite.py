@@ -0,0 +1,331 @@
+"""
+Benchmark calcoli PV e agricoli - tempi a scala realistica con baseline JSON
+
+Scenari: giornata oraria, anno orario, anno a 15 minuti; layout da 1k e 10k pannelli;
+1000 anni sintetici per le bande P50/P90; Monte Carlo sui coefficienti (2000 campioni);
+sensibilità Morris e Sobol sui parametri di progetto; fronte di Pareto dei layout;
+superficie di risposta annuale (costruzione e singola interpolazione); anno a 15 minuti
+simulato per intero e attraverso 24 giornate tipiche; pipeline annuale su griglia
+uniforme e solo ore di luce; totali di una finestra di date dall'archivio a somme
+cumulative contro il filtro e la somma della serie giornaliera.
+Tutto offline: irradianza cielo sereno e coordinate fisse, nessun geocoding.
+
+Uso:
+    python -m benchmarks.calc_suite run [--output FILE] [--repeat N] [--only PREFISSO]
+    python -m benchmarks.calc_suite compare BASELINE [CORRENTE] [--threshold 0.25]
+
+"compare" senza CORRENTE esegue la suite al momento; esce con codice 1 se un caso
+è più lento della baseline oltre la soglia relativa (sul tempo minimo, il meno
+rumoroso) e di almeno --min-delta-ms in assoluto.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pvlib
+
+from agri_calculations import calculate_all_agri, calculate_shaded_fraction, calculate_shadow_projection
+from benchmarks.common import sample_params
+from calculations import build_time_index, calculate_all_pv, calculate_max_panels
+from config import HECTARE_M2
+from stochastic import yield_ensemble
+from timeseries_store import window_totals
+from optimizer import default_bounds, optimize_layout
+from pipeline import run_pipeline
+from representative_days import simulate_representative
+from response_surface import build_surface, interpolate
+from simulation import simulate_days, simulate_period
+from sensitivity import default_ranges, run_sensitivity
+from uncertainty import default_spec, run_uncertainty
+from visualization_3d import create_3d_field_visualization
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_BASELINE = os.path.join(BASELINE_DIR, "calc_suite.json")
+
+# ==================== SCENARI ====================
+
+PERIODS = {
+    "1d": {"giorni": 1, "freq": "1h"},
+    "1y_1h": {"giorni": 365, "freq": "1h"},
+    "1y_15min": {"giorni": 365, "freq": "15min"},
+}
+
+LAYOUTS = {
+    "1k": {"num_panels_per_row": 40, "num_rows": 25, "hectares": 2.0},
+    "10k": {"num_panels_per_row": 100, "num_rows": 100, "hectares": 20.0},
+}
+
+
+def _params(period: str = "1d", layout: str = "1k") -> dict:
+    return sample_params(data=pd.Timestamp("2025-01-01").date(), **PERIODS[period], **LAYOUTS[layout])
+
+
+def _pv_case(period: str):
+    params = _params(period)
+    return (lambda: calculate_all_pv(params)), {"n_samples": len(build_time_index(params))}
+
+
+def _agri_case(period: str):
+    params = _params(period)
+    pv = calculate_all_pv(params)
+    return (lambda: calculate_all_agri(params, pv)), {"n_samples": len(pv["times"])}
+
+
+def _shadow_case(period: str):
+    params = _params(period)
+    solpos = calculate_all_pv(params)["solpos"]
+
+    def run():
+        return calculate_shadow_projection(
+            params["lato_maggiore"], params["lato_minore"], params["tilt_pannello"],
+            params["azimuth_pannello"], solpos["elevation"], solpos["azimuth"],
+            params["altezza_suolo"]
+        )
+
+    return run, {"n_samples": len(solpos)}
+
+
+def _shaded_fraction_case(period: str, layout: str):
+    params = _params(period, layout)
+    solpos = calculate_all_pv(params)["solpos"]
+    shadow_df = calculate_shadow_projection(
+        params["lato_maggiore"], params["lato_minore"], params["tilt_pannello"],
+        params["azimuth_pannello"], solpos["elevation"], solpos["azimuth"],
+        params["altezza_suolo"]
+    )
+
+    def run():
+        return calculate_shaded_fraction(
+            shadow_df, params["num_panels_total"], params["hectares"] * HECTARE_M2,
+            params["pitch_laterale"]
+        )
+
+    return run, {"n_samples": len(shadow_df), "n_panels": params["num_panels_total"]}
+
+
+def _max_panels_case(layout: str):
+    params = _params(layout=layout)
+    return (lambda: calculate_max_panels(params)), {"n_panels": params["num_panels_total"]}
+
+
+def _field3d_case(layout: str):
+    params = _params(layout=layout)
+    return (lambda: create_3d_field_visualization(params)), {"n_panels": params["num_panels_total"]}
+
+
+def _ensemble_case(years: int):
+    params = _params()
+    return (lambda: yield_ensemble(params, years, seed=0)), {"years": years}
+
+
+def _uncertainty_case(period: str, samples: int):
+    params = _params(period)
+    spec, memo = default_spec(params), {}
+    run_uncertainty(params, spec, memo, 1)  # stadi della pipeline già in memo, come nell'app
+    return (lambda: run_uncertainty(params, spec, memo, samples, seed=0)), {"samples": samples}
+
+
+def _sensitivity_case(period: str, method: str):
+    params = _params(period)
+    ranges = default_ranges(params)
+    run_sensitivity(params, ranges, method, 10, workers=1)  # dati del sito già in cache, come nell'app
+    return (lambda: run_sensitivity(params, ranges, method, seed=0, workers=1)), {"method": method}
+
+
+def _optimizer_case(period: str):
+    params = _params(period)
+    bounds = default_bounds(params)
+    optimize_layout(params, bounds, seed=0)  # dati del sito in cache; memo nuovo a ogni chiamata
+    return (lambda: optimize_layout(params, bounds, seed=0)), {}
+
+
+def _surface_case(step: str):
+    params = _params("1d")
+    surface = build_surface(params)
+    if step == "build":
+        return (lambda: build_surface(params)), {}
+    return (lambda: interpolate(surface, 33.3, 187.5, 4.2)), {}
+
+
+def _year_case(mode: str):
+    params = _params("1d")
+    start = params["data"]
+    if mode == "full":
+        return (lambda: simulate_days(params, start, 365, freq="15min")), {"days": 365}
+    return (lambda: simulate_representative(params, start, 365, k=24, freq="15min")), {"days": 365, "k": 24}
+
+
+def _grid_case(period: str, grid: str):
+    params = {**_params(period), "griglia": grid}
+    return (lambda: run_pipeline(params, {})), {"n_samples": len(run_pipeline(params, {})["times"])}
+
+
+def _window_case(mode: str):
+    params = {**_params("1d"), "griglia": "luce"}
+    result = simulate_period(params, params["data"], 365, freq="15min")
+    start, end = pd.Timestamp("2025-04-01").date(), pd.Timestamp("2025-09-30").date()
+    if mode == "store":
+        return (lambda: window_totals(result["store"], start, end)), {"days": 365}
+    daily = result["daily"]
+    return (lambda: daily.loc[start:end, ["energy_total_kWh", "POA_kWh_m2", "DLI_mol_m2_day"]].sum()), {"days": 365}
+
+
+# nome caso -> costruttore (restituisce funzione da cronometrare e metadati)
+CASES = {
+    **{f"calculate_all_pv[{p}]": (lambda p=p: _pv_case(p)) for p in PERIODS},
+    **{f"calculate_all_agri[{p}]": (lambda p=p: _agri_case(p)) for p in PERIODS},
+    **{f"calculate_shadow_projection[{p}]": (lambda p=p: _shadow_case(p)) for p in PERIODS},
+    **{f"calculate_shaded_fraction[{p},{l}]": (lambda p=p, l=l: _shaded_fraction_case(p, l))
+       for p in ("1d", "1y_15min") for l in LAYOUTS},
+    **{f"calculate_max_panels[{l}]": (lambda l=l: _max_panels_case(l)) for l in LAYOUTS},
+    **{f"create_3d_field_visualization[{l}]": (lambda l=l: _field3d_case(l)) for l in LAYOUTS},
+    "yield_ensemble[1000y]": lambda: _ensemble_case(1000),
+    **{f"run_uncertainty[{p},2000]": (lambda p=p: _uncertainty_case(p, 2000)) for p in ("1d", "1y_1h")},
+    **{f"run_sensitivity[{m},{p}]": (lambda p=p, m=m: _sensitivity_case(p, m))
+       for m in ("morris", "sobol") for p in ("1d", "1y_1h")},
+    **{f"optimize_layout[{p}]": (lambda p=p: _optimizer_case(p)) for p in ("1d", "1y_1h")},
+    **{f"response_surface[{s}]": (lambda s=s: _surface_case(s)) for s in ("build", "interpolate")},
+    "simulate_days[1y_15min]": lambda: _year_case("full"),
+    "simulate_representative[1y_15min,24]": lambda: _year_case("representative"),
+    **{f"run_pipeline[{p},{g}]": (lambda p=p, g=g: _grid_case(p, g))
+       for p in ("1y_1h", "1y_15min") for g in ("uniforme", "luce")},
+    **{f"window_totals[{m}]": (lambda m=m: _window_case(m)) for m in ("store", "pandas")},
+}
+
+
+# ==================== MISURA ====================
+
+def time_case(func, repeat: int, min_time_s: float = 0.05) -> dict:
+    """
+    Cronometra `func`: ogni campione ripete la chiamata finché supera min_time_s,
+    così anche le funzioni da microsecondi hanno una risoluzione affidabile
+    """
+    func()  # riscaldamento (import pigri, cache di pvlib)
+
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time_s or loops >= 1_000_000:
+            break
+        loops *= 10
+
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+
+    return {
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "repeat": repeat,
+        "loops": loops,
+    }
+
+
+def run_suite(repeat: int = 5, only: str = None) -> dict:
+    """Esegue i casi selezionati e restituisce il documento baseline"""
+    cases = {}
+    for name, build in CASES.items():
+        if only and not name.startswith(only):
+            continue
+        func, meta = build()
+        cases[name] = {**time_case(func, repeat), **meta}
+        print(f"{name:<50}{cases[name]['median_ms']:>12.3f} ms", flush=True)
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "pvlib": pvlib.__version__,
+        },
+        "cases": cases,
+    }
+
+
+# ==================== CONFRONTO ====================
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta_ms: float = 0.05) -> list:
+    """
+    Confronta i tempi minimi caso per caso
+
+    Returns:
+        list: (nome, ms baseline, ms corrente, variazione relativa, regressione)
+    """
+    rows = []
+    for name, base in baseline["cases"].items():
+        if name not in current["cases"]:
+            continue
+        now = current["cases"][name]["min_ms"]
+        change = now / base["min_ms"] - 1
+        regression = change > threshold and now - base["min_ms"] > min_delta_ms
+        rows.append((name, base["min_ms"], now, change, regression))
+    return rows
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="esegue la suite e salva i risultati")
+    run_p.add_argument("--output", default=DEFAULT_BASELINE)
+    run_p.add_argument("--repeat", type=int, default=5)
+    run_p.add_argument("--only", help="esegue solo i casi che iniziano con questo prefisso")
+
+    cmp_p = sub.add_parser("compare", help="confronta con una baseline")
+    cmp_p.add_argument("baseline", nargs="?", default=DEFAULT_BASELINE)
+    cmp_p.add_argument("current", nargs="?", help="risultati salvati; se assente esegue la suite")
+    cmp_p.add_argument("--threshold", type=float, default=0.25)
+    cmp_p.add_argument("--min-delta-ms", type=float, default=0.05)
+    cmp_p.add_argument("--repeat", type=int, default=5)
+    cmp_p.add_argument("--only")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        result = run_suite(args.repeat, args.only)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Salvato in {args.output}")
+        return
+
+    baseline = _load(args.baseline)
+    current = _load(args.current) if args.current else run_suite(args.repeat, args.only)
+
+    rows = compare(baseline, current, args.threshold, args.min_delta_ms)
+    print(f"\n{'caso':<50}{'baseline':>12}{'attuale':>12}{'Δ':>9}")
+    for name, base_ms, now_ms, change, regression in rows:
+        flag = "  REGRESSIONE" if regression else ""
+        print(f"{name:<50}{base_ms:>10.3f}ms{now_ms:>10.3f}ms{change:>+9.1%}{flag}")
+
+    regressions = [r for r in rows if r[4]]
+    if regressions:
+        print(f"\n{len(regressions)} casi oltre la soglia del {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\nNessuna regressione oltre il {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Utility condivise dai benchmark - parametri impianto di riferimento, senza geocoding
+"""
+
+from datetime import date
+from config import DEFAULT_PARAMS, TIMEZONE_OBJ
+
+
+def sample_params(**overrides) -> dict:
+    """Parametri completi come prodotti da sidebar_inputs, con coordinate fisse"""
+    params = {
+        "comune": DEFAULT_PARAMS["comune"],
+        "lat": DEFAULT_PARAMS["lat"],
+        "lon": DEFAULT_PARAMS["lon"],
+        "timezone": TIMEZONE_OBJ,
+        "location": None,
+        "data": date(2025, 6, 21),
+        "num_panels_per_row": DEFAULT_PARAMS["num_panels_per_row"],
+        "num_rows": DEFAULT_PARAMS["num_rows"],
+        "lato_maggiore": DEFAULT_PARAMS["lato_maggiore"],
+        "lato_minore": DEFAULT_PARAMS["lato_minore"],
+        "carreggiata": DEFAULT_PARAMS["carreggiata"],
+        "pitch_laterale": DEFAULT_PARAMS["pitch_laterale"],
+        "altezza_suolo": 1.0,
+        "tilt_pannello": DEFAULT_PARAMS["tilt"],
+        "azimuth_pannello": DEFAULT_PARAMS["azimuth"],
+        "eff": DEFAULT_PARAMS["eff"],
+        "temp_coeff": DEFAULT_PARAMS["temp_coeff"],
+        "noct": DEFAULT_PARAMS["noct"],
+        "losses": DEFAULT_PARAMS["losses"],
+        "albedo": DEFAULT_PARAMS["albedo"],
+        "crops": "Cereali",
+        "hectares": DEFAULT_PARAMS["hectares"],
+    }
+    params.update(overrides)
+    params["num_panels_total"] = params["num_panels_per_row"] * params["num_rows"]
+    params["area_pannello"] = params["lato_maggiore"] * params["lato_minore"]
+    return params
@@ -0,0 +1,341 @@
+"""
+Test di carico - N sessioni simultanee contro un server Streamlit locale
+
+Avvia app.py con `streamlit` in un processo dedicato (geocoding online sostituito
+da uno stub con latenza configurabile e cache su file temporaneo) e lo guida con
+N client websocket che parlano il protocollo del browser: primo caricamento, poi
+una sequenza casuale (riproducibile con --seed) di modifiche realistiche ai widget.
+Così le sessioni condividono processo, GIL e cache come in produzione; AppTest
+non è utilizzabile qui perché non supporta esecuzioni concorrenti nello stesso processo.
+
+Riporta latenza per rerun (percentili, fino a script_finished), throughput,
+byte ricevuti per rerun e memoria del server per sessione (RSS, solo Linux).
+
+Uso:
+    python -m benchmarks.load_harness [--sessions N] [--reruns R] [--think S] [--output FILE]
+    python -m benchmarks.load_harness --url ws://host:porta  (server già avviato, senza RSS)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+from config import BASE_DIR, GEOCODE_CONFIG
+
+APP_PATH = os.path.join(BASE_DIR, "app.py")
+
+# Comuni usati dalle sessioni: capoluoghi nel gazetteer e nomi risolti dallo stub
+COMUNI = ["Roma", "Milano", "Bari", "Torino", "Palermo", "Frascati", "Alberobello"]
+CROPS = ["Cereali", "Ortaggi a foglia", "Viti", "Legumi", "Tuberi"]
+
+
+# ==================== SERVER ====================
+
+def make_stub_geocoder(latency_s: float):
+    """Geocoder locale deterministico: coordinate plausibili in Italia dal nome"""
+    def geocode(comune: str):
+        time.sleep(latency_s)
+        h = sum(ord(c) for c in comune.lower())
+        return 38.0 + (h % 70) / 10, 8.0 + (h % 90) / 10, f"{comune}, Italia"
+    return geocode
+
+
+def serve(port: int, geocode_latency_s: float):
+    """Avvia app.py nel processo corrente con il geocoder stub (bloccante)"""
+    import geocoding
+    from streamlit.web import bootstrap
+
+    GEOCODE_CONFIG["cache_path"] = os.path.join(tempfile.mkdtemp(prefix="apv_load_"), "geocode.sqlite")
+    geocoding.set_geocoder(make_stub_geocoder(geocode_latency_s))
+
+    flag_options = {
+        "server_port": port,
+        "server_headless": True,
+        "server_fileWatcherType": "none",
+        "browser_gatherUsageStats": False,
+    }
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(APP_PATH, False, [], flag_options)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(geocode_latency_s: float, timeout_s: float = 60) -> tuple:
+    """Processo server e porta, dopo che /_stcore/health risponde"""
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.load_harness", "serve",
+         "--port", str(port), "--geocode-latency", str(geocode_latency_s)],
+        cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return proc, port
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("Il server Streamlit non si è avviato")
+
+
+def rss_mb(pid: int):
+    """Memoria residente del processo in MB (None fuori da Linux)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+# ==================== CLIENT ====================
+
+class Session:
+    """Client websocket che si comporta come una scheda del browser"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.ws = None
+        self.widgets = {}   # (tipo, etichetta) -> id widget
+        self.states = {}    # id widget -> WidgetState inviato a ogni rerun
+
+    async def connect(self):
+        self.ws = await websocket_connect(self.url, subprotocols=["streamlit"])
+
+    async def rerun(self) -> dict:
+        """Invia lo stato dei widget e attende la fine dello script"""
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+
+        start = time.perf_counter()
+        self.ws.write_message(msg.SerializeToString(), binary=True)
+
+        received, errors = 0, 0
+        while True:
+            raw = await self.ws.read_message()
+            if raw is None:
+                raise ConnectionError("Connessione chiusa dal server")
+            received += len(raw)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                errors += self._track(fwd.delta.new_element)
+            elif kind == "script_finished":
+                break
+
+        return {"latency_s": time.perf_counter() - start, "bytes": received, "errors": errors}
+
+    def _track(self, element) -> int:
+        """Registra gli id dei widget; restituisce 1 se l'elemento è un'eccezione"""
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            return 1
+        proto = getattr(element, kind)
+        widget_id = getattr(proto, "id", "")
+        if widget_id.startswith("$$ID"):
+            self.widgets[(kind, getattr(proto, "label", ""))] = widget_id
+        return 0
+
+    def set_value(self, kind: str, label: str, field: str, value):
+        state = WidgetState(id=self.widgets[(kind, label)])
+        if field == "double_array_value":
+            state.double_array_value.data.extend(value)
+        else:
+            setattr(state, field, value)
+        self.states[state.id] = state
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+
+# nome azione -> funzione(Session, rng) che modifica un widget
+ACTIONS = {
+    "tilt": lambda s, rng: s.set_value("slider", "Tilt [°]", "double_array_value", [rng.randint(0, 60)]),
+    "azimuth": lambda s, rng: s.set_value("slider", "Azimuth [°]", "double_array_value", [rng.randint(90, 270)]),
+    "coltura": lambda s, rng: s.set_value("selectbox", "Tipo di Coltura", "string_value", rng.choice(CROPS)),
+    "ettari": lambda s, rng: s.set_value("number_input", "Ettari Totali", "double_value", rng.choice([0.5, 1.0, 2.0, 5.0])),
+    "efficienza": lambda s, rng: s.set_value("number_input", "Efficienza [%]", "double_value", rng.choice([18.0, 20.0, 22.5])),
+    "comune": lambda s, rng: s.set_value("text_input", "Comune", "string_value", rng.choice(COMUNI)),
+}
+
+
+async def run_session(url: str, session_id: int, reruns: int, seed: int,
+                      think_s: float, opened: list) -> list:
+    """Primo caricamento più `reruns` interazioni; restituisce una misura per rerun"""
+    rng = random.Random(seed + session_id)
+    session = Session(url)
+    opened.append(session)  # resta aperta fino alla misura di memoria
+    await session.connect()
+
+    runs = [{"action": "load", **await session.rerun()}]
+    for _ in range(reruns):
+        await asyncio.sleep(rng.uniform(0, 2 * think_s))
+        name = rng.choice(list(ACTIONS))
+        ACTIONS[name](session, rng)
+        runs.append({"action": name, **await session.rerun()})
+    return runs
+
+
+# ==================== REPORT ====================
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(runs: list) -> dict:
+    if not runs:
+        return {}
+    latencies = [r["latency_s"] for r in runs]
+    return {
+        "n": len(runs),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "mean_kb": statistics.fmean(r["bytes"] for r in runs) / 1024,
+    }
+
+
+async def _drive(url: str, sessions: int, reruns: int, seed: int, think_s: float, server_pid):
+    # Sessione di riscaldamento: import e cache condivise non vanno imputate alle sessioni
+    warmup = Session(url)
+    await warmup.connect()
+    await warmup.rerun()
+    warmup.close()
+
+    opened = []
+    rss_before = rss_mb(server_pid) if server_pid else None
+
+    start = time.perf_counter()
+    per_session = await asyncio.gather(*(
+        run_session(url, i, reruns, seed, think_s, opened) for i in range(sessions)
+    ))
+    wall_s = time.perf_counter() - start
+
+    # Sessioni ancora connesse: lo stato per sessione è ancora in memoria nel server
+    rss_after = rss_mb(server_pid) if server_pid else None
+    for session in opened:
+        session.close()
+    return per_session, wall_s, rss_before, rss_after
+
+
+def run_load(sessions: int, reruns: int, seed: int = 0, think_s: float = 0.0,
+             geocode_latency_s: float = 0.2, url: str = None) -> dict:
+    """Esegue le sessioni in parallelo e restituisce il riepilogo"""
+    proc = None
+    if url is None:
+        proc, port = start_server(geocode_latency_s)
+        url = f"ws://127.0.0.1:{port}/_stcore/stream"
+
+    try:
+        per_session, wall_s, rss_before, rss_after = asyncio.run(
+            _drive(url, sessions, reruns, seed, think_s, proc.pid if proc else None)
+        )
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    runs = [r for session_runs in per_session for r in session_runs]
+    first = [r for r in runs if r["action"] == "load"]
+    later = [r for r in runs if r["action"] != "load"]
+    per_action = {}
+    for r in later:
+        per_action.setdefault(r["action"], []).append(r)
+
+    return {
+        "sessions": sessions,
+        "reruns_per_session": reruns,
+        "think_s": think_s,
+        "wall_s": wall_s,
+        "throughput_reruns_s": len(runs) / wall_s,
+        "errors": sum(r["errors"] for r in runs),
+        "first_load": summarize(first),
+        "interaction": summarize(later),
+        "per_action": {name: summarize(v) for name, v in sorted(per_action.items())},
+        "server_rss_mb": {"before": rss_before, "after": rss_after},
+        "memory_per_session_mb": (rss_after - rss_before) / sessions if rss_before and rss_after else None,
+    }
+
+
+def print_report(report: dict):
+    print(f"Sessioni: {report['sessions']} × {report['reruns_per_session']} interazioni "
+          f"in {report['wall_s']:.1f} s — {report['throughput_reruns_s']:.1f} rerun/s, "
+          f"errori: {report['errors']}")
+    if report["memory_per_session_mb"] is not None:
+        rss = report["server_rss_mb"]
+        print(f"Memoria server: {rss['before']:.0f} → {rss['after']:.0f} MB, "
+              f"{report['memory_per_session_mb']:.1f} MB/sessione")
+
+    print(f"\n{'fase':<16}{'n':>6}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}{'kB':>8}  [ms]")
+    rows = [("primo carico", report["first_load"]), ("interazioni", report["interaction"])]
+    rows += [(f"  {name}", s) for name, s in report["per_action"].items()]
+    for label, s in rows:
+        if s:
+            print(f"{label:<16}{s['n']:>6}{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}"
+                  f"{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}{s['mean_kb']:>8.1f}")
+
+
+def main():
+    if sys.argv[1:2] == ["serve"]:
+        parser = argparse.ArgumentParser(description="server Streamlit per il test di carico")
+        parser.add_argument("serve")
+        parser.add_argument("--port", type=int, required=True)
+        parser.add_argument("--geocode-latency", type=float, default=0.2)
+        args = parser.parse_args()
+        serve(args.port, args.geocode_latency)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="pausa media tra due interazioni della stessa sessione [s]")
+    parser.add_argument("--geocode-latency", type=float, default=0.2,
+                        help="latenza simulata del geocoder online [s]")
+    parser.add_argument("--url", help="websocket di un server già avviato")
+    parser.add_argument("--output", help="salva il riepilogo in JSON")
+    args = parser.parse_args()
+
+    report = run_load(args.sessions, args.reruns, args.seed, args.think,
+                      args.geocode_latency, args.url)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
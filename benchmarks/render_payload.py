@@ -0,0 +1,71 @@
+"""
+Benchmark rendering metriche - payload del rerun e tempo di rendering lato server
+
+Confronta la modalità "columns" (colonne e markdown per ogni card) con "batched"
+(unico frammento HTML). Il payload è la somma delle dimensioni serializzate dei
+messaggi delta prodotti dal rerun, misurata con streamlit.testing.
+
+Uso: python -m benchmarks.render_payload [--runs N]
+"""
+
+import argparse
+import statistics
+from streamlit.testing.v1 import AppTest
+
+
+def _metrics_page(mode: str):
+    # Eseguito da AppTest come script autonomo
+    import time
+    import streamlit as st
+    import metrics
+    from agri_calculations import calculate_all_agri
+    from benchmarks.common import sample_params
+    from calculations import calculate_all_pv
+
+    params = sample_params()
+    results = calculate_all_pv(params)
+    results["agri_results"] = calculate_all_agri(params, results)
+
+    metrics.METRICS_RENDER_MODE = mode
+    start = time.perf_counter()
+    metrics.display_metrics(results, params)
+    st.session_state["render_s"] = time.perf_counter() - start
+
+
+def _walk(node):
+    yield node
+    for child in getattr(node, "children", {}).values():
+        yield from _walk(child)
+
+
+def measure(mode: str, runs: int = 5) -> dict:
+    """Numero di delta, byte serializzati e tempo di rendering (mediana) per una modalità"""
+    timings = []
+    for _ in range(runs):
+        at = AppTest.from_function(_metrics_page, args=(mode,), default_timeout=60).run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        timings.append(at.session_state["render_s"])
+
+    nodes = [n for n in _walk(at.main) if n is not at.main and getattr(n, "proto", None) is not None]
+    return {
+        "mode": mode,
+        "deltas": len(nodes),
+        "payload_bytes": sum(n.proto.ByteSize() for n in nodes),
+        "render_ms": statistics.median(timings) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'modalità':<10}{'delta':>8}{'byte':>10}{'render [ms]':>14}")
+    for mode in ("columns", "batched"):
+        r = measure(mode, args.runs)
+        print(f"{r['mode']:<10}{r['deltas']:>8}{r['payload_bytes']:>10}{r['render_ms']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,12 @@
 Modulo Calcoli - Gestisce tutti i calcoli geometrici, solari ed elettrici
 """
 
+import numpy as np
 import pandas as pd
 import pvlib
 import math
 from config import HECTARE_M2
+from weather import load_weather, weather_for_times
 
 
 # ==================== CALCOLI GEOMETRICI ====================
@@ -93,12 +95,41 @@ def calculate_solar_position(times: pd.DatetimeIndex, lat: float, lon: float) ->
     return pvlib.solarposition.get_solarposition(times, lat, lon)
 
 
+def approximate_solar_position(times: pd.DatetimeIndex, lat: float, lon: float) -> tuple:
+    """Zenith e azimuth [°] con declinazione ed equazione del tempo (Spencer), senza SPA"""
+    utc = times.tz_convert("UTC")
+    gamma = 2 * np.pi * (utc.dayofyear.to_numpy() - 1) / 365
+    declination = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+                   - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma))
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                                 - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    minutes = utc.hour.to_numpy() * 60 + utc.minute.to_numpy() + utc.second.to_numpy() / 60
+    hour_angle = np.radians((minutes + equation_of_time + 4 * lon) / 4 - 180)
+
+    phi = np.radians(lat)
+    cos_zenith = np.clip(np.sin(phi) * np.sin(declination)
+                         + np.cos(phi) * np.cos(declination) * np.cos(hour_angle), -1.0, 1.0)
+    azimuth = np.degrees(np.arctan2(
+        np.sin(hour_angle), np.cos(hour_angle) * np.sin(phi) - np.tan(declination) * np.cos(phi))) + 180
+    return np.degrees(np.arccos(cos_zenith)), azimuth
+
+
 def calculate_clearsky_irradiance(times: pd.DatetimeIndex, lat: float, lon: float, tz: str) -> pd.DataFrame:
     """Calcola irradianza cielo sereno"""
     site = pvlib.location.Location(lat, lon, tz=tz)
     return site.get_clearsky(times, model="ineichen")
 
 
+def calculate_irradiance(times: pd.DatetimeIndex, params: dict) -> pd.DataFrame:
+    """
+    Irradianza (ghi, dni, dhi) dal file meteo indicato in params["weather_file"],
+    con anche temp_air se il file la contiene; senza file, cielo sereno
+    """
+    if params.get("weather_file"):
+        return weather_for_times(load_weather(params["weather_file"]), times)
+    return calculate_clearsky_irradiance(times, params["lat"], params["lon"], str(params["timezone"]))
+
+
 def calculate_poa_global(clearsky: pd.DataFrame, solpos: pd.DataFrame, 
                          tilt: float, azimuth: float, albedo: float) -> pd.Series:
     """
@@ -116,44 +147,82 @@ def calculate_poa_global(clearsky: pd.DataFrame, solpos: pd.DataFrame,
     )
     return poa['poa_global'].round(0).astype(int)
 
-def estimate_ambient_temperature(times: pd.DatetimeIndex, lat: float) -> pd.Series:
+def calculate_poa_batch(ghi: np.ndarray, dni: np.ndarray, dhi: np.ndarray,
+                        solar_zenith: np.ndarray, solar_azimuth: np.ndarray,
+                        tilt, azimuth, albedo) -> np.ndarray:
     """
-    Stima temperatura ambiente oraria con modello sinusoidale
+    POA globale come calculate_poa_global (modello isotropico) per più
+    orientamenti insieme: tilt, azimuth e albedo possono essere array (n, 1)
+    e il risultato è (n × istanti)
     """
-    month = times[0].month
-    
-    # Stima temperatura media stagionale
+    tilt_rad, zenith_rad = np.radians(tilt), np.radians(solar_zenith)
+    cos_aoi = np.clip(
+        np.cos(zenith_rad) * np.cos(tilt_rad)
+        + np.sin(zenith_rad) * np.sin(tilt_rad) * np.cos(np.radians(solar_azimuth - azimuth)),
+        -1, 1
+    )
+    poa = (np.maximum(dni * cos_aoi, 0)
+           + dhi * (1 + np.cos(tilt_rad)) / 2
+           + ghi * albedo * (1 - np.cos(tilt_rad)) / 2)
+    return np.round(poa)
+
+def seasonal_temperature(month: int, lat: float) -> tuple:
+    """Temperatura media stagionale e escursione giornaliera per mese e latitudine"""
     if month in [12, 1, 2]:  # Inverno
-        T_media = 8 - (lat - 40) * 0.5
-        escursione = 6
+        return 8 - (lat - 40) * 0.5, 6
     elif month in [3, 4, 5]:  # Primavera
-        T_media = 15 - (lat - 40) * 0.3
-        escursione = 8
+        return 15 - (lat - 40) * 0.3, 8
     elif month in [6, 7, 8]:  # Estate
-        T_media = 26 - (lat - 40) * 0.4
-        escursione = 10
+        return 26 - (lat - 40) * 0.4, 10
     else:  # Autunno
-        T_media = 16 - (lat - 40) * 0.3
-        escursione = 7
-    
-    # Temperatura oraria sinusoidale (min h6, max h14)
-    hours = times.hour
-    T_amb = T_media + escursione * pd.Series(
-        [math.sin(math.pi * (h - 6) / 12) for h in hours],
+        return 16 - (lat - 40) * 0.3, 7
+
+
+def estimate_ambient_temperature(times: pd.DatetimeIndex, lat: float) -> pd.Series:
+    """
+    Stima temperatura ambiente con modello sinusoidale
+    La stagione è valutata per ogni istante, così anche periodi di più mesi restano coerenti
+    """
+    local = times.tz_localize(None) if times.tz is not None else times  # ora locale calcolata una volta
+    months = local.month
+    T_media = np.empty(len(times))
+    escursione = np.empty(len(times))
+    for month in np.unique(months):
+        mask = months == month
+        T_media[mask], escursione[mask] = seasonal_temperature(month, lat)
+
+    # Temperatura sinusoidale (min h6, max h14), anche per passi sub-orari
+    hours = local.hour + local.minute / 60
+    T_amb = pd.Series(
+        T_media + escursione * np.sin(np.pi * (hours.to_numpy() - 6) / 12),
         index=times
     )
-    
+
     return T_amb
 
 
+def calculate_ambient_temperature(times: pd.DatetimeIndex, lat: float, irradiance: pd.DataFrame) -> pd.Series:
+    """Temperatura ambiente dal file meteo se disponibile, altrimenti stimata"""
+    if "temp_air" in irradiance:
+        return irradiance["temp_air"]
+    return estimate_ambient_temperature(times, lat)
+
+
 # ==================== CALCOLI PRODUZIONE ELETTRICA ====================
 
-def calculate_pv_production(params: dict, poa_global: pd.Series, T_amb: pd.Series) -> dict:
+def calculate_pv_production(params: dict, poa_global: pd.Series, T_amb: pd.Series,
+                            weights: pd.Series = None, period: dict = None) -> dict:
     """
     Calcola produzione elettrica
+    L'energia è la somma delle potenze per la durata [h] di ogni campione
+    (weights; senza pesi campioni orari). Con period (time_grid.period_grid) la
+    temperatura media delle celle è sull'intero periodo, anche se i campioni
+    coprono solo le ore di luce: di notte le celle sono a temperatura ambiente
     """
+    hours = 1.0 if weights is None else weights
     # Temperatura celle
-    T_cell = T_amb + (poa_global / 800) * (params["noct"] - 20)
+    heating = (poa_global / 800) * (params["noct"] - 20)
+    T_cell = T_amb + heating
     
     # Efficienza corretta per temperatura
     eff_corr = params["eff"] * (1 + params["temp_coeff"] * (T_cell - 25))
@@ -166,8 +235,8 @@ def calculate_pv_production(params: dict, poa_global: pd.Series, T_amb: pd.Serie
     power_total = power_single * params["num_panels_total"]
     
     # Energia giornaliera
-    energy_single = power_single.sum()
-    energy_total = power_total.sum()
+    energy_single = (power_single * hours).sum()
+    energy_total = (power_total * hours).sum()
     
     # Energia per m²
     energy_total_m2 = energy_total / (params["area_pannello"] * params["num_panels_total"])
@@ -178,40 +247,82 @@ def calculate_pv_production(params: dict, poa_global: pd.Series, T_amb: pd.Serie
         "energy_single_Wh": energy_single,
         "energy_total_Wh": energy_total,
         "energy_total_Wh_m2": energy_total_m2,
-        "T_cell_avg": T_cell.mean()
+        "T_cell_avg": T_cell.mean() if period is None else (
+            period["t_amb"].mean() + (heating * hours).sum() / (len(period["t_amb"]) * period["step_h"])
+        )
     }
 
 
+def calculate_energy_batch(poa: np.ndarray, T_amb: np.ndarray, params: dict,
+                           weights: np.ndarray = None) -> np.ndarray:
+    """
+    Energia totale [kWh] per ogni riga di una matrice POA (n × istanti), con le
+    formule di calculate_pv_production; noct, eff, temp_coeff, losses e
+    num_panels_total in params possono essere array (n, 1); weights è la
+    durata [h] di ogni istante (default 1)
+    """
+    hours = 1.0 if weights is None else weights
+    T_cell = T_amb + (poa / 800) * (params["noct"] - 20)
+    eff_corr = params["eff"] * (1 + params["temp_coeff"] * (T_cell - 25))
+    power_single = np.round(poa * params["area_pannello"] * eff_corr * (1 - params["losses"]))
+    return (power_single * params["num_panels_total"] * hours).sum(axis=-1) / 1000
+
+
 # ==================== FUNZIONE PRINCIPALE ====================
 
-def calculate_all_pv(params: dict) -> dict:
+# Parametri da cui dipende la serie temporale
+TIME_INDEX_KEYS = ("data", "timezone", "giorni", "freq", "giorni_selezionati")
+
+# Parametri da cui dipende l'irradianza
+IRRADIANCE_KEYS = ("lat", "lon", "timezone", "weather_file")
+
+
+def build_time_index(params: dict) -> pd.DatetimeIndex:
     """
-    Calcola tutti i parametri PV
+    Serie temporale della simulazione
+    Per default la giornata scelta a passo orario; "giorni" e "freq" (opzionali)
+    estendono il periodo e cambiano il passo (es. 365 giorni a "15min");
+    "giorni_selezionati" (tupla di date) limita la serie a quelle giornate
     """
-    # Serie temporale oraria
-    times = pd.date_range(
-        start=pd.Timestamp(params["data"]),
-        end=pd.Timestamp(params["data"]) + pd.Timedelta(days=1) - pd.Timedelta(hours=1),
-        freq="1h",
-        tz=params["timezone"]
+    if params.get("giorni_selezionati"):
+        return pd.DatetimeIndex(np.concatenate([
+            build_time_index({**params, "data": day, "giorni": 1, "giorni_selezionati": None})
+            for day in sorted(params["giorni_selezionati"])
+        ])).tz_convert(params["timezone"])
+
+    start = pd.Timestamp(params["data"])
+    return pd.date_range(
+        start=start,
+        end=start + pd.Timedelta(days=params.get("giorni", 1)),
+        freq=params.get("freq", "1h"),
+        tz=params["timezone"],
+        inclusive="left"
     )
-    
-    # Calcoli geometrici
+
+
+def step_hours(params: dict) -> float:
+    """Durata in ore del passo della serie uniforme"""
+    return pd.Timedelta(params.get("freq", "1h")) / pd.Timedelta(hours=1)
+
+
+def calculate_layout_geometry(params: dict) -> dict:
+    """Metriche geometriche di pannelli, ingombro e dimensionamento del campo"""
     panel_metrics = calculate_panel_metrics(params)
-    max_panels_info = calculate_max_panels(params)
-    occupied_space = calculate_occupied_space(params, panel_metrics)
-    
-    # Calcoli solari
-    solpos = calculate_solar_position(times, params["lat"], params["lon"])
-    clearsky = calculate_clearsky_irradiance(times, params["lat"], params["lon"], str(params["timezone"]))
-    poa_global = calculate_poa_global(clearsky, solpos, params["tilt_pannello"], 
-                                      params["azimuth_pannello"], params["albedo"])
-    T_amb = estimate_ambient_temperature(times, params["lat"])
-    
-    # Produzione elettrica
-    production = calculate_pv_production(params, poa_global, T_amb)
-    
-    # Assemblaggio risultati
+    return {
+        **panel_metrics,
+        **calculate_occupied_space(params, panel_metrics),
+        **calculate_max_panels(params)
+    }
+
+
+def assemble_pv_results(times: pd.DatetimeIndex, clearsky: pd.DataFrame, solpos: pd.DataFrame,
+                        poa_global: pd.Series, T_amb: pd.Series,
+                        geometry: dict, production: dict, weights: pd.Series,
+                        period_hours: float = None) -> dict:
+    """
+    Compone il dizionario risultati PV dagli output dei singoli calcoli (weights: ore
+    per campione; period_hours: durata del periodo per le medie, default la somma dei pesi)
+    """
     return {
         # Serie temporali
         "times": times,
@@ -221,18 +332,43 @@ def calculate_all_pv(params: dict) -> dict:
         "POA_Wm2": poa_global,
         "T_amb": T_amb.round(1),
         "solpos": solpos,
+        "sample_weights_h": weights,
+        "period_hours": float(weights.sum()) if period_hours is None else period_hours,
         
         # Totali giornalieri
-        "GHI_Whm2": clearsky['ghi'].sum().round(0).astype(int),
-        "DNI_Whm2": clearsky['dni'].sum().round(0).astype(int),
-        "DHI_Whm2": clearsky['dhi'].sum().round(0).astype(int),
-        "POA_Whm2": poa_global.sum().round(0).astype(int),
+        "GHI_Whm2": (clearsky['ghi'] * weights).sum().round(0).astype(int),
+        "DNI_Whm2": (clearsky['dni'] * weights).sum().round(0).astype(int),
+        "DHI_Whm2": (clearsky['dhi'] * weights).sum().round(0).astype(int),
+        "POA_Whm2": (poa_global * weights).sum().round(0).astype(int),
         
         # Metriche geometriche
-        **panel_metrics,
-        **occupied_space,
-        **max_panels_info,
+        **geometry,
         
         # Produzione elettrica
         **production
-    }
\ No newline at end of file
+    }
+
+
+def calculate_all_pv(params: dict) -> dict:
+    """
+    Calcola tutti i parametri PV
+    """
+    # Serie temporale oraria
+    times = build_time_index(params)
+    
+    # Calcoli geometrici
+    geometry = calculate_layout_geometry(params)
+    
+    # Calcoli solari
+    solpos = calculate_solar_position(times, params["lat"], params["lon"])
+    clearsky = calculate_irradiance(times, params)
+    poa_global = calculate_poa_global(clearsky, solpos, params["tilt_pannello"], 
+                                      params["azimuth_pannello"], params["albedo"])
+    T_amb = calculate_ambient_temperature(times, params["lat"], clearsky)
+    weights = pd.Series(step_hours(params), index=times)
+    
+    # Produzione elettrica
+    production = calculate_pv_production(params, poa_global, T_amb, weights)
+    
+    # Assemblaggio risultati
+    return assemble_pv_results(times, clearsky, solpos, poa_global, T_amb, geometry, production, weights)
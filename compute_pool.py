@@ -0,0 +1,175 @@
+"""
+Modulo Compute Pool - Calcoli PV e agricoli in un pool di processi condiviso
+Con backend "process" i calcoli di tutte le sessioni girano in processi worker
+persistenti, così un calcolo pesante non tiene il GIL dei thread di Streamlit e il
+server scala con i core. I risultati tornano come array numpy compatti; una
+richiesta superata da un rerun più recente della stessa sessione viene annullata.
+Con backend "inline" (default) il calcolo resta nel thread dello script.
+"""
+
+import multiprocessing
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import pandas as pd
+import streamlit as st
+import profiling
+from config import COMPUTE_CONFIG
+from pipeline import assemble_results, run_pipeline, run_stages
+
+
+class ComputeCancelled(Exception):
+    """Richiesta annullata perché superata da un rerun più recente"""
+
+
+# ==================== PASSAGGIO RISULTATI ====================
+
+def _pack(data: dict) -> dict:
+    packed = {}
+    for key, value in data.items():
+        if isinstance(value, pd.DatetimeIndex):
+            packed[key] = ("times",)
+        elif isinstance(value, pd.DataFrame):
+            packed[key] = ("frame", {col: value[col].to_numpy() for col in value.columns})
+        elif isinstance(value, pd.Series):
+            packed[key] = ("series", value.to_numpy(), value.name)
+        elif isinstance(value, dict):
+            packed[key] = ("dict", _pack(value))
+        else:
+            packed[key] = ("value", value)
+    return packed
+
+
+def pack_results(results: dict) -> dict:
+    """
+    Converte i risultati in array numpy e scalari, senza indici pandas ripetuti
+
+    Tutte le serie condividono l'indice temporale, trasmesso una sola volta
+    come int64 (ns UTC) con fuso e frequenza.
+    """
+    times = results["times"]
+    return {
+        "times": (times.asi8, times.tz, times.freqstr),
+        "data": _pack(results),
+    }
+
+
+def _unpack(packed: dict, times: pd.DatetimeIndex) -> dict:
+    data = {}
+    for key, (kind, *payload) in packed.items():
+        if kind == "times":
+            data[key] = times
+        elif kind == "frame":
+            data[key] = pd.DataFrame(payload[0], index=times)
+        elif kind == "series":
+            data[key] = pd.Series(payload[0], index=times, name=payload[1])
+        elif kind == "dict":
+            data[key] = _unpack(payload[0], times)
+        else:
+            data[key] = payload[0]
+    return data
+
+
+def unpack_results(packed: dict) -> dict:
+    """Ricostruisce il dizionario risultati prodotto da pack_results"""
+    asi8, tz, freq = packed["times"]
+    times = pd.DatetimeIndex(pd.to_datetime(asi8, utc=True).tz_convert(tz), freq=freq)
+    return _unpack(packed["data"], times)
+
+
+# ==================== WORKER ====================
+
+# Nel worker: memo della pipeline per sessione, gli stadi invariati non si ricalcolano
+_session_memos = OrderedDict()
+
+
+def _worker_compute(params: dict, session_id: str, token: str, cancelled) -> dict:
+    memo = _session_memos.pop(session_id, None) or {}
+    _session_memos[session_id] = memo
+    while len(_session_memos) > COMPUTE_CONFIG["session_memos"]:
+        _session_memos.popitem(last=False)
+
+    def check():
+        if token in cancelled:
+            raise ComputeCancelled(token)
+
+    out, _ = run_stages(params, memo, check=check)
+    return pack_results(assemble_results(out))
+
+
+# ==================== POOL CONDIVISO ====================
+
+_lock = threading.Lock()
+_pool = None
+_cancelled = None  # token annullati, condivisi con i worker tramite Manager
+
+
+def get_pool() -> tuple:
+    """Pool di processi unico per il server, creato al primo utilizzo"""
+    global _pool, _cancelled
+    with _lock:
+        if _pool is None:
+            # spawn: il fork di un server con molti thread attivi non è sicuro
+            context = multiprocessing.get_context("spawn")
+            _cancelled = context.Manager().dict()
+            _pool = ProcessPoolExecutor(max_workers=COMPUTE_CONFIG["workers"], mp_context=context)
+    return _pool, _cancelled
+
+
+def submit(params: dict, session_id: str) -> tuple:
+    """Accoda un calcolo; restituisce (future, token per l'annullamento)"""
+    pool, cancelled = get_pool()
+    token = uuid.uuid4().hex
+    return pool.submit(_worker_compute, params, session_id, token, cancelled), token
+
+
+def cancel(future, token: str):
+    """Annulla una richiesta: subito se in coda, altrimenti al prossimo stadio"""
+    if future.cancel():
+        return
+    _cancelled[token] = True
+    future.add_done_callback(lambda _: _cancelled.pop(token, None))
+
+
+def wait_result(future, token: str):
+    """
+    Attende il risultato restando interrompibile
+
+    Ogni poll_s aggiorna un segnaposto: è il punto in cui Streamlit interrompe lo
+    script se la sessione ha chiesto un rerun più recente, e in quel caso la
+    richiesta in corso viene annullata.
+    """
+    status = st.empty()
+    try:
+        while True:
+            try:
+                result = future.result(timeout=COMPUTE_CONFIG["poll_s"])
+                break
+            except FutureTimeoutError:
+                status.caption("⏳ Calcolo in corso…")
+    except BaseException:
+        cancel(future, token)
+        raise
+    status.empty()
+    return result
+
+
+# ==================== INTERFACCIA ====================
+
+def compute(params: dict, memo: dict) -> dict:
+    """
+    Risultati della pipeline con il backend configurato
+
+    Args:
+        params: parametri impianto
+        memo: memo della pipeline in session_state (usato dal backend "inline")
+    """
+    if COMPUTE_CONFIG["backend"] != "process":
+        return run_pipeline(params, memo)
+
+    session_id = st.session_state.setdefault("compute_session_id", uuid.uuid4().hex)
+    with profiling.timed("compute_pool", backend="process"):
+        future, token = submit(params, session_id)
+        return unpack_results(wait_result(future, token))
@@ -3,6 +3,7 @@ Configurazione centralizzata per PV Simulator
 Contiene: costanti, parametri default, stili CSS, configurazioni UI
 """
 
+import os
 from zoneinfo import ZoneInfo
 
 # ==================== COSTANTI FISICHE ====================
@@ -10,6 +11,32 @@ HECTARE_M2 = 10000  # 1 ettaro in m²
 TIMEZONE = "Europe/Rome"
 TIMEZONE_OBJ = ZoneInfo(TIMEZONE)
 
+# ==================== DATI LOCALI ====================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+GAZETTEER_PATH = os.path.join(DATA_DIR, "capoluoghi.npz")  # solo capoluoghi di provincia
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+OFFLINE_TILES_DIR = os.path.join(BASE_DIR, "static", "tiles")  # python -m offline_tiles download
+
+# Atlante annuale per capoluogo del gazetteer (python -m atlas build)
+ATLAS_CONFIG = {
+    "path": os.path.join(DATA_DIR, "atlas.npy"),
+    "year": 2025,  # anno di riferimento, non bisestile
+    "min_hours": 24 * 7,  # sotto questa durata il calcolo diretto è già immediato
+}
+
+# ==================== GEOCODING ONLINE ====================
+GEOCODE_CONFIG = {
+    "cache_path": os.path.join(CACHE_DIR, "geocode.sqlite"),  # condivisa tra processi
+    "ttl_days": 30,  # validità risultati trovati
+    "negative_ttl_hours": 24,  # validità dei "non trovato"
+    "timeout_s": 10,  # timeout singola richiesta Nominatim
+    "max_retries": 3,
+    "wait_s": 0.3,  # attesa massima nel rerun prima di proseguire
+    "poll_s": 1.0,  # intervallo di controllo dei risultati in background
+    "user_agent": "resfarm@monitoring.com",
+}
+
 # ==================== PARAMETRI DEFAULT ====================
 DEFAULT_PARAMS = {
     # Localizzazione
@@ -40,6 +67,133 @@ DEFAULT_PARAMS = {
     "hectares": 1.0,  # ettari totali del campo
 }
 
+# ==================== CALCOLO ====================
+COMPUTE_CONFIG = {
+    # "inline": calcolo nel thread dello script; "process": pool di processi condiviso tra le sessioni
+    "backend": os.environ.get("APV_COMPUTE_BACKEND", "inline"),
+    "workers": int(os.environ.get("APV_COMPUTE_WORKERS", "0")) or os.cpu_count(),
+    "poll_s": 0.1,  # intervallo di attesa interrompibile dal rerun successivo
+    "session_memos": 32,  # sessioni di cui ogni worker conserva gli stadi calcolati
+}
+
+# ==================== JOB IN BACKGROUND ====================
+JOBS_CONFIG = {
+    "workers": 2,  # simulazioni lunghe eseguite in parallelo
+    "max_finished": 20,  # job conclusi conservati (i più vecchi vengono scartati)
+    "poll_s": 1.0,  # intervallo di aggiornamento dell'avanzamento nella pagina
+    "max_days": 366,  # durata massima di un'analisi su periodo
+}
+
+# ==================== ANNI SINTETICI (P50/P90) ====================
+STOCHASTIC_CONFIG = {
+    "years": 1000,  # anni sintetici per sito
+    "batch_years": 100,  # anni calcolati insieme (memoria ~ batch × 8760 × 8 byte per array)
+    "states": 10,  # stati della catena di Markov sul kc giornaliero (intervalli uguali 0-1)
+    # kc medio mensile (GHI / GHI sereno), gennaio-dicembre, valori tipici per l'Italia
+    "kc_mean": (0.60, 0.64, 0.68, 0.70, 0.74, 0.80, 0.86, 0.84, 0.76, 0.68, 0.60, 0.58),
+    "concentration": 6.0,  # dispersione dei kc giornalieri attorno alla media (Beta)
+    "persistence": 0.35,  # probabilità che un giorno mantenga lo stato del precedente
+    "prior_days": 30,  # peso della climatologia nella calibrazione da file meteo
+    "hourly_phi": 0.8,  # autocorrelazione oraria del rumore AR(1)
+    "hourly_sigma": 0.25,  # ampiezza del rumore orario nei giorni a nuvolosità variabile
+    "kc_max": 1.2,  # limite del kc orario (nubi di bordo)
+}
+
+# ==================== INCERTEZZA (MONTE CARLO) ====================
+UNCERTAINTY_CONFIG = {
+    "samples": 2000,  # campioni per analisi
+    "chunk_values": 2_000_000,  # elementi (campioni × istanti) valutati per blocco
+    "quantiles": (0.05, 0.5, 0.95),
+    # parametro -> (distribuzione, dev. standard per "normale" / semiampiezza per le altre)
+    "defaults": {
+        "eff": ("normale", 0.01),
+        "noct": ("normale", 2.0),
+        "temp_coeff": ("normale", 0.0005),
+        "losses": ("uniforme", 0.03),
+        "transmission_under": ("uniforme", 0.05),
+        "par_fraction": ("normale", 0.02),
+        "par_to_umol": ("normale", 0.1),
+    },
+}
+
+# ==================== SENSIBILITÀ ====================
+SENSITIVITY_CONFIG = {
+    # parametro -> (min, max) predefiniti, entro i limiti della sidebar
+    "ranges": {
+        "tilt_pannello": (0.0, 90.0),
+        "azimuth_pannello": (90.0, 270.0),
+        "pitch_laterale": (1.0, 10.0),
+        "altezza_suolo": (0.5, 6.0),
+        "albedo": (0.1, 0.4),
+        "transmission_under": (0.05, 0.4),
+    },
+    "morris_trajectories": 100,  # traiettorie Morris (valutazioni = traiettorie × (parametri + 1))
+    "morris_levels": 4,  # livelli della griglia Morris
+    "sobol_samples": 1024,  # campioni base Saltelli (valutazioni = campioni × (parametri + 2))
+    # Processi per la valutazione dei progetti (1 = nel thread del job)
+    "workers": int(os.environ.get("APV_SENSITIVITY_WORKERS", "1")),
+    "chunk_values": 2_000_000,  # elementi (progetti × istanti) valutati per blocco
+    "site_cache": 8,  # siti/periodi di cui si conservano posizione solare e irradianza
+}
+
+# ==================== OTTIMIZZATORE (PARETO) ====================
+OPTIMIZER_CONFIG = {
+    # variabile -> (min, max) predefiniti; il numero di pannelli è limitato da ciò che entra nel campo
+    "bounds": {
+        "tilt_pannello": (0.0, 60.0),
+        "azimuth_pannello": (90.0, 270.0),
+        "pitch_laterale": (1.0, 10.0),
+        "carreggiata": (1.0, 15.0),
+        "altezza_suolo": (0.5, 6.0),
+    },
+    "gcr_max": 0.4,  # GCR massimo predefinito (proiezione pannelli / superficie)
+    "coarse_samples": 512,  # candidati della griglia iniziale (Sobol)
+    "refine_radius": (0.2, 0.08, 0.03),  # raggio dei raffinamenti, frazione dell'intervallo
+    "refine_samples": 8,  # candidati per punto del fronte a ogni raffinamento
+    "max_front": 32,  # punti del fronte attorno a cui raffinare
+}
+
+# ==================== SUPERFICIE DI RISPOSTA ====================
+RESPONSE_SURFACE_CONFIG = {
+    # asse -> (primo nodo, ultimo nodo, numero di nodi), entro i limiti della sidebar
+    "grid": {
+        "tilt_pannello": (0.0, 90.0, 19),
+        "azimuth_pannello": (0.0, 360.0, 25),
+        "pitch_laterale": (0.5, 10.0, 20),
+    },
+    "validation_points": 64,  # punti casuali per misurare l'errore contro il calcolo esatto
+    "auto_build": True,  # costruisce in background la superficie mancante per il contesto attuale
+}
+
+# ==================== GRIGLIA TEMPORALE ====================
+TIME_GRID_CONFIG = {
+    "default": "luce",  # griglia della sidebar: "luce" (solo ore di luce) o "uniforme"
+    "horizon_deg": -1.0,  # elevazione di alba e tramonto: sotto 0° per la rifrazione
+    "weather_margin_h": 2,  # con file meteo, ore tenute prima dell'alba e dopo il tramonto
+}
+
+# ==================== GIORNI TIPICI ====================
+REPRESENTATIVE_DAYS_CONFIG = {
+    "clusters": 24,  # giornate tipiche simulate con la pipeline completa
+    "freq": "15min",  # passo della simulazione delle giornate tipiche
+    "seed": 0,  # inizializzazione k-means riproducibile
+    "site_cache": 4,  # siti/periodi di cui si conservano le serie orarie dei descrittori
+}
+
+# ==================== PROFILING ====================
+PERF_CONFIG = {
+    # Attivabile con APV_PROFILING=1: tempi per fase, pannello e log JSON lines
+    "enabled": os.environ.get("APV_PROFILING", "0") == "1",
+    "log_path": os.path.join(CACHE_DIR, "perf.jsonl"),
+    "log_max_bytes": 5 * 1024 * 1024,  # oltre questa dimensione il log passa a perf.jsonl.1 (uno solo)
+}
+
+# ==================== SIDEBAR ====================
+SIDEBAR_CONFIG = {
+    # True: input in un form, simulazione solo premendo "Simula" (default del toggle)
+    "form_mode": False,
+}
+
 # ==================== COLORI TEMA ====================
 COLORS = {
     "primary": "#74a65b",
@@ -58,11 +212,27 @@ CHART_CONFIG = {
     "fig_height": 4,
     "fig_width_min": 10,
     "fig_width_max": 14,
-    "screen_width_fallback": 1200,
     "map_height_mobile": 300,
     "map_height_desktop": 400,
 }
 
+# ==================== CONFIGURAZIONE MAPPA ====================
+MAP_CONFIG = {
+    "tiles": "Cartodb Positron",
+    "zoom_start": 6,
+    "interactive": False,  # True: st_folium bidirezionale, False: HTML statico in cache
+    # Tile locali servite da Streamlit (static/tiles, enableStaticServing), usate solo
+    # se la cartella esiste: coprono un server di tile irraggiungibile, non l'assenza
+    # di rete (Leaflet arriva comunque dalla CDN di folium)
+    "offline_tiles_url": "app/static/tiles/{z}/{x}/{y}.png",
+    "offline_tiles_max_zoom": 10,
+    "tile_errors_before_fallback": 3,
+    "offline_tiles_bbox": (6.6, 35.4, 18.6, 47.1),  # Italia (lon/lat min, lon/lat max)
+    "tiles_download_url": "https://a.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png",
+    "tiles_user_agent": "resfarm@monitoring.com",
+    "tiles_download_delay_s": 0.1,
+}
+
 # ==================== MESSAGGI UI ====================
 MESSAGES = {
     "location_not_found": "Comune non trovato",
@@ -291,6 +461,37 @@ section.main > div, section.main > div > div,
     line-height: 1.3;
 }
 
+.metric-unit {
+    font-size: 16px;
+}
+
+/* ===== GRIGLIA METRICHE (render in un unico elemento) ===== */
+.metrics-block .section-header {
+    margin-top: 1rem;
+}
+
+.metric-grid {
+    display: grid;
+    grid-template-columns: repeat(3, minmax(0, 1fr));
+    gap: 1rem;
+}
+
+.metric-card-flat {
+    background: #f0f2f6;
+    padding: 1rem;
+    margin: 0.25rem;
+    border-radius: 0.5rem;
+}
+.metric-card-flat .metric-label { font-size: 0.9rem; }
+.metric-card-flat .metric-value { font-size: 1.2rem; margin: 0.2rem 0; }
+.metric-card-flat .metric-description { font-size: 0.75rem; color: #555; }
+
+@media screen and (max-width: 768px) {
+    .metric-grid {
+        grid-template-columns: 1fr;
+    }
+}
+
 /* ===== TITOLI SEZIONE ===== */
 .section-header {
     font-size: clamp(1.1rem, 2.5vw, 1.6rem); 
@@ -323,6 +524,35 @@ section.main > div, section.main > div > div,
     font-size: clamp(0.75rem, 1.8vw, 0.9rem);
 }
 
+/* ===== INFO BOX (resoconto input) ===== */
+.formula-box.info-box {
+    display: grid;
+    grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
+    gap: 0.25rem 0.5rem;
+    padding: clamp(0.25rem, 1.5vw, 0.5rem) clamp(0.2rem, 1vw, 0.25rem);
+    margin: 0;
+    font-family: 'Inter', sans-serif;
+    font-size: clamp(0.75rem, 1.5vw, 0.95rem);
+    overflow-y: auto;
+    scrollbar-width: thin;
+    scrollbar-color: #74a65b #ffffff;
+}
+.info-box::-webkit-scrollbar {
+    width: 8px;
+}
+.info-box::-webkit-scrollbar-thumb {
+    border: 2px solid #ffffff;
+}
+.info-box .info-item {
+    padding: clamp(0.2rem, 1vw, 0.5rem);
+}
+
+@media screen and (max-width: 480px) {
+    .formula-box.info-box {
+        grid-template-columns: repeat(auto-fit, minmax(120px, 1fr));
+    }
+}
+
 /* ===== PULSANTI ===== */
 .stButton>button {
     width: 100% !important; 
@@ -0,0 +1,147 @@
+"""
+Modulo Gazetteer - Capoluoghi di provincia italiani per geocoding offline
+Il file distribuito (data/capoluoghi.csv) contiene solo i capoluoghi di
+provincia: gli altri comuni si risolvono online (geocoding) e non hanno
+l'atlante annuale. Formato binario compatto (npz) con nomi normalizzati
+ordinati: la ricerca esatta e per prefisso (autocompletamento) è una ricerca
+binaria.
+
+Costruzione dal CSV (colonne: comune, provincia, lat, lon, altitudine); lo
+stesso comando accetta un elenco più ampio, ad esempio tutti i comuni ISTAT
+con le coordinate, da indicare anche con -o al posto del file di default:
+    python -m gazetteer build data/capoluoghi.csv
+"""
+
+import argparse
+import csv
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+import numpy as np
+from config import GAZETTEER_PATH
+
+
+# ==================== NORMALIZZAZIONE ====================
+
+def normalize_name(name: str) -> str:
+    """Chiave di ricerca: minuscolo, senza accenti, apostrofi e spazi uniformati"""
+    name = unicodedata.normalize("NFKD", name.strip().lower())
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    name = name.replace("’", "'").replace("-", " ")
+    return " ".join(name.split())
+
+
+def _pack_strings(values: list) -> tuple:
+    """Concatena stringhe UTF-8 in un unico blob con offset"""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> list:
+    data = blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+# ==================== COSTRUZIONE ====================
+
+def build_gazetteer(csv_path: str, output_path: str = GAZETTEER_PATH) -> int:
+    """Converte il CSV dei comuni nel formato binario; ritorna il numero di comuni"""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    rows.sort(key=lambda r: (normalize_name(r["comune"]), r["provincia"]))
+    names_blob, names_offsets = _pack_strings([r["comune"] for r in rows])
+    keys_blob, keys_offsets = _pack_strings([normalize_name(r["comune"]) for r in rows])
+
+    np.savez_compressed(
+        output_path,
+        names=names_blob,
+        names_offsets=names_offsets,
+        keys=keys_blob,
+        keys_offsets=keys_offsets,
+        provincia=np.array([r["provincia"] for r in rows], dtype="S2"),
+        lat=np.array([float(r["lat"]) for r in rows], dtype=np.float32),
+        lon=np.array([float(r["lon"]) for r in rows], dtype=np.float32),
+        altitudine=np.array([int(float(r["altitudine"])) for r in rows], dtype=np.int16),
+    )
+    return len(rows)
+
+
+# ==================== CARICAMENTO E RICERCA ====================
+
+@lru_cache(maxsize=1)
+def load_gazetteer(path: str = GAZETTEER_PATH) -> dict:
+    """Carica l'indice in memoria (una volta per processo); vuoto se il file manca"""
+    try:
+        with np.load(path) as data:
+            return {
+                "names": _unpack_strings(data["names"], data["names_offsets"]),
+                "keys": _unpack_strings(data["keys"], data["keys_offsets"]),
+                "provincia": [p.decode("ascii") for p in data["provincia"]],
+                "lat": data["lat"].astype(float),
+                "lon": data["lon"].astype(float),
+                "altitudine": data["altitudine"].astype(int),
+            }
+    except FileNotFoundError:
+        return {"names": [], "keys": [], "provincia": [], "lat": [], "lon": [], "altitudine": []}
+
+
+def _record(index: dict, i: int) -> dict:
+    return {
+        "id": i,
+        "comune": index["names"][i],
+        "provincia": index["provincia"][i],
+        "lat": round(float(index["lat"][i]), 4),
+        "lon": round(float(index["lon"][i]), 4),
+        "altitudine": int(index["altitudine"][i]),
+    }
+
+
+def _prefix_range(keys: list, prefix: str) -> tuple:
+    start = bisect_left(keys, prefix)
+    return start, bisect_left(keys, prefix + "\uffff", lo=start)
+
+
+def lookup_comune(name: str, provincia: str = None) -> dict:
+    """Comune con nome esatto (normalizzato), opzionalmente filtrato per provincia"""
+    index = load_gazetteer()
+    key = normalize_name(name)
+    start = bisect_left(index["keys"], key)
+
+    for i in range(start, len(index["keys"])):
+        if index["keys"][i] != key:
+            break
+        if provincia is None or index["provincia"][i] == provincia.upper():
+            return _record(index, i)
+    return None
+
+
+def suggest_comuni(prefix: str, limit: int = 8) -> list:
+    """Comuni il cui nome inizia con il prefisso dato (autocompletamento)"""
+    key = normalize_name(prefix)
+    if not key:
+        return []
+    index = load_gazetteer()
+    start, end = _prefix_range(index["keys"], key)
+    return [_record(index, i) for i in range(start, min(end, start + limit))]
+
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Gazetteer comuni italiani")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Costruisce il file binario dal CSV")
+    build.add_argument("csv_path")
+    build.add_argument("-o", "--output", default=GAZETTEER_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_gazetteer(args.csv_path, args.output)
+        print(f"{count} comuni scritti in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Modulo Geocoding - Risoluzione dei comuni fuori dal gazetteer locale (capoluoghi)
+Le richieste online girano su un thread in background con timeout; i risultati
+(solo lat, lon e nome) finiscono in una cache SQLite su disco condivisa tra i
+processi, con scadenza e cache negativa per i nomi non risolti.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from geopy.exc import GeocoderServiceError, GeocoderTimedOut
+from geopy.geocoders import Nominatim
+from config import GEOCODE_CONFIG
+from gazetteer import lookup_comune, normalize_name
+
+
+# ==================== GEOCODER ====================
+
+def nominatim_geocoder(comune: str):
+    """Geocoder di default: ritorna (lat, lon, nome) o None se il comune non esiste"""
+    geolocator = Nominatim(user_agent=GEOCODE_CONFIG["user_agent"], timeout=GEOCODE_CONFIG["timeout_s"])
+    location = geolocator.geocode(f"{comune}, Italia")
+    if location is None:
+        return None
+    return location.latitude, location.longitude, location.address
+
+
+_geocoder = nominatim_geocoder
+
+
+def set_geocoder(geocoder):
+    """Sostituisce il geocoder online (es. uno stub locale per test e benchmark)"""
+    global _geocoder
+    _geocoder = geocoder
+
+
+# ==================== CACHE SQLITE ====================
+
+_schema_ready = set()  # percorsi già inizializzati in questo processo
+_schema_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Connessione alla cache; schema e modalità WAL solo alla prima apertura nel processo"""
+    path = GEOCODE_CONFIG["cache_path"]
+    if path not in _schema_ready:
+        with _schema_lock:
+            if path not in _schema_ready:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with closing(sqlite3.connect(path, timeout=5)) as conn, conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS geocode (
+                            query TEXT PRIMARY KEY,
+                            lat REAL,
+                            lon REAL,
+                            display_name TEXT,
+                            found INTEGER NOT NULL,
+                            updated REAL NOT NULL
+                        )
+                    """)
+                _schema_ready.add(path)
+    return sqlite3.connect(path, timeout=5)
+
+
+def read_cache(key: str):
+    """Voce valida in cache come dict, o None se assente o scaduta"""
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT lat, lon, display_name, found, updated FROM geocode WHERE query = ?", (key,)
+        ).fetchone()
+    if row is None:
+        return None
+
+    lat, lon, display_name, found, updated = row
+    ttl = GEOCODE_CONFIG["ttl_days"] * 86400 if found else GEOCODE_CONFIG["negative_ttl_hours"] * 3600
+    if time.time() - updated > ttl:
+        return None
+    if not found:
+        return {"status": "not_found"}
+    return {"status": "found", "lat": lat, "lon": lon, "display_name": display_name}
+
+
+def write_cache(key: str, result):
+    """Salva (lat, lon, nome) oppure un risultato negativo se result è None"""
+    lat, lon, display_name = result if result else (None, None, None)
+    with closing(_connect()) as conn, conn:  # chiusura esplicita; il secondo "with" fa il commit
+        conn.execute(
+            "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)",
+            (key, lat, lon, display_name, int(result is not None), time.time())
+        )
+
+
+# ==================== RISOLUZIONE IN BACKGROUND ====================
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="geocode")
+_pending = {}
+_lock = threading.Lock()
+
+
+def _resolve_online(key: str, comune: str):
+    try:
+        for attempt in range(GEOCODE_CONFIG["max_retries"]):
+            try:
+                write_cache(key, _geocoder(comune))
+                return
+            except (GeocoderServiceError, GeocoderTimedOut):
+                time.sleep(attempt + 1)
+        # Errori di rete ripetuti: nessuna voce in cache, si riproverà al prossimo rerun
+    finally:
+        with _lock:
+            _pending.pop(key, None)
+
+
+def resolve_comune(comune: str, wait: float = 0.0) -> dict:
+    """
+    Risolve un comune senza bloccare il rerun oltre `wait` secondi
+    
+    Returns:
+        dict: status "found" (con lat, lon, display_name), "not_found" o "pending"
+    """
+    if record := lookup_comune(comune):
+        return {
+            "status": "found",
+            "id": record["id"],
+            "lat": record["lat"],
+            "lon": record["lon"],
+            "display_name": f"{record['comune']} ({record['provincia']})",
+        }
+
+    key = normalize_name(comune)
+    if not key:
+        return {"status": "not_found"}
+    if cached := read_cache(key):
+        return cached
+
+    with _lock:
+        future = _pending.get(key)
+        if future is None:
+            future = _pending[key] = _executor.submit(_resolve_online, key, comune)
+
+    if wait > 0:
+        try:
+            future.result(timeout=wait)
+        except Exception:
+            pass
+    if future.done():
+        return read_cache(key) or {"status": "not_found"}
+    return {"status": "pending"}
+
+
+def is_pending(comune: str) -> bool:
+    """True se la risoluzione online del comune è ancora in corso"""
+    with _lock:
+        return normalize_name(comune) in _pending
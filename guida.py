@@ -104,7 +104,7 @@ def tab_input_utente():
     
     | Parametro | Descrizione | Implementazione |
     |-----------|------------|----------------|
-    | Comune | Località della simulazione | Geocoding tramite `geopy.Nominatim` |
+    | Comune | Località della simulazione | `geopy.Nominatim` (rete alla prima ricerca, poi cache su disco); solo i capoluoghi di provincia da elenco locale |
     | Latitudine e Longitudine | Coordinate geografiche del sito | Derivate dal Geocoding o inserite manualmente |
     | Data | Giorno della simulazione | Serie temporale oraria (24 ore) |
     
@@ -186,7 +186,11 @@ def tab_agri_calculations():
     - **PAR pesato per ombra:**
       $$PAR_{pesato} = PAR_{totale} \cdot [(f\_ombra \cdot T_{sotto}) + (1 - f\_ombra) \cdot T_{libera}]$$
     - **DLI finale:**
-      $$DLI = \frac{\sum (PAR_{pesato} \cdot 4.6) \cdot 3600}{10^6}$$
+      $$DLI = \frac{\sum (PAR_{pesato} \cdot 4.6 \cdot \Delta t) \cdot 3600}{10^6 \cdot N_{giorni}}$$
+      con $\Delta t$ la durata in ore di ogni campione (1 a passo orario, 0.25 a "15min"):
+      su più giornate è la media giornaliera. Con "Solo ore di luce" i campioni notturni
+      (PAR nullo) non si calcolano; le medie (irradianza, temperatura celle, ombra) restano
+      sull'intero periodo, con la notte a temperatura ambiente e senza ombra
 
     ---
 
@@ -200,27 +204,32 @@ def tab_agri_calculations():
 
 # ==================== FUNZIONE PRINCIPALE ====================
 
+GUIDE_TABS = {
+    "Introduzione e Flusso": tab_introduzione,
+    "Input Utente": tab_input_utente,
+    "Calcoli PV & Geometria": tab_calculations,
+    "Calcoli Agronomici & Bibliografia": tab_agri_calculations,
+}
+
+
 def show_pv_guide():
     """
     Funzione principale per visualizzare la guida tecnica completa in un expander con tab.
+    
+    Il contenuto di una sezione viene generato solo quando la si apre.
     """
 
     with st.expander("APV Simulator by ResFarm - Manuale Operativo", expanded=False):
-        tab1, tab2, tab3, tab4 = st.tabs([
-            "Introduzione e Flusso", 
-            "Input Utente", 
-            "Calcoli PV & Geometria", 
-            "Calcoli Agronomici & Bibliografia"
-        ])
-        
-        with tab1:
-            tab_introduzione()
+        selected = st.radio(
+            "Sezione del manuale",
+            options=list(GUIDE_TABS),
+            index=None,
+            horizontal=True,
+            key="guide_tab",
+            label_visibility="collapsed"
+        )
         
-        with tab2:
-            tab_input_utente()
-            
-        with tab3:
-            tab_calculations()
-            
-        with tab4:
-            tab_agri_calculations()
+        if selected:
+            GUIDE_TABS[selected]()
+        else:
+            st.caption("Seleziona una sezione del manuale.")
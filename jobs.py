@@ -0,0 +1,124 @@
+"""
+Modulo Jobs - Simulazioni lunghe in background con avanzamento e annullamento
+I job girano su un executor in-process (nessun broker esterno): ognuno espone
+stato e avanzamento, può essere annullato e, una volta concluso, resta in un
+archivio limitato così l'utente può riaprirlo tramite il suo id anche da una
+nuova sessione.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import JOBS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """Sollevata dalla funzione del job quando riceve la richiesta di annullamento"""
+
+
+# ==================== EXECUTOR ====================
+
+_executor = ThreadPoolExecutor(max_workers=JOBS_CONFIG["workers"], thread_name_prefix="job")
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+
+def set_executor(executor):
+    """Sostituisce l'executor (es. uno sincrono per test e benchmark)"""
+    global _executor
+    _executor = executor
+
+
+# ==================== ARCHIVIO ====================
+
+def _trim():
+    """Scarta i job conclusi più vecchi oltre max_finished (chiamare con _lock)"""
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] not in ACTIVE_STATUSES]
+    for job_id in finished[:max(0, len(finished) - JOBS_CONFIG["max_finished"])]:
+        del _jobs[job_id]
+
+
+def _run(job: dict, func, args: tuple, kwargs: dict):
+    if job["cancel"].is_set():
+        job["status"] = "cancelled"
+    else:
+        job["status"] = "running"
+
+        def progress(done: int, total: int = None):
+            job["done"] = done
+            if total is not None:
+                job["total"] = total
+
+        try:
+            job["result"] = func(*args, progress=progress, cancelled=job["cancel"].is_set, **kwargs)
+            job["status"] = "done"
+        except JobCancelled:
+            job["status"] = "cancelled"
+        except Exception as e:
+            logger.exception("Job %s fallito", job["id"])
+            job["status"] = "error"
+            job["error"] = str(e)
+
+    job["finished"] = time.time()
+    with _lock:
+        _trim()
+
+
+# ==================== INTERFACCIA ====================
+
+def submit_job(func, *args, label: str = "", total: int = None, **kwargs) -> str:
+    """
+    Avvia `func(*args, progress=..., cancelled=..., **kwargs)` in background
+
+    `progress(done, total)` aggiorna l'avanzamento; `cancelled()` diventa True
+    dopo cancel_job, e la funzione dovrebbe allora sollevare JobCancelled.
+
+    Returns:
+        str: id del job
+    """
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        "id": job_id,
+        "label": label,
+        "status": "queued",
+        "done": 0,
+        "total": total,
+        "result": None,
+        "error": None,
+        "created": time.time(),
+        "finished": None,
+        "cancel": threading.Event(),
+    }
+    with _lock:
+        _jobs[job_id] = job
+        _trim()
+    _executor.submit(_run, job, func, args, kwargs)
+    return job_id
+
+
+def get_job(job_id: str):
+    """Copia dello stato del job (senza l'evento di annullamento), o None se assente"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != "cancel"}
+
+
+def cancel_job(job_id: str):
+    """Chiede l'annullamento: un job in coda non parte, uno in corso si ferma al prossimo controllo"""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        job["cancel"].set()
+
+
+def is_active(job: dict) -> bool:
+    return job["status"] in ACTIVE_STATUSES
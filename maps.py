@@ -3,25 +3,39 @@ Modulo per la visualizzazione della mappa interattiva e info impianto
 """
 
 import streamlit as st
+import streamlit.components.v1 as components
+import profiling
 import folium
+from branca.element import MacroElement
+from jinja2 import Template
 from streamlit_folium import st_folium
-from config import CHART_CONFIG
+from config import CHART_CONFIG, MAP_CONFIG
+from offline_tiles import tiles_available
 
 
 # ==================== UTILITY ====================
 
-def get_screen_width() -> int:
-    """Rileva larghezza schermo"""
-    try:
-        from screeninfo import get_monitors
-        return get_monitors()[0].width
-    except:
-        return CHART_CONFIG.get("screen_width_fallback", 1200)
+MOBILE_USER_AGENT_TOKENS = ("Mobi", "Android", "iPhone", "iPad")
 
 
-def get_map_height(screen_width: int) -> int:
-    """Determina altezza mappa in base alla larghezza schermo"""
-    if screen_width <= 480:
+def get_client_device() -> str:
+    """
+    Classe del dispositivo client ("mobile" o "desktop")
+    
+    Ricavata una sola volta per sessione dallo User-Agent della richiesta del
+    browser e conservata in session_state; il resto del layout responsive è
+    affidato alle media query di config.CSS.
+    """
+    if "client_device" not in st.session_state:
+        user_agent = st.context.headers.get("User-Agent", "")
+        is_mobile = any(token in user_agent for token in MOBILE_USER_AGENT_TOKENS)
+        st.session_state["client_device"] = "mobile" if is_mobile else "desktop"
+    return st.session_state["client_device"]
+
+
+def get_map_height(device: str) -> int:
+    """Determina altezza mappa in base al dispositivo client"""
+    if device == "mobile":
         return CHART_CONFIG.get("map_height_mobile", 400)
     else:
         return CHART_CONFIG.get("map_height_desktop", 600)
@@ -29,13 +43,57 @@ def get_map_height(screen_width: int) -> int:
 
 # ==================== CREAZIONE MAPPA ====================
 
-def create_location_map(lat: float, lon: float, comune: str) -> folium.Map:
-    """Crea mappa interattiva con marker della località"""
+class OfflineTileFallback(MacroElement):
+    """Sostituisce il layer di tile con quello locale dopo ripetuti errori di caricamento"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var errors = 0;
+            {{ this.primary.get_name() }}.on('tileerror', function () {
+                errors += 1;
+                if (errors !== {{ this.threshold }}) { return; }
+                {{ this._parent.get_name() }}.removeLayer({{ this.primary.get_name() }});
+                L.tileLayer({{ this.url|tojson }}, {
+                    maxZoom: {{ this.max_zoom }},
+                    attribution: 'Tile offline'
+                }).addTo({{ this._parent.get_name() }});
+            });
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, primary: folium.TileLayer, url: str, max_zoom: int, threshold: int):
+        super().__init__()
+        self._name = "OfflineTileFallback"
+        self.primary = primary
+        self.url = url
+        self.max_zoom = max_zoom
+        self.threshold = threshold
+
+
+def create_location_map(lat: float, lon: float, comune: str, height: int = None,
+                        offline: bool = None) -> folium.Map:
+    """
+    Crea mappa interattiva con marker della località
+    Il fallback sulle tile locali si aggiunge solo se static/tiles esiste (offline=None: verifica su disco).
+    """
+    if offline is None:
+        offline = tiles_available()
     m = folium.Map(
         location=[lat, lon], 
-        zoom_start=6, 
-        tiles='Cartodb Positron'
+        zoom_start=MAP_CONFIG["zoom_start"], 
+        tiles=None,
+        height=f"{height}px" if height else "100%"
     )
+    primary = folium.TileLayer(MAP_CONFIG["tiles"]).add_to(m)
+    if offline and MAP_CONFIG.get("offline_tiles_url"):
+        m.add_child(OfflineTileFallback(
+            primary,
+            MAP_CONFIG["offline_tiles_url"],
+            MAP_CONFIG["offline_tiles_max_zoom"],
+            MAP_CONFIG["tile_errors_before_fallback"]
+        ))
     folium.Marker(
         [lat, lon],
         tooltip=comune,
@@ -44,6 +102,12 @@ def create_location_map(lat: float, lon: float, comune: str) -> folium.Map:
     ).add_to(m)
     return m
 
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def render_location_map_html(lat: float, lon: float, comune: str, height: int, offline: bool) -> str:
+    """HTML completo della mappa, in cache per località, altezza e presenza delle tile locali"""
+    return create_location_map(lat, lon, comune, height, offline).get_root().render()
+
 # ==================== INFO BOX ====================
 
 def format_info_item(name: str, value) -> str:
@@ -77,55 +141,11 @@ def create_info_box_content(params: dict) -> str:
 
 
 def create_info_box_html(params: dict, max_height: int = 600) -> str:
-    """Crea HTML info box responsive con stile ottimizzato per tutti i dispositivi"""
+    """Crea HTML info box responsive (stili condivisi in config.CSS, classe .info-box)"""
     
     content = create_info_box_content(params)
     
-    return f"""
-    <div class="formula-box" style="
-        display: grid;
-        grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-        gap: 0.25rem 0.5rem;
-        padding: clamp(0.25rem, 1.5vw, 0.5rem) clamp(0.2rem, 1vw, 0.25rem);
-        margin: 0;
-        font-family: 'Inter', sans-serif;
-        font-size: clamp(0.75rem, 1.5vw, 0.95rem);
-        max-height: {max_height}px;
-        overflow-y: auto;
-    ">
-        {content}
-    </div>
-    
-    <style>
-        .formula-box::-webkit-scrollbar {{
-            width: 8px;
-        }}
-        .formula-box::-webkit-scrollbar-track {{
-            background: #ffffff;
-            border-radius: 4px;
-        }}
-        .formula-box::-webkit-scrollbar-thumb {{
-            background-color: #74a65b;
-            border-radius: 4px;
-            border: 2px solid #ffffff;
-        }}
-        .formula-box {{
-            scrollbar-width: thin;
-            scrollbar-color: #74a65b #ffffff;
-        }}
-        .info-item {{
-            background: white;
-            padding: clamp(0.2rem, 1vw, 0.5rem);
-            border-radius: 4px;
-            box-shadow: 0 1px 2px rgba(0,0,0,0.05);
-        }}
-        @media screen and (max-width: 480px) {{
-            .formula-box {{
-                grid-template-columns: repeat(auto-fit, minmax(120px, 1fr));
-            }}
-        }}
-    </style>
-    """
+    return f'<div class="formula-box info-box" style="max-height: {max_height}px;">{content}</div>'
 
 # ==================== FUNZIONE PRINCIPALE ====================
 
@@ -137,9 +157,14 @@ def display_map_section(params: dict):
 
     st.markdown('<p class="section-header">Resoconto dati di INPUT</p>', unsafe_allow_html=True)
 
-    screen_width = get_screen_width()
-    map_height = get_map_height(screen_width)
+    map_height = get_map_height(get_client_device())
+
+    with profiling.timed("map", interactive=MAP_CONFIG["interactive"]):
+        display_map_columns(params, map_height)
+
 
+def display_map_columns(params: dict, map_height: int):
+    """Info box e mappa affiancati"""
     col_info, col_map = st.columns([2, 1], gap="medium")
 
     with col_info:
@@ -147,5 +172,12 @@ def display_map_section(params: dict):
         st.markdown(info_box_html, unsafe_allow_html=True)
 
     with col_map:
-        location_map = create_location_map(params["lat"], params["lon"], params["comune"])
-        st_folium(location_map, width="100%", height=map_height)
+        if MAP_CONFIG["interactive"]:
+            location_map = create_location_map(params["lat"], params["lon"], params["comune"])
+            st_folium(location_map, width="100%", height=map_height)
+        else:
+            # Nessuna interazione richiesta: HTML statico, senza round trip di st_folium
+            map_html = render_location_map_html(
+                params["lat"], params["lon"], params["comune"], map_height, tiles_available()
+            )
+            components.html(map_html, height=map_height)
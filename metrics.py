@@ -2,17 +2,20 @@
 Modulo Metriche - Visualizzazione risultati con card pulite e moderne
 """
 
+import pandas as pd
 import streamlit as st
+import profiling
 
 
 # ==================== CONFIGURAZIONE STILI ====================
 
-# Stile per unità più piccole (personalizzabile una sola volta)
-UNIT_SMALL_STYLE = 'font-size:16px'   # cambia valore a piacere
+# "batched": tutte le sezioni in un unico elemento HTML con classi CSS condivise
+# "columns": una colonna Streamlit e un markdown per ogni card
+METRICS_RENDER_MODE = "batched"
 
 def style_unit(unit: str) -> str:
-    """Applica lo stile definito alle unità."""
-    return f'<span style="{UNIT_SMALL_STYLE}">{unit}</span>'
+    """Applica lo stile definito alle unità (classe .metric-unit in config.CSS)."""
+    return f'<span class="metric-unit">{unit}</span>'
 
 
 # ==================== UTILITY ====================
@@ -42,65 +45,64 @@ def create_metric_card(label: str, value: str, description: str = "", color: str
     """
 
 
-def get_screen_width() -> int:
-    try:
-        from screeninfo import get_monitors
-        return get_monitors()[0].width
-    except:
-        return 1200
+def create_metric_card_compact(label: str, value: str, description: str = "", color: str = None) -> str:
+    """Card senza stili inline: l'aspetto è definito dalle classi in config.CSS"""
+    color_style = f' style="color:{color}"' if color else ""
+    description_html = f'<div class="metric-description">{description}</div>' if description else ""
+    return (
+        f'<div class="metric-card metric-card-flat">'
+        f'<div class="metric-label">{label}</div>'
+        f'<div class="metric-value"{color_style}>{value}</div>'
+        f'{description_html}</div>'
+    )
 
 
 def display_card_group(cards: list):
-    screen_width = get_screen_width()
-    
-    if screen_width > 768:
-        for i in range(0, len(cards), 3):
-            row_cards = cards[i:i+3]
-            while len(row_cards) < 3:
-                row_cards.append("")
-            
-            cols = st.columns(3, gap="medium")
-            for col, card in zip(cols, row_cards):
-                if card:
-                    col.markdown(card, unsafe_allow_html=True)
-    else:
-        for card in cards:
-            st.markdown(card, unsafe_allow_html=True)
+    # Su schermi stretti le colonne vengono impilate dalle media query di config.CSS
+    for i in range(0, len(cards), 3):
+        row_cards = cards[i:i+3]
+        while len(row_cards) < 3:
+            row_cards.append("")
+        
+        cols = st.columns(3, gap="medium")
+        for col, card in zip(cols, row_cards):
+            if card:
+                col.markdown(card, unsafe_allow_html=True)
 
 
 # ==================== GENERAZIONE METRICHE ====================
 
-def generate_solar_metrics(results: dict) -> list:
+def generate_solar_metrics(results: dict, card=create_metric_card) -> list:
     return [
-        create_metric_card(
+        card(
             "GHI",
-            f"{format_value(results['GHI_Wm2'].mean(), 'W/m²', small_unit=True)}<br>"
+            f"{format_value(results['GHI_Whm2'] / results['period_hours'], 'W/m²', small_unit=True)}<br>"
             f"{format_value(results['GHI_Whm2'], 'Wh/m²', small_unit=True)}",
             "Radiazione globale orizzontale (media oraria / totale giornaliero)"
         ),
         
-        create_metric_card(
+        card(
             "DNI",
-            f"{format_value(results['DNI_Wm2'].mean(), 'W/m²', small_unit=True)}<br>"
+            f"{format_value(results['DNI_Whm2'] / results['period_hours'], 'W/m²', small_unit=True)}<br>"
             f"{format_value(results['DNI_Whm2'], 'Wh/m²', small_unit=True)}",
             "Radiazione diretta normale (media oraria / totale giornaliero)"
         ),
         
-        create_metric_card(
+        card(
             "DHI",
-            f"{format_value(results['DHI_Wm2'].mean(), 'W/m²', small_unit=True)}<br>"
+            f"{format_value(results['DHI_Whm2'] / results['period_hours'], 'W/m²', small_unit=True)}<br>"
             f"{format_value(results['DHI_Whm2'], 'Wh/m²', small_unit=True)}",
             "Radiazione diffusa orizzontale (media oraria / totale giornaliero)"
         ),
         
-        create_metric_card(
+        card(
             "POA",
-            f"{format_value(results['POA_Wm2'].mean(), 'W/m²', small_unit=True)}<br>"
+            f"{format_value(results['POA_Whm2'] / results['period_hours'], 'W/m²', small_unit=True)}<br>"
             f"{format_value(results['POA_Whm2'], 'Wh/m²', small_unit=True)}",
             "Radiazione sul piano pannelli (media oraria / totale giornaliero)"
         ),
         
-        create_metric_card(
+        card(
             "T° Media Celle",
             f"{format_value(results['T_cell_avg'], '°C', 1)}",
             "Temperatura media delle celle fotovoltaiche"
@@ -108,23 +110,23 @@ def generate_solar_metrics(results: dict) -> list:
     ]
 
 
-def generate_production_metrics(results: dict) -> list:
+def generate_production_metrics(results: dict, card=create_metric_card) -> list:
     return [
-        create_metric_card(
+        card(
             "Produzione Singolo Pannello",
-            f"{format_value(results['power_single_W'].mean(), 'W', small_unit=True)}<br>"
+            f"{format_value(results['energy_single_Wh'] / results['period_hours'], 'W', small_unit=True)}<br>"
             f"{format_value(results['energy_single_Wh'], 'Wh', small_unit=True)}",
             "Potenza media oraria / Energia giornaliera singolo pannello"
         ),
         
-        create_metric_card(
+        card(
             "Produzione Totale",
-            f"{format_value(results['power_total_W'].mean(), 'W', small_unit=True)}<br>"
+            f"{format_value(results['energy_total_Wh'] / results['period_hours'], 'W', small_unit=True)}<br>"
             f"{format_value(results['energy_total_Wh'], 'Wh', small_unit=True)}",
             "Potenza media oraria / Energia giornaliera tutti i pannelli"
         ),
         
-        create_metric_card(
+        card(
             "Produzione Energetica per m²",
             f"{format_value(results['energy_total_Wh_m2'], 'Wh/m²', 1, small_unit=True)}",
             "Energia giornaliera per metro quadro di pannello"
@@ -132,37 +134,37 @@ def generate_production_metrics(results: dict) -> list:
     ]
 
 
-def generate_geometric_metrics(results: dict) -> list:
+def generate_geometric_metrics(results: dict, card=create_metric_card) -> list:
     gcr = results['gcr']
     gcr_color = "red" if gcr > 0.4 else "green"
     
     return [
-        create_metric_card(
+        card(
             "Superficie Totale Pannelli",
             f"{format_value(results['superficie_totale_pannelli'], 'm²', 0, small_unit=True)}",
             "Area nominale totale (base × altezza × numero pannelli)"
         ),
         
-        create_metric_card(
+        card(
             "Spazio Occupato (Proiezione)",
             f"{format_value(results['proiezione_totale_pannelli'], 'm²', 0, small_unit=True)}",
             "Ingombro al suolo considerando tilt (proiezione pannelli)"
         ),
 
-        create_metric_card(
+        card(
             "GCR (Ground Coverage Ratio)",
             f"{format_value(gcr * 100, '%', 1)}",
             "Rapporto tra proiezione pannelli e superficie campo",
             color=gcr_color
         ),
         
-        create_metric_card(
+        card(
             "Superficie Libera",
             f"{format_value(results['superficie_libera'], 'm²', 0, small_unit=True)}",
             "Terreno libero disponibile (campo - proiezione pannelli)"
         ),
 
-        create_metric_card(
+        card(
             "Pannelli installabili",
             f"{format_value(results['total_panels'], '', 0)}",
             "N. pannelli installabili secondo dimensionamento (campo/pannelli)"
@@ -170,44 +172,44 @@ def generate_geometric_metrics(results: dict) -> list:
     ]
 
 
-def generate_agri_metrics(agri_results: dict) -> list:
+def generate_agri_metrics(agri_results: dict, card=create_metric_card) -> list:
     crop_color = agri_results.get('crop_status_color', None)
 
     return [
-        create_metric_card(
+        card(
             "DLI totale giornaliero",
             f"{format_value(agri_results['DLI_mol_m2_day'], 'mol/m²·day', 1, small_unit=True)}",
             "Totale giornaliero di luce fotosinteticamente attiva"
         ),
 
-        create_metric_card( 
+        card( 
             "DLI Richiesto",
             f"{format_value(agri_results['DLI_min'], agri_results['unit'], small_unit=True)}<br>"
             f"{format_value(agri_results['DLI_opt'], agri_results['unit'], small_unit=True)}",
             "Fabbisogno giornaliero della coltura (min - ottimale)"
         ),
 
-        create_metric_card(
+        card(
             "Adeguatezza Luminosità",
             f"{format_value(agri_results['crop_light_adequacy_pct'], '%', 0)}",
             "Percentuale del fabbisogno luminoso soddisfatto dalla luce disponibile",
             color=crop_color
         ),
 
-        create_metric_card(
+        card(
             "Stato Coltura",
             agri_results['crop_status'],
             "Valutazione dell'idoneità agronomica della coltura secondo il DLI",
             color=crop_color
         ),
 
-        create_metric_card(
+        card(
             "Ombreggiamento Medio",
             f"{format_value(agri_results['shaded_fraction_avg']*100, '%', 1)}",
             "Media giornaliera della frazione di superficie del campo in ombra"
         ),
         
-        create_metric_card(
+        card(
             "Ombra Massima",
             f"{format_value(agri_results['shadow_area_max_m2'], 'm²', 0, small_unit=True)}",
             "Area massima in ombra rilevata sul campo durante la giornata"
@@ -217,35 +219,44 @@ def generate_agri_metrics(agri_results: dict) -> list:
 
 # ==================== FUNZIONE PRINCIPALE ====================
 
-def display_metrics(results: dict, params: dict):
-    st.markdown(
-        '<p class="section-header" style="margin-top: 1rem;">'
-        'Irradiamento Solare e Temperatura Pannelli'
-        '</p>',
-        unsafe_allow_html=True
-    )
-    display_card_group(generate_solar_metrics(results))
-    
-    st.markdown(
-        '<p class="section-header" style="margin-top: 1rem;">'
-        'Produzione Elettrica'
-        '</p>',
-        unsafe_allow_html=True
-    )
-    display_card_group(generate_production_metrics(results))
-    
-    st.markdown(
-        '<p class="section-header" style="margin-top: 1rem;">'
-        'Geometria e Copertura Terreno'
-        '</p>',
-        unsafe_allow_html=True
-    )
-    display_card_group(generate_geometric_metrics(results))
+METRIC_SECTIONS = [
+    ("Irradiamento Solare e Temperatura Pannelli", generate_solar_metrics, None),
+    ("Produzione Elettrica", generate_production_metrics, None),
+    ("Geometria e Copertura Terreno", generate_geometric_metrics, None),
+    ("Metriche Agronomiche", generate_agri_metrics, "agri_results"),
+]
+
+
+def build_metrics_html(results: dict) -> str:
+    """Costruisce tutte le sezioni metriche come un unico frammento HTML"""
+    sections = []
+    for title, generate, key in METRIC_SECTIONS:
+        cards = generate(results[key] if key else results, card=create_metric_card_compact)
+        sections.append(
+            f'<p class="section-header">{title}</p>'
+            f'<div class="metric-grid">{"".join(cards)}</div>'
+        )
+    return f'<div class="metrics-block">{"".join(sections)}</div>'
 
-    st.markdown(
-        '<p class="section-header" style="margin-top: 1rem;">'
-        'Metriche Agronomiche'
-        '</p>',
-        unsafe_allow_html=True
-    )
-    display_card_group(generate_agri_metrics(results["agri_results"]))
+
+def display_metrics(results: dict, params: dict):
+    with profiling.timed("metrics", mode=METRICS_RENDER_MODE):
+        if METRICS_RENDER_MODE == "batched":
+            # Un solo delta verso il browser per tutte le card
+            st.markdown(build_metrics_html(results), unsafe_allow_html=True)
+            return
+
+        for title, generate, key in METRIC_SECTIONS:
+            st.markdown(
+                f'<p class="section-header" style="margin-top: 1rem;">{title}</p>',
+                unsafe_allow_html=True
+            )
+            display_card_group(generate(results[key] if key else results))
+
+
+def display_performance_panel(perf: dict):
+    """Pannello comprimibile con i tempi delle fasi dell'ultimo rerun"""
+    with st.expander(f"⏱️ Performance ({perf['total_ms']:.0f} ms)", expanded=False):
+        stages = pd.DataFrame(perf["stages"])
+        stages["ms"] = stages["ms"].round(2)
+        st.dataframe(stages, hide_index=True, width="stretch")
@@ -0,0 +1,90 @@
+"""
+Modulo Tile Offline - Scarica le tile della mappa per il fallback locale
+Le tile vengono salvate in static/tiles/{z}/{x}/{y}.png, servite da Streamlit
+(enableStaticServing) e usate dalla mappa solo se la cartella esiste e il
+server di tile principale non risponde. Leaflet resta caricato dalla CDN di
+folium: il fallback copre un server di tile irraggiungibile, non l'assenza di rete.
+
+Download per il riquadro dell'Italia fino allo zoom indicato (rispettare i
+termini d'uso del server scelto; ~2200 tile fino allo zoom 10):
+    python -m offline_tiles download [--max-zoom 10] [--url https://.../{z}/{x}/{y}.png]
+"""
+
+import argparse
+import math
+import os
+import time
+import urllib.request
+from config import MAP_CONFIG, OFFLINE_TILES_DIR
+
+
+def tiles_available(tiles_dir: str = OFFLINE_TILES_DIR) -> bool:
+    """True se la cartella delle tile locali esiste e contiene almeno un livello di zoom"""
+    return os.path.isdir(tiles_dir) and any(name.isdigit() for name in os.listdir(tiles_dir))
+
+
+# ==================== DOWNLOAD ====================
+
+def tile_range(bbox: tuple, zoom: int) -> tuple:
+    """Indici (x0, x1, y0, y1) inclusi delle tile Web Mercator che coprono bbox (lon/lat min-max)"""
+    lon_min, lat_min, lon_max, lat_max = bbox
+    n = 2 ** zoom
+
+    def to_x(lon: float) -> int:
+        return min(n - 1, int((lon + 180) / 360 * n))
+
+    def to_y(lat: float) -> int:
+        lat = math.radians(lat)
+        return min(n - 1, int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n))
+
+    return to_x(lon_min), to_x(lon_max), to_y(lat_max), to_y(lat_min)
+
+
+def download_tiles(url: str, bbox: tuple, max_zoom: int, tiles_dir: str = OFFLINE_TILES_DIR) -> int:
+    """
+    Scarica le tile da zoom 0 a max_zoom; quelle già presenti non vengono riscaricate
+
+    Returns:
+        int: numero di tile scaricate
+    """
+    count = 0
+    for zoom in range(max_zoom + 1):
+        x0, x1, y0, y1 = tile_range(bbox, zoom)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                path = os.path.join(tiles_dir, str(zoom), str(x), f"{y}.png")
+                if os.path.exists(path):
+                    continue
+                request = urllib.request.Request(
+                    url.format(z=zoom, x=x, y=y), headers={"User-Agent": MAP_CONFIG["tiles_user_agent"]}
+                )
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    content = response.read()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(content)
+                count += 1
+                time.sleep(MAP_CONFIG["tiles_download_delay_s"])
+    return count
+
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Tile locali per la mappa offline")
+    commands = parser.add_subparsers(dest="command", required=True)
+    download = commands.add_parser("download", help="Scarica le tile del riquadro in static/tiles")
+    download.add_argument("--url", default=MAP_CONFIG["tiles_download_url"])
+    download.add_argument("--max-zoom", type=int, default=MAP_CONFIG["offline_tiles_max_zoom"])
+    download.add_argument("--bbox", type=float, nargs=4, default=MAP_CONFIG["offline_tiles_bbox"],
+                          metavar=("LON_MIN", "LAT_MIN", "LON_MAX", "LAT_MAX"))
+    download.add_argument("-o", "--output", default=OFFLINE_TILES_DIR)
+    args = parser.parse_args()
+
+    if args.command == "download":
+        count = download_tiles(args.url, tuple(args.bbox), args.max_zoom, args.output)
+        print(f"{count} tile scritte in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Modulo Ottimizzatore - Fronte di Pareto energia / adeguatezza luminosa della coltura
+Cerca tilt, azimuth, pitch, carreggiata, altezza e numero di pannelli che non
+possono migliorare l'energia senza peggiorare la luce per la coltura, nel
+rispetto dei vincoli (DLI ≥ DLI_min della coltura, GCR massimo, pannelli che
+stanno nel campo). Ricerca a due fasi: griglia quasi-casuale grossolana, poi
+raffinamenti sempre più stretti attorno ai punti del fronte. Ogni candidato
+(quantizzato) si valuta una sola volta grazie al memo, e tutti condividono
+posizione solare e irradianza del sito (sensitivity.site_solar_data).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+from agri_calculations import evaluate_crop_suitability
+from config import HECTARE_M2, OPTIMIZER_CONFIG
+from jobs import JobCancelled
+from sensitivity import SITE_KEYS, evaluate_designs, site_solar_data
+
+# Variabile -> (etichetta, passo di quantizzazione)
+VARIABLES = {
+    "tilt_pannello": ("Tilt [°]", 1.0),
+    "azimuth_pannello": ("Azimuth [°]", 1.0),
+    "pitch_laterale": ("Pitch laterale [m]", 0.1),
+    "carreggiata": ("Carreggiata [m]", 0.1),
+    "altezza_suolo": ("Altezza dal suolo [m]", 0.1),
+    "num_panels_total": ("Numero pannelli", 1.0),
+}
+
+# Parametri fissi da cui dipendono le valutazioni (chiave del memo)
+CONTEXT_KEYS = SITE_KEYS + ("lato_maggiore", "lato_minore", "hectares", "eff", "noct",
+                            "temp_coeff", "losses", "albedo", "crops")
+
+
+# ==================== VINCOLI E FRONTE ====================
+
+def max_panels_batch(params: dict, pitch: np.ndarray, carreggiata: np.ndarray) -> np.ndarray:
+    """Pannelli che entrano nel campo, come calculate_max_panels, per più spaziature"""
+    lato_campo = np.sqrt(params["hectares"] * HECTARE_M2)
+    per_row = np.floor(lato_campo / np.maximum(pitch, 1e-9))
+    rows = np.floor(lato_campo / (params["lato_minore"] + carreggiata))
+    return per_row * rows
+
+
+def gcr_batch(params: dict, tilt: np.ndarray, num_panels: np.ndarray) -> np.ndarray:
+    """GCR come calculate_occupied_space: proiezione a terra dei pannelli / superficie campo"""
+    area = params["lato_maggiore"] * params["lato_minore"]
+    return area * np.cos(np.radians(tilt)) * num_panels / (params["hectares"] * HECTARE_M2)
+
+
+def pareto_front(energy: np.ndarray, adequacy: np.ndarray) -> np.ndarray:
+    """Indici dei punti non dominati (massimizzando entrambe), per energia decrescente"""
+    order = np.lexsort((-adequacy, -energy))
+    best, front = -np.inf, []
+    for i in order:
+        if adequacy[i] > best:
+            front.append(i)
+            best = adequacy[i]
+    return np.array(front, dtype=int)
+
+
+# ==================== RICERCA ====================
+
+def default_bounds(params: dict) -> pd.DataFrame:
+    """Tabella degli intervalli di ricerca (una riga per variabile) con il valore attuale"""
+    bounds = dict(OPTIMIZER_CONFIG["bounds"])
+    low_spacing = max_panels_batch(params, bounds["pitch_laterale"][0], bounds["carreggiata"][0])
+    bounds["num_panels_total"] = (1.0, float(max(1, low_spacing)))
+    return pd.DataFrame([
+        {"variabile": name, "descrizione": label, "valore": float(params[name]),
+         "min": float(bounds[name][0]), "max": float(bounds[name][1])}
+        for name, (label, _) in VARIABLES.items()
+    ]).set_index("variabile")
+
+
+def _quantize(values: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    steps = np.array([step for _, step in VARIABLES.values()])
+    return np.clip(np.round(values / steps) * steps, low, high).round(6)
+
+
+def _evaluate(candidates: np.ndarray, params: dict, site: dict, memo: dict) -> tuple:
+    """Valuta i candidati non ancora nel memo; restituisce (nuovi, già valutati)"""
+    unique = list(dict.fromkeys(map(tuple, candidates)))
+    todo = [key for key in unique if key not in memo]
+    if todo:
+        values = np.array(todo)
+        out = evaluate_designs(site, params, {name: values[:, i] for i, name in enumerate(VARIABLES)})
+        for key, energy, dli in zip(todo, out["energy_total_kWh"], out["DLI_mol_m2_day"]):
+            memo[key] = (energy, dli)
+    return len(todo), len(unique) - len(todo)
+
+
+def optimize_layout(params: dict, bounds: pd.DataFrame, memo: dict = None,
+                    dli_constraint: bool = True, gcr_max: float = OPTIMIZER_CONFIG["gcr_max"],
+                    seed: int = None, progress=None, cancelled=None) -> dict:
+    """
+    Fronte di Pareto energia / adeguatezza con ricerca grossolana e raffinamenti
+
+    Args:
+        params: parametri impianto (sito, periodo e parametri non ottimizzati)
+        bounds: tabella di default_bounds (min, max per variabile)
+        memo: dizionario persistente delle valutazioni (es. in session_state); le
+              voci sono separate per contesto (sito, periodo, moduli, coltura)
+        dli_constraint: richiede DLI medio giornaliero ≥ DLI_min della coltura
+        gcr_max: GCR massimo (None = nessun limite)
+        progress, cancelled: come per i job (jobs.submit_job)
+
+    Returns:
+        dict: "front" (DataFrame dei progetti non dominati), "candidates" (tutti i
+              valutati con fattibilità), "evaluations" (nuove) e "memo_hits" (riusate)
+    """
+    config = OPTIMIZER_CONFIG
+    memo = {} if memo is None else memo
+    context = tuple((k, params.get(k)) for k in CONTEXT_KEYS)
+    cache = memo.setdefault(context, {})
+
+    low, high = bounds["min"].to_numpy(dtype=float), bounds["max"].to_numpy(dtype=float)
+    rng = np.random.default_rng(seed)
+    site = site_solar_data(params)
+    crop = evaluate_crop_suitability(1.0, params.get("crops", "Cereali"))
+
+    def feasible_table() -> pd.DataFrame:
+        table = pd.DataFrame(list(cache.keys()), columns=list(VARIABLES))
+        table = table[((table.to_numpy() >= low - 1e-9) & (table.to_numpy() <= high + 1e-9)).all(axis=1)]
+        values = np.array([cache[tuple(row)] for row in table.to_numpy()]).reshape(-1, 2)
+        table["energy_kWh"] = values[:, 0]
+        table["DLI_mol_m2_day"] = values[:, 1]
+        table["crop_light_adequacy_pct"] = table["DLI_mol_m2_day"] / crop["DLI_opt"] * 100
+        table["gcr"] = gcr_batch(params, table["tilt_pannello"], table["num_panels_total"])
+        feasible = table["num_panels_total"] <= max_panels_batch(
+            params, table["pitch_laterale"], table["carreggiata"])
+        if dli_constraint:
+            feasible &= table["DLI_mol_m2_day"] >= crop["DLI_min"]
+        if gcr_max is not None:
+            feasible &= table["gcr"] <= gcr_max
+        table["fattibile"] = feasible
+        return table.reset_index(drop=True)
+
+    # Fase 1: griglia quasi-casuale sull'intero dominio
+    unit = qmc.Sobol(d=len(VARIABLES), scramble=True, seed=seed).random(config["coarse_samples"])
+    evaluations, memo_hits = _evaluate(_quantize(low + unit * (high - low), low, high), params, site, cache)
+    total_steps = 1 + len(config["refine_radius"])
+    if progress is not None:
+        progress(1, total_steps)
+
+    # Fase 2: campioni locali attorno al fronte, con raggio decrescente
+    for step, radius in enumerate(config["refine_radius"], start=2):
+        if cancelled is not None and cancelled():
+            raise JobCancelled()
+        table = feasible_table()
+        feasible = table[table["fattibile"]]
+        if feasible.empty:
+            break
+        front = feasible.iloc[pareto_front(feasible["energy_kWh"].to_numpy(),
+                                           feasible["crop_light_adequacy_pct"].to_numpy())]
+        if len(front) > config["max_front"]:
+            front = front.iloc[np.linspace(0, len(front) - 1, config["max_front"]).round().astype(int)]
+
+        centers = front[list(VARIABLES)].to_numpy()
+        offsets = rng.uniform(-radius, radius, (len(centers), config["refine_samples"], len(VARIABLES)))
+        local = (centers[:, None, :] + offsets * (high - low)).reshape(-1, len(VARIABLES))
+        new, hits = _evaluate(_quantize(local, low, high), params, site, cache)
+        evaluations, memo_hits = evaluations + new, memo_hits + hits
+        if progress is not None:
+            progress(step, total_steps)
+
+    table = feasible_table()
+    feasible = table[table["fattibile"]]
+    front = feasible.iloc[pareto_front(feasible["energy_kWh"].to_numpy(),
+                                       feasible["crop_light_adequacy_pct"].to_numpy())]
+    return {
+        "front": front.drop(columns="fattibile").reset_index(drop=True),
+        "candidates": table,
+        "evaluations": evaluations,
+        "memo_hits": memo_hits,
+    }
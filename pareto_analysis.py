@@ -0,0 +1,92 @@
+"""
+Modulo Analisi Pareto - Compromesso energia / luce per la coltura sui layout
+La ricerca gira come job in background (id nell'URL, ?pareto=...); le valutazioni
+restano nel memo di sessione, così una nuova ricerca sullo stesso sito riparte da lì.
+"""
+
+from datetime import date
+import pandas as pd
+import streamlit as st
+from config import OPTIMIZER_CONFIG
+from jobs import get_job, is_active, submit_job
+from optimizer import VARIABLES, default_bounds, optimize_layout
+from period_analysis import job_failed, job_progress
+
+PERIODS = {"anno": "Anno (orario)", "giorno": "Giornata selezionata"}
+
+
+def display_pareto_result(job: dict):
+    """Candidati e fronte nel piano energia / adeguatezza, tabella ed esportazione del fronte"""
+    if job_failed(job):
+        return
+
+    result = job["result"]
+    front, candidates = result["front"], result["candidates"]
+    st.caption(
+        f"{result['evaluations']:,} nuove valutazioni · {result['memo_hits']:,} dal memo · "
+        f"{int(candidates['fattibile'].sum()):,} progetti fattibili · {len(front)} sul fronte"
+    )
+    if front.empty:
+        st.warning("Nessun progetto rispetta i vincoli: allarga gli intervalli o rilassa i vincoli.")
+        return
+
+    plot = pd.concat([
+        candidates[candidates["fattibile"]].assign(serie="fattibili"),
+        front.assign(serie="fronte di Pareto"),
+    ])
+    st.scatter_chart(plot, x="crop_light_adequacy_pct", y="energy_kWh", color="serie", height=320)
+
+    columns = {name: label for name, (label, _) in VARIABLES.items()}
+    st.dataframe(
+        front.rename(columns={**columns, "energy_kWh": "Energia [kWh]", "DLI_mol_m2_day": "DLI [mol/m²/d]",
+                              "crop_light_adequacy_pct": "Adeguatezza [%]", "gcr": "GCR"}).round(3),
+        hide_index=True, width="stretch"
+    )
+    st.download_button(
+        "Scarica fronte CSV",
+        front.to_csv(index=False).encode("utf-8"),
+        file_name="fronte_pareto.csv",
+        mime="text/csv",
+        key="pareto_csv"
+    )
+
+
+def display_pareto(params: dict):
+    """Intervalli, vincoli, avvio della ricerca e risultato"""
+    with st.expander("🧭 Ottimizzazione layout (Pareto)", expanded="pareto" in st.query_params):
+        bounds = st.data_editor(
+            default_bounds(params),
+            key="pareto_bounds",
+            disabled=("variabile", "descrizione", "valore"),
+            width="stretch"
+        )
+
+        col1, col2, col3, col4 = st.columns([2, 2, 2, 1], vertical_alignment="bottom")
+        dli_constraint = col1.checkbox("DLI ≥ DLI minimo della coltura", value=True, key="pareto_dli")
+        gcr_max = col2.number_input(
+            "GCR massimo", min_value=0.0, max_value=1.0, step=0.05, key="pareto_gcr",
+            value=OPTIMIZER_CONFIG["gcr_max"], help="0 = nessun limite"
+        )
+        period = col3.selectbox("Periodo", list(PERIODS), format_func=PERIODS.get, key="pareto_period")
+
+        if col4.button("Cerca", key="pareto_start", width="stretch"):
+            run_params = {**params, "location": None}
+            if period == "anno":
+                run_params.update(data=date(params["data"].year, 1, 1), giorni=365, freq="1h")
+            job_id = submit_job(
+                optimize_layout, run_params, bounds, st.session_state.setdefault("pareto_memo", {}),
+                dli_constraint, gcr_max or None,
+                label=f"Pareto, {PERIODS[period].lower()}"
+            )
+            st.query_params["pareto"] = job_id
+
+        job_id = st.query_params.get("pareto")
+        if not job_id:
+            return
+        job = get_job(job_id)
+        if job is None:
+            st.info("La ricerca richiesta non è più disponibile: avviala di nuovo.")
+        elif is_active(job):
+            job_progress(job_id, unit="fasi", key="pareto_job_cancel")
+        else:
+            display_pareto_result(job)
@@ -0,0 +1,212 @@
+"""
+Modulo Analisi Periodo - Simulazione su più giorni e anni sintetici come job in background
+Il periodo si simula per intero oppure attraverso k giornate tipiche
+(representative_days). Il job riceve un id salvato nell'URL (?job=... o ?ensemble=...): chi ricarica la
+pagina o la riapre più tardi ritrova l'avanzamento o il risultato finché resta in archivio.
+Totali e medie della finestra scelta con il cursore si leggono dalle somme
+cumulative del risultato (timeseries_store), senza riaggregare la serie.
+"""
+
+from datetime import timedelta
+import pandas as pd
+import streamlit as st
+from config import JOBS_CONFIG, REPRESENTATIVE_DAYS_CONFIG, STOCHASTIC_CONFIG
+from jobs import cancel_job, get_job, is_active, submit_job
+from representative_days import simulate_representative
+from simulation import simulate_period
+from stochastic import yield_ensemble
+from timeseries_store import daily_values, store_from_daily, window_means, window_totals
+
+
+@st.fragment(run_every=JOBS_CONFIG["poll_s"])
+def job_progress(job_id: str, unit: str = "giorni", key: str = "period_job_cancel"):
+    """Avanzamento del job; a conclusione riesegue l'app per mostrarne il risultato"""
+    job = get_job(job_id)
+    if job is None or not is_active(job):
+        st.rerun()
+
+    total = job["total"] or 1
+    st.progress(
+        job["done"] / total,
+        text=f"{job['label']}: {job['done']}/{total} {unit}" if job["status"] == "running"
+        else f"{job['label']}: in coda"
+    )
+    if st.button("Annulla", key=key):
+        cancel_job(job_id)
+
+
+def job_failed(job: dict) -> bool:
+    """Mostra l'esito di un job annullato o fallito; True se non c'è un risultato"""
+    if job["status"] == "cancelled":
+        st.warning(f"Simulazione {job['label']} annullata")
+    elif job["status"] == "error":
+        st.error(f"Simulazione {job['label']} non riuscita: {job['error']}")
+    return job["status"] != "done"
+
+
+FREQUENCIES = {"1h": "Orario", "15min": "15 minuti"}
+
+
+def display_representative_info(result: dict):
+    """Giornate tipiche simulate, tempi ed errore contro la simulazione completa"""
+    timings = result["timings"]
+    text = f"{len(result['medoids'])} giornate tipiche · {timings['representative_s']:.2f} s"
+    if "full_s" in timings:
+        text += (f" contro {timings['full_s']:.2f} s della simulazione completa "
+                 f"({timings['full_s'] / timings['representative_s']:.0f}× più veloce)")
+    st.caption(text)
+    if result["accuracy"] is not None:
+        st.dataframe(result["accuracy"].round(2), width="stretch")
+    with st.popover("Giornate tipiche"):
+        st.dataframe(result["medoids"], hide_index=True)
+
+
+def display_job_result(job: dict):
+    """Totali su una finestra del periodo, andamento giornaliero ed esportazione CSV"""
+    if job_failed(job):
+        return
+
+    result = job["result"]
+    if isinstance(result, pd.DataFrame):
+        result = {"daily": result}
+    if "medoids" in result:
+        display_representative_info(result)
+    daily = result["daily"]
+    store = result.get("store") or store_from_daily(daily)
+
+    # Finestra di date: totali e medie sono letture delle somme cumulative
+    first, last = daily.index[0], daily.index[-1]
+    start, end = first, last
+    if last > first:
+        start, end = st.slider("Finestra", min_value=first, max_value=last, value=(first, last),
+                               format="DD/MM/YYYY", key="period_window")
+    totals = window_totals(store, start, end)
+    means = window_means(store, start, end)
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Energia totale", f"{totals['energy_kWh']:,.0f} kWh")
+    col2.metric("Irradiazione POA", f"{totals['POA_kWh_m2']:,.0f} kWh/m²")
+    col3.metric("DLI medio", f"{means['DLI_mol_m2']:.1f} mol/m²/d")
+    col4.metric("Adeguatezza media", f"{means['adequacy_pct']:.0f} %")
+
+    st.line_chart(daily_values(store, "energy_kWh", start, end).rename("energy_total_kWh"), height=220)
+    st.line_chart(daily_values(store, "DLI_mol_m2", start, end).rename("DLI_mol_m2_day"), height=220)
+    st.download_button(
+        "Scarica CSV",
+        daily.to_csv().encode("utf-8"),
+        file_name=f"simulazione_{daily.index[0]}_{daily.index[-1]}.csv",
+        mime="text/csv",
+        key="period_job_csv"
+    )
+
+
+def display_period_analysis(params: dict):
+    """Avvio e consultazione della simulazione su un periodo"""
+    with st.expander("📅 Analisi su periodo", expanded="job" in st.query_params):
+        col1, col2 = st.columns([3, 1], vertical_alignment="bottom")
+        period = col1.date_input(
+            "Periodo",
+            value=(params["data"], params["data"] + timedelta(days=29)),
+            key="period_range",
+            help=f"Massimo {JOBS_CONFIG['max_days']} giorni, simulati in background"
+        )
+        freq = col2.selectbox("Passo", list(FREQUENCIES), format_func=FREQUENCIES.get, key="period_freq")
+
+        col1, col2, col3, col4 = st.columns([2, 1, 2, 1], vertical_alignment="bottom")
+        representative = col1.toggle(
+            "Giornate tipiche", key="period_representative",
+            help="Simula solo k giornate rappresentative e ricostruisce le altre (circa 5-10× più veloce sull'anno)"
+        )
+        k = col2.number_input(
+            "k", min_value=2, max_value=JOBS_CONFIG["max_days"], key="period_clusters",
+            value=REPRESENTATIVE_DAYS_CONFIG["clusters"], disabled=not representative
+        )
+        validate = col3.checkbox(
+            "Confronta con la completa", key="period_validate", disabled=not representative,
+            help="Esegue anche la simulazione completa e riporta l'errore dei giorni tipici"
+        )
+
+        if col4.button("Avvia", key="period_start", width="stretch") and len(period) == 2:
+            start, end = period
+            days = min((end - start).days + 1, JOBS_CONFIG["max_days"])
+            label = f"{start:%d/%m/%Y} → {start + timedelta(days=days - 1):%d/%m/%Y}"
+            if representative:
+                job_id = submit_job(
+                    simulate_representative, {**params, "location": None}, start, days, int(k), freq, validate,
+                    label=f"{label}, {int(k)} giornate tipiche", total=2 * days if validate else days
+                )
+            else:
+                job_id = submit_job(
+                    simulate_period, {**params, "location": None}, start, days, freq=freq,
+                    label=label, total=days
+                )
+            st.query_params["job"] = job_id
+
+        job_id = st.query_params.get("job")
+        if not job_id:
+            return
+        job = get_job(job_id)
+        if job is None:
+            st.info("La simulazione richiesta non è più disponibile: avviala di nuovo.")
+        elif is_active(job):
+            job_progress(job_id)
+        else:
+            display_job_result(job)
+
+
+# ==================== ANNI SINTETICI (P50/P90) ====================
+
+def display_ensemble_result(job: dict):
+    """Bande P10/P50/P90 annuali, mensili e del DLI giornaliero"""
+    if job_failed(job):
+        return
+
+    result = job["result"]
+    annual = result["annual"]
+    st.caption(f"{result['years']} anni sintetici, catena calibrata su {result['calibration']}. "
+               "P90 = valore superato nel 90% degli anni.")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Energia P50", f"{annual['P50']['energy_kWh']:,.0f} kWh",
+                help=f"P90 {annual['P90']['energy_kWh']:,.0f} kWh · P10 {annual['P10']['energy_kWh']:,.0f} kWh")
+    col2.metric("Energia P90", f"{annual['P90']['energy_kWh']:,.0f} kWh")
+    col3.metric("DLI medio P50 / P90",
+                f"{annual['P50']['DLI_mol_m2_day']:.1f} / {annual['P90']['DLI_mol_m2_day']:.1f} mol/m²/d")
+
+    st.bar_chart(result["monthly"], stack=False, height=220)
+    st.line_chart(result["daily_dli"], height=220)
+    st.download_button(
+        "Scarica CSV mensile",
+        result["monthly"].to_csv().encode("utf-8"),
+        file_name="producibilita_mensile_p50_p90.csv",
+        mime="text/csv",
+        key="ensemble_job_csv"
+    )
+
+
+def display_yield_ensemble(params: dict):
+    """Avvio e consultazione della stima P50/P90 su anni meteo sintetici"""
+    with st.expander("🎲 Producibilità P50/P90", expanded="ensemble" in st.query_params):
+        col1, col2 = st.columns([3, 1], vertical_alignment="bottom")
+        years = col1.number_input(
+            "Anni sintetici", min_value=50, max_value=5000, step=50,
+            value=STOCHASTIC_CONFIG["years"], key="ensemble_years",
+            help="Anni meteo generati dalla catena di Markov sul kc giornaliero e orario"
+        )
+
+        if col2.button("Avvia", key="ensemble_start", width="stretch"):
+            job_id = submit_job(
+                yield_ensemble, {**params, "location": None}, int(years),
+                label=f"{int(years)} anni sintetici", total=int(years)
+            )
+            st.query_params["ensemble"] = job_id
+
+        job_id = st.query_params.get("ensemble")
+        if not job_id:
+            return
+        job = get_job(job_id)
+        if job is None:
+            st.info("La stima richiesta non è più disponibile: avviala di nuovo.")
+        elif is_active(job):
+            job_progress(job_id, unit="anni", key="ensemble_job_cancel")
+        else:
+            display_ensemble_result(job)
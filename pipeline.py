@@ -0,0 +1,191 @@
+"""
+Modulo Pipeline - Ricalcolo incrementale tra un rerun e l'altro
+I calcoli PV e agricoli sono un grafo di stadi con parametri di input dichiarati:
+ogni stadio conserva l'ultimo risultato e viene rieseguito solo se cambiano i
+suoi parametri o uno degli stadi a monte.
+
+    times → [atlas] → solpos → poa → production
+    times → [atlas] → irradiance → poa, t_amb, dli
+    solpos → shadow → shaded_fraction → dli → crop_eval
+    times → weights → production, dli
+    t_amb → period → production
+
+Gli istanti vengono da time_grid (griglia uniforme o solo ore di luce) e ogni
+campione pesa la durata che rappresenta: energia e DLI sono somme pesate; il
+DLI è la media giornaliera sul periodo. Le medie (temperatura celle, ombra,
+irradianza) dividono per la durata dell'intero periodo, notte inclusa.
+"""
+
+import logging
+import profiling
+from agri_calculations import (
+    assemble_agri_results,
+    calculate_dli,
+    calculate_shaded_fraction,
+    calculate_shadow_projection,
+    evaluate_crop_suitability,
+)
+from calculations import (
+    IRRADIANCE_KEYS,
+    assemble_pv_results,
+    calculate_ambient_temperature,
+    calculate_irradiance,
+    calculate_layout_geometry,
+    calculate_poa_global,
+    calculate_pv_production,
+    calculate_solar_position,
+)
+from atlas import site_series
+from config import ATLAS_CONFIG, HECTARE_M2
+from time_grid import TIME_GRID_KEYS, period_grid, sample_weights, simulation_days, time_index
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== STADI ====================
+
+def _stage_shadow(p: dict, solpos):
+    return calculate_shadow_projection(
+        lato_maggiore=p["lato_maggiore"],
+        lato_minore=p["lato_minore"],
+        tilt=p["tilt_pannello"],
+        azimuth_panel=p["azimuth_pannello"],
+        sun_elevation=solpos["elevation"],
+        sun_azimuth=solpos["azimuth"],
+        altezza_suolo=p["altezza_suolo"]
+    )
+
+
+def _stage_shaded_fraction(p: dict, shadow_df):
+    return calculate_shaded_fraction(
+        shadow_df,
+        p["num_panels_total"],
+        p["hectares"] * HECTARE_M2,
+        p["pitch_laterale"]
+    )
+
+
+def _stage_atlas(p: dict, times):
+    """Anno precalcolato del comune, per periodi lunghi a cielo sereno (None altrimenti)"""
+    hours = len(simulation_days(p)) * 24  # durata del periodo, anche senza gli istanti notturni
+    if p.get("atlas_id") is None or p.get("weather_file") or hours < ATLAS_CONFIG["min_hours"]:
+        return None
+    return site_series(p["atlas_id"], times)
+
+
+# (nome, parametri letti, stadi a monte, funzione(parametri, *output a monte))
+STAGES = [
+    ("times", TIME_GRID_KEYS, (),
+     lambda p: time_index(p)),
+    ("weights", (), ("times",),
+     lambda p, times: sample_weights(p, times)),
+    ("geometry", ("hectares", "pitch_laterale", "lato_minore", "carreggiata",
+                  "area_pannello", "num_panels_total", "tilt_pannello"), (),
+     lambda p: calculate_layout_geometry(p)),
+    ("atlas", ("atlas_id", "weather_file"), ("times",), _stage_atlas),
+    ("solpos", ("lat", "lon"), ("times", "atlas"),
+     lambda p, times, atlas: atlas[0] if atlas else calculate_solar_position(times, p["lat"], p["lon"])),
+    ("irradiance", IRRADIANCE_KEYS, ("times", "atlas"),
+     lambda p, times, atlas: atlas[1] if atlas else calculate_irradiance(times, p)),
+    ("poa", ("tilt_pannello", "azimuth_pannello", "albedo"), ("irradiance", "solpos"),
+     lambda p, irradiance, solpos: calculate_poa_global(
+         irradiance, solpos, p["tilt_pannello"], p["azimuth_pannello"], p["albedo"])),
+    ("t_amb", ("lat",), ("times", "irradiance"),
+     lambda p, times, irradiance: calculate_ambient_temperature(times, p["lat"], irradiance)),
+    ("period", TIME_GRID_KEYS, ("t_amb",),
+     lambda p, t_amb: period_grid(p, t_amb)),
+    ("production", ("noct", "eff", "temp_coeff", "area_pannello", "losses", "num_panels_total"),
+     ("poa", "t_amb", "weights", "period"),
+     lambda p, poa, t_amb, weights, period: calculate_pv_production(p, poa, t_amb, weights, period)),
+    ("shadow", ("lato_maggiore", "lato_minore", "tilt_pannello", "azimuth_pannello", "altezza_suolo"),
+     ("solpos",), _stage_shadow),
+    ("shaded_fraction", ("num_panels_total", "hectares", "pitch_laterale"), ("shadow",),
+     _stage_shaded_fraction),
+    ("dli", (), ("irradiance", "shaded_fraction", "weights"),
+     lambda p, irradiance, shaded_fraction, weights: calculate_dli(
+         irradiance["ghi"].round(0).astype(int), shaded_fraction, weights=weights) / len(simulation_days(p))),
+    ("crop_eval", ("crops",), ("dli",),
+     lambda p, dli: evaluate_crop_suitability(dli, p.get("crops", "Cereali"))),
+]
+
+
+# ==================== ESECUZIONE ====================
+
+def required_stages(names) -> set:
+    """Stadi indicati più tutti quelli a monte da cui dipendono"""
+    deps_of = {name: deps for name, _, deps, _ in STAGES}
+    required, pending = set(), list(names)
+    while pending:
+        name = pending.pop()
+        if name not in required:
+            required.add(name)
+            pending.extend(deps_of[name])
+    return required
+
+
+def run_stages(params: dict, memo: dict, check=None, only=None) -> tuple:
+    """
+    Esegue gli stadi in ordine topologico riusando i risultati memorizzati
+
+    Args:
+        params: parametri impianto
+        memo: dizionario persistente tra i rerun (es. in session_state);
+              per ogni stadio conserva (chiave di input, risultato)
+        check: funzione opzionale chiamata prima di ogni stadio; può sollevare
+               un'eccezione per interrompere il calcolo (es. richiesta superata)
+        only: nomi degli stadi richiesti (con quelli a monte); None = tutti
+
+    Returns:
+        tuple: (output per stadio, lista degli stadi rieseguiti)
+    """
+    outputs, keys, ran = {}, {}, []
+    selected = required_stages(only) if only is not None else None
+
+    for name, param_keys, deps, func in STAGES:
+        if selected is not None and name not in selected:
+            continue
+        if check is not None:
+            check()
+        key = (
+            tuple(params.get(k) for k in param_keys),
+            tuple(keys[d] for d in deps)
+        )
+        n_samples = len(outputs["times"]) if "times" in outputs else None
+        cached = memo.get(name)
+        if cached is not None and cached[0] == key:
+            outputs[name] = cached[1]
+            profiling.record(name, cache_hit=True, n_samples=n_samples)
+        else:
+            with profiling.timed(name, cache_hit=False, n_samples=n_samples):
+                outputs[name] = func(params, *(outputs[d] for d in deps))
+            memo[name] = (key, outputs[name])
+            ran.append(name)
+        keys[name] = key
+
+    logger.info("Pipeline: stadi ricalcolati %s", ", ".join(ran) or "nessuno")
+    return outputs, ran
+
+
+def assemble_results(out: dict) -> dict:
+    """Risultati come calculate_all_pv, con "agri_results" come calculate_all_agri"""
+    period_hours = len(out["period"]["t_amb"]) * out["period"]["step_h"]
+    results = assemble_pv_results(
+        out["times"], out["irradiance"], out["solpos"], out["poa"],
+        out["t_amb"], out["geometry"], out["production"], out["weights"], period_hours
+    )
+    results["agri_results"] = assemble_agri_results(
+        out["times"], out["shadow"], out["shaded_fraction"], out["crop_eval"],
+        out["weights"], period_hours
+    )
+    return results
+
+
+def run_pipeline(params: dict, memo: dict) -> dict:
+    """
+    Calcolo PV + agricolo incrementale
+
+    Returns:
+        dict: risultati come calculate_all_pv, con "agri_results" come calculate_all_agri
+    """
+    out, _ = run_stages(params, memo)
+    return assemble_results(out)
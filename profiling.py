@@ -0,0 +1,88 @@
+"""
+Modulo Profiling - Tempi delle fasi di un rerun
+Raccoglie durata, hit di cache e dimensione degli input di ogni fase del rerun
+corrente (per thread di script); a fine rerun scrive una riga JSON nel log,
+che ruota su un solo file precedente oltre PERF_CONFIG["log_max_bytes"].
+Se disattivato, timed() restituisce un contesto vuoto senza misure.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from config import PERF_CONFIG
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return PERF_CONFIG["enabled"]
+
+
+def start_run(**info):
+    """Apre la raccolta per il rerun corrente"""
+    if not is_enabled():
+        return
+    _local.run = {"started": time.time(), "t0": time.perf_counter(), "stages": [], **info}
+
+
+def _active_run():
+    return getattr(_local, "run", None)
+
+
+@contextmanager
+def _timed(run: dict, stage: str, info: dict):
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        run["stages"].append({"stage": stage, "ms": (time.perf_counter() - start) * 1000, **info})
+
+
+def timed(stage: str, **info):
+    """
+    Misura la durata di una fase; `info` (es. cache_hit, n_samples) viene registrato
+
+    Il dizionario restituito da `with timed(...) as info` può essere completato
+    all'interno del blocco (es. con l'esito di una cache).
+    """
+    run = _active_run()
+    if run is None:
+        return nullcontext(info)
+    return _timed(run, stage, info)
+
+
+def record(stage: str, ms: float = 0.0, **info):
+    """Registra una fase senza misurarla (es. risultato servito dalla cache)"""
+    run = _active_run()
+    if run is not None:
+        run["stages"].append({"stage": stage, "ms": ms, **info})
+
+
+def finish_run():
+    """Chiude il rerun corrente, scrive la riga JSON e restituisce il record"""
+    run = _active_run()
+    if run is None:
+        return None
+    _local.run = None
+
+    record_ = {
+        "started": run.pop("started"),
+        "total_ms": (time.perf_counter() - run.pop("t0")) * 1000,
+        **run
+    }
+    write_log(json.dumps(record_, default=str) + "\n")
+    return record_
+
+
+def write_log(line: str):
+    """Aggiunge una riga al log; oltre la dimensione massima lo ruota (log.1, sovrascritto)"""
+    log_path = PERF_CONFIG["log_path"]
+    with _log_lock:
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        if os.path.exists(log_path) and os.path.getsize(log_path) >= PERF_CONFIG["log_max_bytes"]:
+            os.replace(log_path, f"{log_path}.1")
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(line)
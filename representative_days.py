@@ -0,0 +1,234 @@
+"""
+Modulo Giorni Tipici - Simulazione annuale su k giornate rappresentative
+Le giornate del periodo si raggruppano (k-means) per geometria solare e, con un
+file meteo, per condizioni del cielo e temperatura; per ogni gruppo si simula
+con la pipeline completa solo il medoide (la giornata reale più vicina al
+centro), tutti insieme in un'unica esecuzione. Le serie giornaliere si
+ricostruiscono assegnando a ogni giornata il suo medoide, con energia e luce
+riscalate sul rapporto di irradiazione tra la giornata e il medoide.
+"""
+
+import time
+from datetime import date
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pvlib
+from scipy.cluster.vq import kmeans2
+from agri_calculations import evaluate_crop_suitability
+from calculations import approximate_solar_position, build_time_index, calculate_poa_batch, seasonal_temperature
+from config import REPRESENTATIVE_DAYS_CONFIG
+from jobs import JobCancelled
+from pipeline import run_stages
+from simulation import daily_totals, simulate_days
+from timeseries_store import day_of_samples
+from weather import load_weather, weather_for_times
+
+SOLAR_CONSTANT = 1367.0  # W/m²
+
+# Grandezza -> descrittore della giornata a cui è proporzionale (riscalata sul
+# rapporto giornata / medoide); le altre si copiano dal medoide. Il POA
+# giornaliero viene da day_features, con o senza file meteo.
+SCALED = {
+    "energy_total_kWh": "poa_Wh_m2",
+    "POA_kWh_m2": "poa_Wh_m2",
+    "GHI_kWh_m2": "irradiation_Wh_m2",
+    "DLI_mol_m2_day": "irradiation_Wh_m2",
+}
+
+
+# ==================== RAGGRUPPAMENTO ====================
+
+def extraterrestrial_daily(lat: float, doy: np.ndarray) -> tuple:
+    """
+    Geometria solare giornaliera in forma chiusa (Cooper, Duffie-Beckman)
+
+    Returns:
+        tuple: (irradiazione extraterrestre su piano orizzontale [Wh/m²],
+                elevazione a mezzogiorno [°], ore di luce)
+    """
+    phi = np.radians(lat)
+    declination = np.radians(23.45) * np.sin(2 * np.pi * (284 + doy) / 365)
+    sunset = np.arccos(np.clip(-np.tan(phi) * np.tan(declination), -1.0, 1.0))
+    eccentricity = 1 + 0.033 * np.cos(2 * np.pi * doy / 365)
+    h0 = 24 / np.pi * SOLAR_CONSTANT * eccentricity * (
+        np.cos(phi) * np.cos(declination) * np.sin(sunset) + sunset * np.sin(phi) * np.sin(declination))
+    return h0, 90 - np.abs(lat - np.degrees(declination)), 2 * np.degrees(sunset) / 15
+
+
+@lru_cache(maxsize=REPRESENTATIVE_DAYS_CONFIG["site_cache"])
+def _hourly_site(key: tuple) -> dict:
+    params = dict(key)
+    times = build_time_index({**params, "freq": "1h"})
+    zenith, azimuth = approximate_solar_position(times, params["lat"], params["lon"])
+    if params["weather_file"]:
+        irradiance = weather_for_times(load_weather(params["weather_file"]), times)
+    else:
+        site = pvlib.location.Location(params["lat"], params["lon"], tz=str(params["timezone"]))
+        solpos = pd.DataFrame({"apparent_zenith": zenith, "zenith": zenith, "apparent_elevation": 90 - zenith},
+                              index=times)
+        irradiance = site.get_clearsky(times, model="ineichen", solar_position=solpos)
+    series = {col: irradiance[col].to_numpy(dtype=float) for col in ("ghi", "dni", "dhi", "temp_air")
+              if col in irradiance}
+    return {"day": day_of_samples(times, params["data"]), "zenith": zenith, "azimuth": azimuth, **series}
+
+
+def hourly_site(params: dict, start: date, days: int) -> dict:
+    """
+    Passaggio orario economico del sito (posizione solare approssimata e irradianza),
+    in cache per sito e periodo: al cambio del progetto resta solo il POA
+
+    Returns:
+        dict: array orari "zenith", "azimuth", "ghi", "dni", "dhi" (e "temp_air"
+              dal file meteo) con "day", giornata di ogni istante (0 = start)
+    """
+    return _hourly_site((("lat", params["lat"]), ("lon", params["lon"]), ("timezone", params["timezone"]),
+                         ("weather_file", params.get("weather_file")), ("data", start), ("giorni", days)))
+
+
+def day_features(params: dict, start: date, days: int) -> pd.DataFrame:
+    """
+    Descrittori per giornata, senza posizione solare oraria
+
+    Returns:
+        pd.DataFrame: indice "data"; irradiazione [Wh/m²] (extraterrestre a cielo
+                      sereno, GHI del file meteo altrimenti), elevazione a mezzogiorno
+                      [°], ore di luce, temperatura media [°C] e, con file meteo,
+                      frazione diffusa e irradiazione stimata sul piano dei moduli
+    """
+    dates = pd.date_range(start, periods=days, freq="D")
+    _, elevation, daylight = extraterrestrial_daily(params["lat"], dates.dayofyear.to_numpy())
+    features = pd.DataFrame({
+        "elevation_noon": elevation,
+        "daylight_h": daylight,
+        "t_amb_avg": [seasonal_temperature(m, params["lat"])[0] for m in dates.month],
+    }, index=dates.date)
+
+    site = hourly_site(params, start, days)
+    per_day = lambda values: np.bincount(site["day"], weights=values, minlength=days)
+    ghi = per_day(site["ghi"])
+    poa = calculate_poa_batch(site["ghi"], site["dni"], site["dhi"], site["zenith"], site["azimuth"],
+                              params["tilt_pannello"], params["azimuth_pannello"], params["albedo"])
+    features["irradiation_Wh_m2"] = ghi
+    features["poa_Wh_m2"] = per_day(poa)
+    if params.get("weather_file"):
+        features["diffuse_fraction"] = np.divide(per_day(site["dhi"]), ghi, out=np.ones(days), where=ghi > 0)
+    if "temp_air" in site:
+        features["t_amb_avg"] = per_day(site["temp_air"]) / np.bincount(site["day"], minlength=days)
+
+    features.index.name = "data"
+    return features
+
+
+def cluster_days(features: pd.DataFrame, k: int, seed: int = None) -> tuple:
+    """
+    k-means sui descrittori standardizzati
+
+    Returns:
+        tuple: (gruppo di ogni giornata, medoide di ogni gruppo non vuoto {gruppo: data})
+    """
+    values = features.to_numpy(dtype=float)
+    spread = values.std(axis=0)
+    scaled = (values - values.mean(axis=0)) / np.where(spread > 0, spread, 1.0)
+
+    k = min(k, len(features))
+    centroids, labels = kmeans2(scaled, k, minit="++", seed=seed)
+
+    medoids = {}
+    for c in np.unique(labels):
+        members = np.flatnonzero(labels == c)
+        distance = ((scaled[members] - centroids[c]) ** 2).sum(axis=1)
+        medoids[int(c)] = features.index[members[distance.argmin()]]
+    return labels, medoids
+
+
+# ==================== RICOSTRUZIONE ====================
+
+def reconstruct(medoid_daily: pd.DataFrame, features: pd.DataFrame, labels: np.ndarray,
+                medoids: dict, crop: str) -> pd.DataFrame:
+    """Serie giornaliera come simulate_days dai totali dei medoidi"""
+    medoid_of = [medoids[int(c)] for c in labels]
+    daily = medoid_daily.loc[medoid_of].set_axis(features.index)
+
+    for column, feature in SCALED.items():
+        value = features[feature].to_numpy(dtype=float)
+        medoid_value = features[feature].loc[medoid_of].to_numpy(dtype=float)
+        daily[column] = daily[column] * np.divide(value, medoid_value, out=np.zeros_like(value),
+                                                  where=medoid_value > 0)
+
+    daily["crop_light_adequacy_pct"] = [
+        evaluate_crop_suitability(v, crop)["percentage"] for v in daily["DLI_mol_m2_day"]
+    ]
+    return daily
+
+
+def accuracy(approx: pd.DataFrame, full: pd.DataFrame) -> pd.DataFrame:
+    """Errore dei giorni tipici contro la simulazione completa, per energia e DLI"""
+    rows = []
+    for column, label in (("energy_total_kWh", "Energia"), ("DLI_mol_m2_day", "DLI")):
+        a, f = approx[column], full[column]
+        scale = f.abs().mean() or 1.0
+        rows.append({
+            "grandezza": label,
+            "errore_totale_pct": (a.sum() / f.sum() - 1) * 100 if f.sum() else 0.0,
+            "errore_medio_giornaliero_pct": (a - f).abs().mean() / scale * 100,
+            "rmse_giornaliero_pct": np.sqrt(((a - f) ** 2).mean()) / scale * 100,
+        })
+    return pd.DataFrame(rows).set_index("grandezza")
+
+
+# ==================== SIMULAZIONE ====================
+
+def simulate_representative(params: dict, start: date, days: int,
+                            k: int = REPRESENTATIVE_DAYS_CONFIG["clusters"],
+                            freq: str = REPRESENTATIVE_DAYS_CONFIG["freq"],
+                            validate: bool = False, seed: int = REPRESENTATIVE_DAYS_CONFIG["seed"],
+                            progress=None, cancelled=None) -> dict:
+    """
+    Simula `days` giornate da `start` attraverso k giornate tipiche
+
+    Args:
+        params: parametri impianto
+        start, days: periodo da ricostruire
+        k: numero di giornate tipiche (gruppi)
+        freq: passo della simulazione dei medoidi (es. "15min")
+        validate: esegue anche la simulazione completa e ne riporta l'errore
+        progress, cancelled: come per i job (jobs.submit_job)
+
+    Returns:
+        dict: "daily" (serie ricostruita, come simulate_days), "medoids" (giornata
+              tipica e numero di giornate che rappresenta), "accuracy" (DataFrame
+              o None) e "timings" (secondi per giorni tipici ed eventuale completa)
+    """
+    total = 2 * days if validate else days  # avanzamento in giornate ricostruite, poi simulate
+    started = time.perf_counter()
+
+    features = day_features(params, start, days)
+    labels, medoids = cluster_days(features, k, seed)
+    if cancelled is not None and cancelled():
+        raise JobCancelled()
+
+    run = {**params, "data": start, "giorni": days, "freq": freq,
+           "giorni_selezionati": tuple(sorted(medoids.values()))}
+    out, _ = run_stages(run, {})
+    medoid_daily = daily_totals(out, run)
+    daily = reconstruct(medoid_daily, features, labels, medoids, params.get("crops", "Cereali"))
+    timings = {"representative_s": time.perf_counter() - started}
+    if progress is not None:
+        progress(days, total)
+
+    weights = pd.Series(labels).value_counts()
+    medoid_table = pd.DataFrame({
+        "data": [medoids[c] for c in sorted(medoids)],
+        "giorni_rappresentati": [int(weights[c]) for c in sorted(medoids)],
+    }).sort_values("data", ignore_index=True)
+
+    result_accuracy = None
+    if validate:
+        started = time.perf_counter()
+        full = simulate_days(params, start, days, freq=freq, cancelled=cancelled,
+                             progress=None if progress is None else lambda done, _: progress(days + done, total))
+        timings["full_s"] = time.perf_counter() - started
+        result_accuracy = accuracy(daily, full)
+
+    return {"daily": daily, "medoids": medoid_table, "accuracy": result_accuracy, "timings": timings}
@@ -0,0 +1,172 @@
+"""
+Modulo Superficie di Risposta - Stima istantanea di energia annua e DLI
+Per un sito e un anno, energia e DLI variano con continuità con tilt, azimuth e
+pitch: si valutano una volta su una griglia (motore vettoriale di sensitivity)
+e a ogni rerun si interpola in modo trilineare, in pochi microsecondi. Le
+superfici si salvano su disco per contesto (sito, anno, parametri fissi) e
+riportano l'errore misurato su punti di controllo contro la pipeline
+(run_stages), la stessa del calcolo giornaliero, che dà anche il valore esatto.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import uuid
+from datetime import date
+import numpy as np
+from config import CACHE_DIR, RESPONSE_SURFACE_CONFIG
+from jobs import JobCancelled
+from pipeline import run_stages
+from sensitivity import SITE_KEYS, evaluate_all, site_solar_data
+
+SURFACE_DIR = os.path.join(CACHE_DIR, "surfaces")
+
+AXES = ("tilt_pannello", "azimuth_pannello", "pitch_laterale")
+
+# Parametri fissi da cui dipende la superficie (oltre a sito e anno)
+CONTEXT_KEYS = ("lato_maggiore", "lato_minore", "altezza_suolo", "num_panels_total", "hectares",
+                "eff", "noct", "temp_coeff", "losses", "albedo")
+
+_surfaces = {}
+
+
+# ==================== CONTESTO ====================
+
+def annual_params(params: dict) -> dict:
+    """Parametri per l'anno orario che contiene la data della simulazione"""
+    return {**params, "data": date(params["data"].year, 1, 1), "giorni": 365, "freq": "1h"}
+
+
+def surface_key(params: dict) -> str:
+    """Identificativo della superficie: sito, anno e parametri fissi"""
+    annual = annual_params(params)
+    ident = repr([(k, str(annual.get(k))) for k in SITE_KEYS + CONTEXT_KEYS])
+    return hashlib.sha1(ident.encode()).hexdigest()[:16]
+
+
+def grid_axes() -> tuple:
+    """Nodi della griglia per tilt, azimuth e pitch"""
+    return tuple(np.linspace(*RESPONSE_SURFACE_CONFIG["grid"][axis]) for axis in AXES)
+
+
+# ==================== COSTRUZIONE ====================
+
+def _exact(params: dict, points: np.ndarray, cancelled=None) -> np.ndarray:
+    """
+    Energia annua [kWh] e DLI medio giornaliero dalla pipeline per punti (n × 3)
+    di tilt, azimuth, pitch; posizione solare e irradianza si calcolano una volta
+    """
+    def check():
+        if cancelled is not None and cancelled():
+            raise JobCancelled()
+
+    memo, rows = {}, []
+    for point in points:
+        out, _ = run_stages({**params, **dict(zip(AXES, point.tolist()))}, memo, check=check,
+                            only=("production", "crop_eval"))
+        rows.append((out["production"]["energy_total_Wh"] / 1000, out["crop_eval"]["DLI"]))
+    return np.array(rows)
+
+
+def interpolate(surface: dict, tilt: float, azimuth: float, pitch: float) -> tuple:
+    """
+    Interpolazione trilineare (energia annua kWh, DLI medio mol/m²/d)
+
+    Fuori dalla griglia si usa il bordo più vicino. Solo aritmetica Python sui
+    nodi già in lista: nessuna allocazione numpy per la singola richiesta.
+    """
+    corners, weights = [], []
+    for axis, x in zip(surface["axes"], (tilt, azimuth, pitch)):
+        x = min(max(x, axis[0]), axis[-1])
+        i = min(max(bisect.bisect_right(axis, x) - 1, 0), len(axis) - 2)
+        corners.append(i)
+        weights.append((x - axis[i]) / (axis[i + 1] - axis[i]))
+
+    (i, j, k), (u, v, w) = corners, weights
+    result = []
+    for values in surface["values"]:
+        c00 = values[i][j][k] * (1 - w) + values[i][j][k + 1] * w
+        c01 = values[i][j + 1][k] * (1 - w) + values[i][j + 1][k + 1] * w
+        c10 = values[i + 1][j][k] * (1 - w) + values[i + 1][j][k + 1] * w
+        c11 = values[i + 1][j + 1][k] * (1 - w) + values[i + 1][j + 1][k + 1] * w
+        result.append((c00 * (1 - v) + c01 * v) * (1 - u) + (c10 * (1 - v) + c11 * v) * u)
+    return tuple(result)
+
+
+def _as_surface(axes: tuple, energy: np.ndarray, dli: np.ndarray, errors: dict) -> dict:
+    return {
+        "axes": [axis.tolist() for axis in axes],
+        "values": [energy.tolist(), dli.tolist()],
+        "errors": errors,
+    }
+
+
+def build_surface(params: dict, progress=None, cancelled=None) -> dict:
+    """
+    Valuta la griglia, misura l'errore di interpolazione e salva la superficie
+
+    Returns:
+        dict: superficie ("axes", "values" energia/DLI, "errors" per grandezza)
+    """
+    config = RESPONSE_SURFACE_CONFIG
+    annual = annual_params(params)
+    site = site_solar_data(annual)
+    axes = grid_axes()
+
+    mesh = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(AXES))
+    out = evaluate_all(site, annual, {axis: mesh[:, i] for i, axis in enumerate(AXES)},
+                       progress=progress, cancelled=cancelled)
+    shape = tuple(len(axis) for axis in axes)
+    energy = out["energy_total_kWh"].reshape(shape)
+    dli = out["DLI_mol_m2_day"].reshape(shape)
+
+    # Errore contro la pipeline in punti casuali (non sui nodi): include sia
+    # l'interpolazione sia le differenze del motore vettoriale
+    rng = np.random.default_rng(0)
+    low, high = np.array([a[0] for a in axes]), np.array([a[-1] for a in axes])
+    points = low + rng.random((config["validation_points"], len(AXES))) * (high - low)
+    exact = _exact(annual, points, cancelled)
+    surface = _as_surface(axes, energy, dli, {})
+    approx = np.array([interpolate(surface, *p) for p in points])
+    scale = np.maximum(np.abs(exact), 1e-9)
+    rel = np.abs(approx - exact) / scale
+    surface["errors"] = {
+        name: {"p95_pct": float(np.percentile(rel[:, c], 95) * 100), "max_pct": float(rel[:, c].max() * 100)}
+        for c, name in enumerate(("energy", "dli"))
+    }
+
+    save_surface(surface_key(params), surface)
+    return surface
+
+
+# ==================== ARCHIVIO ====================
+
+def save_surface(key: str, surface: dict):
+    """Scrittura atomica su disco e in memoria"""
+    os.makedirs(SURFACE_DIR, exist_ok=True)
+    path = os.path.join(SURFACE_DIR, f"{key}.json")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(surface, f)
+    os.replace(tmp_path, path)
+    _surfaces[key] = surface
+
+
+def load_surface(params: dict):
+    """Superficie per il contesto dei parametri (memoria, poi disco), o None se non ancora costruita"""
+    key = surface_key(params)
+    if key not in _surfaces:
+        path = os.path.join(SURFACE_DIR, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            _surfaces[key] = json.load(f)
+    return _surfaces[key]
+
+
+def exact_annual(params: dict, progress=None, cancelled=None) -> tuple:
+    """Energia annua e DLI medio esatti per i parametri attuali, dalla pipeline sull'anno"""
+    annual = annual_params(params)
+    point = np.array([[params[axis] for axis in AXES]], dtype=float)
+    return tuple(float(v) for v in _exact(annual, point, cancelled)[0])
@@ -0,0 +1,286 @@
+"""
+Modulo Sensibilità - Analisi globale (Morris, Sobol/Saltelli) sui parametri di progetto
+Quali ingressi muovono energia e DLI? I progetti del campionamento si valutano a
+blocchi come array (progetti × istanti): posizione solare, irradianza e
+temperatura del sito si calcolano una volta e restano in cache, POA, produzione,
+ombre e DLI sono le versioni vettoriali delle formule della pipeline. I blocchi
+possono essere distribuiti su un pool di processi (SENSITIVITY_CONFIG["workers"]).
+"""
+
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+from agri_calculations import (
+    PAR_FRACTION,
+    PAR_TO_UMOL,
+    TRANSMISSION_COEFF,
+    calculate_shaded_fraction_batch,
+)
+from calculations import IRRADIANCE_KEYS, calculate_energy_batch, calculate_poa_batch
+from config import SENSITIVITY_CONFIG
+from jobs import JobCancelled
+from pipeline import run_stages
+from time_grid import TIME_GRID_KEYS, simulation_days
+
+# Parametro -> etichetta (la carreggiata non entra nei modelli di energia e DLI:
+# campionarla costerebbe valutazioni per un indice sempre nullo)
+PARAMETERS = {
+    "tilt_pannello": "Tilt [°]",
+    "azimuth_pannello": "Azimuth [°]",
+    "pitch_laterale": "Pitch laterale [m]",
+    "altezza_suolo": "Altezza dal suolo [m]",
+    "albedo": "Albedo",
+    "transmission_under": "Trasmissione sotto i pannelli",
+}
+
+OUTPUTS = ("energy_total_kWh", "DLI_mol_m2_day")
+
+SITE_KEYS = TIME_GRID_KEYS + IRRADIANCE_KEYS + ("atlas_id",)
+
+
+# ==================== DATI DEL SITO ====================
+
+@lru_cache(maxsize=SENSITIVITY_CONFIG["site_cache"])
+def _site_solar_data(key: tuple) -> dict:
+    params = dict(key)
+    out, _ = run_stages(params, {}, only=("solpos", "irradiance", "t_amb", "weights"))
+    solpos, irradiance = out["solpos"], out["irradiance"]
+    # Senza irradianza POA, produzione e DLI sono nulli per ogni progetto: si tengono solo le ore di luce
+    light = (irradiance[["ghi", "dni", "dhi"]] > 0).any(axis=1).to_numpy()
+    return {
+        "elevation": solpos["elevation"].to_numpy(dtype=float)[light],
+        "azimuth": solpos["azimuth"].to_numpy(dtype=float)[light],
+        "zenith": solpos["zenith"].to_numpy(dtype=float)[light],
+        "ghi": irradiance["ghi"].to_numpy(dtype=float)[light],
+        "dni": irradiance["dni"].to_numpy(dtype=float)[light],
+        "dhi": irradiance["dhi"].to_numpy(dtype=float)[light],
+        "t_amb": out["t_amb"].to_numpy(dtype=float)[light],
+        "weights": out["weights"].to_numpy(dtype=float)[light],
+        "days": len(simulation_days(params)),
+    }
+
+
+def site_solar_data(params: dict) -> dict:
+    """Posizione solare, irradianza e temperatura del sito (array), in cache per sito e periodo"""
+    return _site_solar_data(tuple((k, params[k]) for k in SITE_KEYS if k in params))
+
+
+# ==================== VALUTAZIONE A BLOCCHI ====================
+
+def evaluate_designs(site: dict, params: dict, designs: dict) -> dict:
+    """
+    Energia e DLI per ogni progetto
+
+    Args:
+        site: dati del sito (site_solar_data)
+        params: parametri impianto di base
+        designs: array (n,) per ogni parametro variato; gli altri restano quelli di params
+
+    Returns:
+        dict: array (n,) per ogni grandezza di OUTPUTS (energia sul periodo,
+              DLI medio giornaliero)
+    """
+    n = len(next(iter(designs.values())))
+    rows = max(1, SENSITIVITY_CONFIG["chunk_values"] // max(len(site["ghi"]), 1))
+    ghi_int = np.round(site["ghi"])
+    dli_weight = PAR_FRACTION * PAR_TO_UMOL * 3600 / 1e6 * site["weights"] / site["days"]
+
+    energy, dli = np.empty(n), np.empty(n)
+    for start in range(0, n, rows):
+        s = slice(start, start + rows)
+        p = {**params, **{k: v[s, None] for k, v in designs.items()}}
+        transmission = p.get("transmission_under", TRANSMISSION_COEFF["under_panel"])
+
+        poa = calculate_poa_batch(site["ghi"], site["dni"], site["dhi"], site["zenith"], site["azimuth"],
+                                  p["tilt_pannello"], p["azimuth_pannello"], p["albedo"])
+        energy[s] = calculate_energy_batch(poa, site["t_amb"], p, site["weights"])
+
+        shaded = calculate_shaded_fraction_batch(site["elevation"], site["azimuth"], p)
+        dli[s] = (dli_weight * ghi_int * (shaded * transmission + (1 - shaded))).sum(axis=-1)
+
+    return {"energy_total_kWh": energy, "DLI_mol_m2_day": dli}
+
+
+_worker_state = {}
+
+
+def _init_worker(site: dict, params: dict):
+    _worker_state.update(site=site, params=params)
+
+
+def _evaluate_in_worker(designs: dict) -> dict:
+    return evaluate_designs(_worker_state["site"], _worker_state["params"], designs)
+
+
+def evaluate_all(site: dict, params: dict, designs: dict, workers: int = SENSITIVITY_CONFIG["workers"],
+                 progress=None, cancelled=None) -> dict:
+    """
+    Valuta tutti i progetti a blocchi, nel thread corrente o su un pool di processi
+
+    I dati del sito passano ai processi una sola volta (initializer); tra un
+    blocco e l'altro si aggiornano l'avanzamento e si controlla l'annullamento.
+    """
+    n = len(next(iter(designs.values())))
+    rows = max(1, SENSITIVITY_CONFIG["chunk_values"] // max(len(site["ghi"]), 1))
+    chunks = [{k: v[i:i + rows] for k, v in designs.items()} for i in range(0, n, rows)]
+    results = [None] * len(chunks)
+
+    def finished(i, result):
+        results[i] = result
+        if progress is not None:
+            progress(min(n, sum(len(r[OUTPUTS[0]]) for r in results if r is not None)), n)
+
+    if workers <= 1:
+        for i, chunk in enumerate(chunks):
+            if cancelled is not None and cancelled():
+                raise JobCancelled()
+            finished(i, evaluate_designs(site, params, chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(site, params)) as pool:
+            pending = {pool.submit(_evaluate_in_worker, chunk): i for i, chunk in enumerate(chunks)}
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished(pending.pop(future), future.result())
+                if cancelled is not None and cancelled():
+                    for future in pending:
+                        future.cancel()
+                    raise JobCancelled()
+
+    return {k: np.concatenate([r[k] for r in results]) for k in OUTPUTS}
+
+
+# ==================== CAMPIONAMENTO E INDICI ====================
+
+def morris_design(k: int, trajectories: int, levels: int, rng: np.random.Generator) -> tuple:
+    """
+    Traiettorie di Morris nell'ipercubo unitario
+
+    Ogni traiettoria parte da un punto della griglia a `levels` livelli e muove un
+    parametro alla volta (ordine casuale) di ±Δ, con Δ = levels / (2 (levels - 1)).
+
+    Returns:
+        tuple: (punti (traiettorie × (k + 1) × k), ordine dei parametri, segni, Δ)
+    """
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels) / (levels - 1)
+    start = rng.choice(grid[grid <= 1 - delta + 1e-12], size=(trajectories, k))
+    signs = rng.choice((-1.0, 1.0), size=(trajectories, k))
+    start = np.where(signs < 0, start + delta, start)
+    order = np.argsort(rng.random((trajectories, k)), axis=1)
+
+    points = np.repeat(start[:, None, :], k + 1, axis=1)
+    steps = np.zeros((trajectories, k, k))
+    steps[np.arange(trajectories)[:, None], np.arange(k), order] = 1.0
+    points[:, 1:, :] += np.cumsum(steps, axis=1) * signs[:, None, :] * delta
+    return points, order, signs, delta
+
+
+def morris_indices(y: np.ndarray, order: np.ndarray, signs: np.ndarray, delta: float, names: list) -> pd.DataFrame:
+    """μ* (media degli effetti elementari in valore assoluto), μ e σ per parametro"""
+    trajectories, k = order.shape
+    y = y.reshape(trajectories, k + 1)
+    effects = np.empty((trajectories, k))
+    rows = np.arange(trajectories)[:, None]
+    effects[rows, order] = np.diff(y, axis=1) / (signs[rows, order] * delta)
+    return pd.DataFrame({
+        "mu_star": np.abs(effects).mean(axis=0),
+        "mu": effects.mean(axis=0),
+        "sigma": effects.std(axis=0, ddof=1) if trajectories > 1 else np.zeros(k),
+    }, index=pd.Index(names, name="parametro"))
+
+
+def saltelli_design(k: int, samples: int, seed: int = None) -> tuple:
+    """
+    Matrici A, B (Sobol quasi-casuali) e le k matrici A con la colonna i di B
+
+    Returns:
+        tuple: (punti ((k + 2) × n × k), n effettivo, potenza di 2)
+    """
+    m = int(np.ceil(np.log2(max(samples, 2))))
+    base = qmc.Sobol(d=2 * k, scramble=True, seed=seed).random_base2(m)
+    A, B = base[:, :k], base[:, k:]
+    AB = np.repeat(A[None], k, axis=0)
+    AB[np.arange(k), :, np.arange(k)] = B[:, np.arange(k)].T
+    return np.concatenate([A[None], B[None], AB]), len(A)
+
+
+def sobol_indices(y: np.ndarray, k: int, n: int, names: list) -> pd.DataFrame:
+    """Indici del primo ordine S1 (Saltelli 2010) e totali ST (Jansen) per parametro"""
+    y = y.reshape(k + 2, n)
+    y = y - y[:2].mean()  # centrate: stimatori stabili anche se la media supera di molto la dispersione
+    y_A, y_B, y_AB = y[0], y[1], y[2:]
+    variance = np.var(np.concatenate([y_A, y_B]))
+    if variance == 0:
+        return pd.DataFrame({"S1": 0.0, "ST": 0.0}, index=pd.Index(names, name="parametro"))
+    return pd.DataFrame({
+        "S1": (y_B * (y_AB - y_A)).mean(axis=1) / variance,
+        "ST": 0.5 * ((y_A - y_AB) ** 2).mean(axis=1) / variance,
+    }, index=pd.Index(names, name="parametro"))
+
+
+# ==================== ANALISI COMPLETA ====================
+
+def default_ranges(params: dict) -> pd.DataFrame:
+    """Tabella degli intervalli (una riga per parametro) con il valore attuale"""
+    current = {**params, "transmission_under": TRANSMISSION_COEFF["under_panel"]}
+    return pd.DataFrame([
+        {"parametro": name, "descrizione": label, "valore": float(current[name]),
+         "min": SENSITIVITY_CONFIG["ranges"][name][0], "max": SENSITIVITY_CONFIG["ranges"][name][1],
+         "includi": True}
+        for name, label in PARAMETERS.items()
+    ]).set_index("parametro")
+
+
+def run_sensitivity(params: dict, ranges: pd.DataFrame, method: str = "morris", size: int = None,
+                    seed: int = None, workers: int = SENSITIVITY_CONFIG["workers"],
+                    progress=None, cancelled=None) -> dict:
+    """
+    Analisi di sensibilità sui parametri inclusi in `ranges`
+
+    Args:
+        params: parametri impianto (sito, periodo e valori dei parametri non variati)
+        ranges: tabella di default_ranges (min, max, includi)
+        method: "morris" (screening, poche valutazioni) o "sobol" (indici di varianza)
+        size: traiettorie Morris o campioni base Saltelli (default da config)
+        progress, cancelled: come per i job (jobs.submit_job)
+
+    Returns:
+        dict: "indices" (DataFrame per grandezza, ordinato per importanza),
+              "evaluations", "method"
+    """
+    selected = ranges[ranges["includi"].astype(bool)]
+    names = list(selected.index)
+    if not names:
+        raise ValueError("Nessun parametro selezionato")
+    low, high = selected["min"].to_numpy(dtype=float), selected["max"].to_numpy(dtype=float)
+    k = len(names)
+
+    if method == "morris":
+        size = size or SENSITIVITY_CONFIG["morris_trajectories"]
+        points, order, signs, delta = morris_design(
+            k, size, SENSITIVITY_CONFIG["morris_levels"], np.random.default_rng(seed))
+        unit = points.reshape(-1, k)
+    else:
+        size = size or SENSITIVITY_CONFIG["sobol_samples"]
+        points, n = saltelli_design(k, size, seed)
+        unit = points.reshape(-1, k)
+
+    values = low + unit * (high - low)
+    designs = {name: values[:, i] for i, name in enumerate(names)}
+    outputs = evaluate_all(site_solar_data(params), params, designs, workers, progress, cancelled)
+
+    indices = {}
+    for name, y in outputs.items():
+        if method == "morris":
+            table = morris_indices(y, order, signs, delta, names).sort_values("mu_star", ascending=False)
+        else:
+            table = sobol_indices(y, k, n, names).sort_values("ST", ascending=False)
+        table.insert(0, "descrizione", [PARAMETERS[p] for p in table.index])
+        indices[name] = table
+
+    return {"indices": indices, "evaluations": len(values), "method": method}
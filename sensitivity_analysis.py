@@ -0,0 +1,76 @@
+"""
+Modulo Analisi Sensibilità - Classifica dei parametri di progetto per energia e DLI
+L'analisi gira come job in background (id nell'URL, ?sensitivity=...), sulla
+giornata selezionata o su un anno orario del sito.
+"""
+
+from datetime import date
+import streamlit as st
+from config import SENSITIVITY_CONFIG
+from jobs import get_job, is_active, submit_job
+from period_analysis import job_failed, job_progress
+from sensitivity import default_ranges, run_sensitivity
+
+METHODS = {"morris": "Morris (screening)", "sobol": "Sobol / Saltelli"}
+PERIODS = {"giorno": "Giornata selezionata", "anno": "Anno (orario)"}
+OUTPUT_LABELS = {"energy_total_kWh": "⚡ Energia", "DLI_mol_m2_day": "🌱 DLI"}
+
+
+def display_sensitivity_result(job: dict):
+    """Indici ordinati per importanza, uno per grandezza"""
+    if job_failed(job):
+        return
+
+    result = job["result"]
+    main_index = "mu_star" if result["method"] == "morris" else "ST"
+    st.caption(
+        f"{METHODS[result['method']]} · {result['evaluations']:,} valutazioni · "
+        + ("μ*: effetto medio assoluto sull'intero intervallo" if main_index == "mu_star"
+           else "ST: quota di varianza totale, S1: effetto del solo parametro")
+    )
+    for col, (name, table) in zip(st.columns(len(result["indices"])), result["indices"].items()):
+        col.markdown(f"**{OUTPUT_LABELS[name]}**")
+        col.bar_chart(table.set_index("descrizione")[main_index], horizontal=True, height=240)
+        col.dataframe(table.round(3), hide_index=True, width="stretch")
+
+
+def display_sensitivity(params: dict):
+    """Intervalli dei parametri, metodo, avvio del job e risultato"""
+    with st.expander("🎯 Sensibilità ai parametri di progetto", expanded="sensitivity" in st.query_params):
+        ranges = st.data_editor(
+            default_ranges(params),
+            key="sensitivity_ranges",
+            disabled=("parametro", "descrizione", "valore"),
+            width="stretch"
+        )
+
+        col1, col2, col3, col4 = st.columns([2, 2, 2, 1], vertical_alignment="bottom")
+        method = col1.selectbox("Metodo", list(METHODS), format_func=METHODS.get, key="sensitivity_method")
+        period = col2.selectbox("Periodo", list(PERIODS), format_func=PERIODS.get, key="sensitivity_period")
+        default_size = SENSITIVITY_CONFIG["morris_trajectories" if method == "morris" else "sobol_samples"]
+        size = col3.number_input(
+            "Traiettorie" if method == "morris" else "Campioni base",
+            min_value=10, max_value=100_000, value=default_size, step=10,
+            key=f"sensitivity_size_{method}"
+        )
+
+        if col4.button("Avvia", key="sensitivity_start", width="stretch"):
+            run_params = {**params, "location": None}
+            if period == "anno":
+                run_params.update(data=date(params["data"].year, 1, 1), giorni=365, freq="1h")
+            job_id = submit_job(
+                run_sensitivity, run_params, ranges, method, int(size),
+                label=f"{METHODS[method]}, {PERIODS[period].lower()}"
+            )
+            st.query_params["sensitivity"] = job_id
+
+        job_id = st.query_params.get("sensitivity")
+        if not job_id:
+            return
+        job = get_job(job_id)
+        if job is None:
+            st.info("L'analisi richiesta non è più disponibile: avviala di nuovo.")
+        elif is_active(job):
+            job_progress(job_id, unit="valutazioni", key="sensitivity_job_cancel")
+        else:
+            display_sensitivity_result(job)
@@ -6,10 +6,26 @@ Gestisce tutti i parametri di input in modo pulito e organizzato
 from shapely import area
 import streamlit as st
 from datetime import date
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderServiceError, GeocoderTimedOut
-import time
-from config import DEFAULT_PARAMS, LOGO_URL, TIMEZONE_OBJ
+from collections import OrderedDict
+import profiling
+from calculations import calculate_occupied_space, calculate_panel_metrics
+from config import (
+    DEFAULT_PARAMS,
+    GEOCODE_CONFIG,
+    JOBS_CONFIG,
+    LOGO_URL,
+    RESPONSE_SURFACE_CONFIG,
+    SIDEBAR_CONFIG,
+    TIME_GRID_CONFIG,
+    TIMEZONE_OBJ,
+)
+from gazetteer import suggest_comuni
+from geocoding import is_pending, resolve_comune
+from jobs import cancel_job, get_job, is_active, submit_job
+from response_surface import (
+    AXES, annual_params, build_surface, exact_annual, interpolate, load_surface, surface_key
+)
+from weather import coverage_error, save_uploaded_weather
 
 
 # ==================== HEADER SIDEBAR ====================
@@ -61,37 +77,53 @@ def display_sidebar_header():
     """, unsafe_allow_html=True)
 
 
-from functools import lru_cache
+@st.fragment(run_every=GEOCODE_CONFIG["poll_s"])
+def geocode_watcher(comune: str):
+    """Riesegue l'app appena la risoluzione in background del comune è conclusa"""
+    if not is_pending(comune):
+        st.rerun()
 
-@lru_cache(maxsize=200)
-def cached_geocode(comune: str):
-    geolocator = Nominatim(user_agent="resfarm@monitoring.com", timeout=10)
-    return geolocator.geocode(f"{comune}, Italia")
 
-
-def get_location_from_comune(comune: str, max_retries: int = 3):
-    """Ritorna (lat, lon, location) o (None, None, None) se fallisce"""
-    for attempt in range(max_retries):
-        try:
-            if loc := cached_geocode(comune):
-                return loc.latitude, loc.longitude, loc
-        except (GeocoderServiceError, GeocoderTimedOut):
-            time.sleep(attempt + 1)
-        except Exception:
-            break
-
-    return None, None, None
+def get_location_from_comune(comune: str):
+    """
+    Ritorna (lat, lon, location), con location = esito della risoluzione
+    
+    Gazetteer locale, poi cache su disco; una richiesta online prosegue in
+    background e nel frattempo lat/lon sono None con location["status"] == "pending".
+    """
+    with profiling.timed("geocoding") as info:
+        location = resolve_comune(comune, wait=GEOCODE_CONFIG["wait_s"])
+        info["status"] = location["status"]
+    if location["status"] == "found":
+        return location["lat"], location["lon"], location
+    return None, None, location
 
 # ==================== SEZIONI INPUT ====================
 
-def get_location_and_date():
+def get_location_and_date(container=st.sidebar):
     """Raccoglie località e data simulazione"""
-    with st.sidebar.expander("🌍 Localizzazione e Data", expanded=True):
+    with container.expander("🌍 Localizzazione e Data", expanded=True):
         col1, col2 = st.columns(2)
         
         with col1:
-            comune = st.text_input("Comune", value=DEFAULT_PARAMS["comune"])
+            comune = st.text_input(
+                "Comune", value=DEFAULT_PARAMS["comune"],
+                help="Ricerca online (Nominatim) con cache su disco: la prima ricerca di "
+                     "un comune richiede la rete. Solo i 112 capoluoghi di provincia sono "
+                     "nell'elenco locale, con l'anno precalcolato"
+            )
             lat, lon, location = get_location_from_comune(comune)
+            if location["status"] == "pending":
+                # Ultime coordinate note finché la ricerca online non termina
+                st.caption(f"Ricerca di {comune} in corso…")
+                geocode_watcher(comune)
+                lat, lon = st.session_state.get("last_coordinates", (None, None))
+            elif location["status"] == "not_found" and (suggestions := suggest_comuni(comune, limit=5)):
+                st.caption("Forse cercavi: " + ", ".join(
+                    f"{r['comune']} ({r['provincia']})" for r in suggestions
+                ))
+            if lat is not None and lon is not None:
+                st.session_state["last_coordinates"] = (lat, lon)
         
         with col2:
             data_sim = st.date_input("Data", value=date.today())
@@ -108,6 +140,8 @@ def get_location_and_date():
         "lon": lon,
         "timezone": TIMEZONE_OBJ,
         "location": location,
+        # Riga dell'atlante annuale: solo per i capoluoghi del gazetteer con le sue coordinate
+        "atlas_id": location.get("id") if location else None,
         "data": data_sim
     }
 
@@ -263,9 +297,9 @@ def get_all_panel_params():
     }
 
 
-def get_system_params():
+def get_system_params(container=st.sidebar):
     """Raccoglie parametri sistema"""
-    with st.sidebar.expander("⚡ Sistema Elettrico", expanded=False):
+    with container.expander("⚡ Sistema Elettrico", expanded=False):
         col1, col2 = st.columns(2)
         
         losses = col1.number_input(
@@ -292,9 +326,9 @@ def get_system_params():
         "albedo": albedo
     }
 
-def get_agricultural_params():
+def get_agricultural_params(container=st.sidebar):
     """Raccoglie parametri agricoli"""
-    with st.sidebar.expander("🌽 Parametri Agricoli", expanded=False):
+    with container.expander("🌽 Parametri Agricoli", expanded=False):
         hectares = st.number_input(
             "Ettari Totali",
             value=float(DEFAULT_PARAMS["hectares"]),
@@ -326,6 +360,194 @@ def get_agricultural_params():
         "hectares": hectares
     }
 
+def get_weather_params(data: date, container=st.sidebar):
+    """
+    File meteo opzionale al posto dell'irradianza cielo sereno e griglia temporale
+    Una serie storica che non copre la data simulata viene scartata (cielo sereno).
+    """
+    with container.expander("🌦️ Dati Meteo", expanded=False):
+        daylight = st.toggle(
+            "Solo ore di luce",
+            value=TIME_GRID_CONFIG["default"] == "luce",
+            key="time_grid_daylight",
+            help="Salta gli istanti notturni (produzione e luce nulle): stessi totali "
+                 "e stesse medie della griglia completa con circa metà dei calcoli"
+        )
+        grid = {"griglia": "luce" if daylight else "uniforme"}
+
+        uploaded = st.file_uploader(
+            "File meteo (EPW, TMY3, PVGIS TMY, CSV)",
+            type=["epw", "csv"],
+            help="Senza file: cielo sereno (Ineichen) e temperatura stimata. "
+                 "CSV generico: colonne tempo, GHI, DNI, DHI ed eventuale temperatura"
+        )
+        if uploaded is None:
+            st.caption("Irradianza cielo sereno")
+            return {"weather_file": None, **grid}
+
+        try:
+            path, meta = save_uploaded_weather(uploaded.name, uploaded.getvalue())
+        except (ValueError, KeyError) as e:
+            st.error(f"File meteo non leggibile: {e}")
+            return {"weather_file": None, **grid}
+
+        kind = "anno tipico" if meta["typical_year"] else "serie storica"
+        st.caption(f"{meta['format'].upper()} · {kind} · {meta['rows']} righe")
+        error = coverage_error(path, data) if data is not None else None
+        if error:
+            st.error(f"{error}: uso l'irradianza cielo sereno")
+            return {"weather_file": None, **grid}
+        return {"weather_file": path, **grid}
+
+
+# ==================== MODALITÀ SIMULAZIONE SU RICHIESTA ====================
+
+def display_geometry_preview(panel_params: dict, hectares: float):
+    """Anteprima immediata della geometria (calcoli leggeri, nessuna simulazione)"""
+    preview = {**panel_params, "hectares": hectares}
+    panel_metrics = calculate_panel_metrics(preview)
+    gcr = calculate_occupied_space(preview, panel_metrics)["gcr"]
+
+    st.sidebar.caption(
+        f"Anteprima: **{panel_params['num_panels_total']}** pannelli · "
+        f"**{panel_metrics['superficie_totale_pannelli']:.1f}** m² · "
+        f"GCR **{gcr * 100:.1f}%**"
+    )
+
+
+# ==================== STIMA ANNUALE (SUPERFICIE DI RISPOSTA) ====================
+
+# Job condivisi tra le sessioni: costruzione per superficie, calcolo esatto per progetto
+_surface_jobs = {}
+_exact_jobs = OrderedDict()
+# Errori per superficie o progetto: non si ritenta in automatico a ogni rerun
+_annual_failures = {}
+
+
+def _format_annual(energy_kWh: float, dli: float, prefix: str, suffix: str = "") -> str:
+    return f"{prefix} **{energy_kWh / 1000:,.1f}** MWh · DLI **{dli:.1f}** mol/m²/d{suffix}"
+
+
+def _error_once(failure_key, message: str) -> bool:
+    """Mostra l'errore della stima annuale solo la prima volta nella sessione; True se mostrato"""
+    shown = st.session_state.setdefault("annual_errors_shown", set())
+    if failure_key in shown:
+        return False
+    shown.add(failure_key)
+    st.sidebar.error(message)
+    return True
+
+
+@st.fragment(run_every=JOBS_CONFIG["poll_s"])
+def annual_refinement(job_id: str, estimate: str):
+    """Stima interpolata finché il calcolo esatto è in corso, poi il valore esatto"""
+    job = get_job(job_id)
+    if job is not None and job["status"] == "done":
+        st.caption(_format_annual(*job["result"], "Anno (esatto):"))
+    elif job is not None and is_active(job):
+        st.caption(estimate + " · esatto in calcolo…")
+    else:
+        st.caption(estimate)
+
+
+def display_annual_estimate(params: dict):
+    """
+    Energia annua e DLI medio per tilt, azimuth e pitch attuali: subito dalla
+    superficie di risposta (con l'errore misurato), poi esatti da un job in background
+    """
+    if params.get("lat") is None or params.get("data") is None:
+        return
+
+    key = surface_key(params)
+    if key not in _annual_failures and params.get("weather_file"):
+        # Una serie storica deve coprire tutto l'anno della superficie
+        annual = annual_params(params)
+        error = coverage_error(params["weather_file"], annual["data"], annual["giorni"], annual["freq"])
+        if error:
+            _annual_failures[key] = error
+    if key in _annual_failures:
+        if not _error_once(key, f"Stima annuale non disponibile: {_annual_failures[key]}"):
+            st.sidebar.caption("Stima annuale non disponibile")
+        return
+
+    surface = load_surface(params)
+    if surface is None:
+        job = get_job(_surface_jobs[key]) if key in _surface_jobs else None
+        if job is not None and job["status"] == "error":
+            _annual_failures[key] = job["error"]
+            _error_once(key, f"Stima annuale non disponibile: {job['error']}")
+            return
+        if RESPONSE_SURFACE_CONFIG["auto_build"] and job is None:
+            _surface_jobs[key] = submit_job(build_surface, {**params, "location": None},
+                                            label="Superficie di risposta")
+        st.sidebar.caption("Stima annuale: superficie di risposta in preparazione…")
+        return
+
+    design = (key,) + tuple(params[axis] for axis in AXES)
+    job = get_job(_exact_jobs[design]) if design in _exact_jobs else None
+    if job is not None and job["status"] == "error":
+        _annual_failures[design] = job["error"]
+    if design in _annual_failures:
+        _error_once(design, f"Calcolo esatto dell'anno non riuscito: {_annual_failures[design]}")
+    elif job is None:
+        _exact_jobs[design] = submit_job(exact_annual, {**params, "location": None}, label="Anno esatto")
+        while len(_exact_jobs) > JOBS_CONFIG["max_finished"]:
+            cancel_job(_exact_jobs.popitem(last=False)[1])  # progetto superato: si ferma se ancora in corso
+        job = get_job(_exact_jobs[design])
+
+    if job is not None and job["status"] == "done":
+        st.sidebar.caption(_format_annual(*job["result"], "Anno (esatto):"))
+        return
+
+    energy, dli = interpolate(surface, *(params[axis] for axis in AXES))
+    errors = surface["errors"]
+    estimate = _format_annual(
+        energy, dli, "Anno (stima):",
+        f" · errore ≤ {errors['energy']['max_pct']:.1f}% / {errors['dli']['max_pct']:.1f}%"
+    )
+    with st.sidebar:
+        if job is not None and is_active(job):
+            annual_refinement(_exact_jobs[design], estimate)
+        else:
+            st.caption(estimate)
+
+
+def form_sidebar_inputs() -> dict:
+    """
+    Input raggruppati in un form: la simulazione parte solo con "Simula"
+    
+    La geometria dei pannelli resta fuori dal form per l'anteprima live; i
+    rerun che provoca riusano i parametri dell'ultima simulazione.
+    """
+    panel_params = get_all_panel_params()
+
+    form = st.sidebar.form("simulation_form", border=False)
+    with form:
+        location_data = get_location_and_date(form)
+        system = get_system_params(form)
+        crops = get_agricultural_params(form)
+        weather = get_weather_params(location_data["data"], form)
+        submitted = st.form_submit_button("Simula", icon="▶️", type="primary", width="stretch")
+
+    display_geometry_preview(panel_params, crops["hectares"])
+
+    params = {
+        **location_data,
+        **panel_params,
+        **system,
+        **crops,
+        **weather
+    }
+    display_annual_estimate(params)
+
+    if submitted or "simulated_params" not in st.session_state:
+        st.session_state["simulated_params"] = params
+    elif params != st.session_state["simulated_params"]:
+        st.sidebar.info("Parametri modificati: premi **Simula** per aggiornare i risultati.")
+
+    return st.session_state["simulated_params"]
+
+
 # ==================== FUNZIONE PRINCIPALE ====================
 
 def sidebar_inputs():
@@ -333,21 +555,34 @@ def sidebar_inputs():
     Funzione principale - raccoglie tutti gli input utente
     
     Returns:
-        dict: Tutti i parametri raccolti
+        dict: Tutti i parametri raccolti (in modalità form: quelli dell'ultima simulazione)
     """
     
     display_sidebar_header()
+
+    form_mode = st.sidebar.toggle(
+        "Simulazione su richiesta",
+        value=SIDEBAR_CONFIG["form_mode"],
+        key="sidebar_form_mode",
+        help="Raggruppa gli input e ricalcola solo premendo Simula"
+    )
+    if form_mode:
+        return form_sidebar_inputs()
     
     # Raccolta input
     location_data = get_location_and_date()
     panel_params = get_all_panel_params()  
     system = get_system_params()
     crops = get_agricultural_params()
+    weather = get_weather_params(location_data["data"])
 
     # Merge tutti i parametri
-    return {
+    params = {
         **location_data,
         **panel_params,
         **system,
-        **crops
+        **crops,
+        **weather
     }
+    display_annual_estimate(params)
+    return params
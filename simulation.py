@@ -0,0 +1,129 @@
+"""
+Modulo Simulazione - Simulazione su un periodo con totali giornalieri
+Il periodo viene calcolato a blocchi di più giorni, ciascuno con una sola
+esecuzione vettoriale della pipeline, poi suddiviso per giornata; tra un blocco
+e l'altro si aggiornano l'avanzamento e si controlla l'annullamento. Con l'atlante
+annuale la posizione solare e l'irradianza di ogni blocco sono una lettura da file.
+simulate_period conserva anche i contributi di ogni campione in un archivio a
+somme cumulative (timeseries_store) per le finestre di date scelte nell'interfaccia.
+"""
+
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from agri_calculations import calculate_dli_samples, evaluate_crop_suitability
+from jobs import JobCancelled
+from pipeline import run_stages
+from time_grid import simulation_days
+from timeseries_store import SERIES, build_store, day_of_samples, sample_contributions
+
+
+def daily_totals(out: dict, params: dict) -> pd.DataFrame:
+    """
+    Totali e medie per giornata dagli output degli stadi (come in un calcolo giornaliero)
+    Energie e irradiazioni sono somme pesate sulla durata di ogni campione; le
+    medie dividono per la durata dell'intera giornata (stadio "period", notte
+    inclusa). Le giornate senza istanti (notte polare con la griglia delle ore
+    di luce) hanno totali nulli
+    """
+    day = out["times"].date
+    hours = out["weights"]
+    ghi = out["irradiance"]["ghi"]
+    ghi_int = ghi.round(0).astype(int)
+    shaded = out["shaded_fraction"]
+    heating = (out["poa"] / 800) * (params["noct"] - 20)
+    crop = params.get("crops", "Cereali")
+
+    t_amb = out["period"]["t_amb"]
+    full_day = t_amb.index.date
+    day_hours = t_amb.groupby(full_day).size() * out["period"]["step_h"]
+
+    def period_mean(values: pd.Series) -> pd.Series:
+        return (values * hours).groupby(day).sum().reindex(day_hours.index, fill_value=0.0) / day_hours
+
+    dli = calculate_dli_samples(ghi_int, shaded, weights=hours).groupby(day).sum()
+
+    daily = pd.DataFrame({
+        "energy_total_kWh": (out["production"]["power_total_W"] * hours).groupby(day).sum() / 1000,
+        "POA_kWh_m2": (out["poa"] * hours).groupby(day).sum() / 1000,
+        "GHI_kWh_m2": (ghi * hours).groupby(day).sum().round(0) / 1000,
+        "T_cell_avg": t_amb.groupby(full_day).mean() + period_mean(heating),
+        "DLI_mol_m2_day": dli,
+        "crop_light_adequacy_pct": dli.map(lambda v: evaluate_crop_suitability(v, crop)["percentage"]),
+        "shaded_fraction_avg": period_mean(shaded),
+    }).reindex(simulation_days(params)).astype(float)
+    empty = daily["DLI_mol_m2_day"].isna()
+    if empty.any():
+        daily.loc[empty, ["energy_total_kWh", "POA_kWh_m2", "GHI_kWh_m2", "DLI_mol_m2_day"]] = 0.0
+        daily.loc[empty, "crop_light_adequacy_pct"] = evaluate_crop_suitability(0.0, crop)["percentage"]
+    daily.index.name = "data"
+    return daily
+
+
+def iter_chunks(params: dict, start: date, days: int, chunk_days: int = 31, freq: str = "1h",
+                progress=None, cancelled=None):
+    """
+    Esegue la pipeline a blocchi di giornate consecutive
+
+    Yields:
+        tuple: (parametri del blocco, output degli stadi); dopo ogni blocco
+               aggiorna l'avanzamento, prima controlla l'annullamento
+    """
+    memo = {}
+    for offset in range(0, days, chunk_days):
+        if cancelled is not None and cancelled():
+            raise JobCancelled()
+
+        n = min(chunk_days, days - offset)
+        chunk = {**params, "data": start + timedelta(days=offset), "giorni": n, "freq": freq}
+        out, _ = run_stages(chunk, memo)
+        yield chunk, out
+
+        if progress is not None:
+            progress(offset + n, days)
+
+
+def simulate_days(params: dict, start: date, days: int, chunk_days: int = 31, freq: str = "1h",
+                  progress=None, cancelled=None) -> pd.DataFrame:
+    """
+    Simula `days` giornate consecutive a partire da `start`
+
+    Args:
+        params: parametri impianto
+        start: prima giornata
+        days: numero di giornate
+        chunk_days: giornate calcolate in ogni esecuzione della pipeline
+        freq: passo temporale (es. "1h", "15min")
+        progress: funzione opzionale progress(giorni completati, totale)
+        cancelled: funzione opzionale; se restituisce True la simulazione si
+                   interrompe con JobCancelled
+
+    Returns:
+        pd.DataFrame: una riga per giornata (indice "data") con i totali di daily_totals
+    """
+    return pd.concat([
+        daily_totals(out, chunk)
+        for chunk, out in iter_chunks(params, start, days, chunk_days, freq, progress, cancelled)
+    ])
+
+
+def simulate_period(params: dict, start: date, days: int, chunk_days: int = 31, freq: str = "1h",
+                    progress=None, cancelled=None) -> dict:
+    """
+    Come simulate_days, conservando anche i contributi di ogni campione
+
+    Returns:
+        dict: "daily" (come simulate_days) e "store" (timeseries_store, per
+              totali e medie su qualsiasi finestra di date)
+    """
+    chunks, day_of_sample, samples = [], [], []
+    for chunk, out in iter_chunks(params, start, days, chunk_days, freq, progress, cancelled):
+        chunks.append(daily_totals(out, chunk))
+        day_of_sample.append(day_of_samples(out["times"], start))
+        samples.append(sample_contributions(out, chunk))
+
+    contributions = {name: np.concatenate([s[name] for s in samples]) for name in SERIES}
+    return {
+        "daily": pd.concat(chunks),
+        "store": build_store(start, days, np.concatenate(day_of_sample), contributions),
+    }
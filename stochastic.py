@@ -0,0 +1,269 @@
+"""
+Modulo Stocastico - Anni meteo sintetici e bande P50/P90 di energia e DLI
+Il cielo sereno dà solo il limite superiore. L'indice di cielo sereno giornaliero
+(kc = GHI / GHI sereno) segue una catena di Markov a stati discreti con matrici di
+transizione mensili; l'orario aggiunge un rumore AR(1) riscalato in modo da
+conservare il totale del giorno. Tutto è vettoriale su (anni × ore): posizione
+solare, ombre e geometria dell'anno di riferimento si calcolano una volta sola e
+ogni anno sintetico costa solo qualche operazione su array.
+
+Convenzione: P90 è il valore superato nel 90% degli anni (10° percentile).
+"""
+
+import numpy as np
+import pandas as pd
+import pvlib
+from scipy import stats
+from scipy.signal import lfilter
+from agri_calculations import PAR_FRACTION, PAR_TO_UMOL, TRANSMISSION_COEFF, evaluate_crop_suitability
+from config import ATLAS_CONFIG, STOCHASTIC_CONFIG
+from jobs import JobCancelled
+from pipeline import run_stages
+from weather import load_weather
+
+
+# ==================== CATENA DI MARKOV ====================
+
+def state_edges(n_states: int = STOCHASTIC_CONFIG["states"]) -> np.ndarray:
+    """Estremi degli intervalli di kc giornaliero (0-1) corrispondenti agli stati"""
+    return np.linspace(0, 1, n_states + 1)
+
+
+def default_transitions(config: dict = STOCHASTIC_CONFIG) -> np.ndarray:
+    """
+    Matrici di transizione mensili (12 × stati × stati) dalla climatologia in config
+
+    La distribuzione stazionaria è una Beta discretizzata con media kc_mean del mese;
+    con probabilità "persistence" il giorno resta nello stato del precedente,
+    altrimenti lo stato viene estratto dalla distribuzione stazionaria.
+    """
+    edges = state_edges(config["states"])
+    n = config["states"]
+    matrices = np.empty((12, n, n))
+    for m, mean in enumerate(config["kc_mean"]):
+        a, b = mean * config["concentration"], (1 - mean) * config["concentration"]
+        stationary = np.diff(stats.beta.cdf(edges, a, b))
+        stationary /= stationary.sum()
+        rho = config["persistence"]
+        matrices[m] = rho * np.eye(n) + (1 - rho) * stationary
+    return matrices
+
+
+def calibrate_transitions(daily_kc: pd.Series, config: dict = STOCHASTIC_CONFIG) -> np.ndarray:
+    """
+    Matrici di transizione mensili stimate da una serie di kc giornalieri misurati
+
+    I conteggi delle coppie (giorno, giorno successivo) di ogni mese vengono
+    combinati con la matrice di default, che pesa come "prior_days" giorni: un
+    mese con pochi dati resta vicino alla climatologia.
+    """
+    prior = default_transitions(config)
+    edges = state_edges(config["states"])
+    states = np.clip(np.digitize(daily_kc.to_numpy(), edges[1:-1]), 0, config["states"] - 1)
+    months = pd.DatetimeIndex(daily_kc.index).month.to_numpy() - 1
+
+    counts = np.zeros_like(prior)
+    np.add.at(counts, (months[1:], states[:-1], states[1:]), 1)
+    weighted = counts + prior * config["prior_days"] / config["states"]
+    return weighted / weighted.sum(axis=2, keepdims=True)
+
+
+def weather_daily_kc(path: str, lat: float, lon: float) -> pd.Series:
+    """kc giornaliero di un file meteo rispetto al cielo sereno nello stesso sito"""
+    weather = load_weather(path)
+    times = pd.DatetimeIndex(pd.to_datetime(np.asarray(weather["times"]), utc=True))
+    clear = pvlib.location.Location(lat, lon).get_clearsky(times, model="ineichen")["ghi"]
+    ghi = pd.Series(np.asarray(weather["ghi"], dtype=float), index=times)
+    daily = ghi.groupby(times.date).sum() / clear.groupby(times.date).sum()
+    daily.index = pd.to_datetime(daily.index)
+    return daily.clip(0, 1).dropna()
+
+
+def sample_daily_kc(transitions: np.ndarray, months: np.ndarray, years: int,
+                    rng: np.random.Generator, n_states: int = STOCHASTIC_CONFIG["states"]) -> np.ndarray:
+    """Catena di Markov sui giorni, in parallelo su tutti gli anni: kc giornaliero (anni × giorni)"""
+    cumulative = np.cumsum(transitions, axis=2)
+    cumulative[..., -1] = 1.0
+    edges = state_edges(n_states)
+
+    # Stato iniziale dalla distribuzione stazionaria del primo mese
+    stationary = np.cumsum(np.linalg.matrix_power(transitions[months[0]], 64)[0])
+    state = np.minimum((rng.random(years)[:, None] > stationary).sum(1), n_states - 1)
+    states = np.empty((years, len(months)), dtype=np.int64)
+    draws = rng.random((years, len(months)))
+    for d, month in enumerate(months):
+        state = np.minimum((draws[:, d, None] > cumulative[month, state]).sum(1), n_states - 1)
+        states[:, d] = state
+
+    # Valore continuo uniforme all'interno dell'intervallo dello stato
+    return edges[states] + rng.random(states.shape) * np.diff(edges)[states]
+
+
+def hourly_kc(daily_kc: np.ndarray, day_idx: np.ndarray, day_starts: np.ndarray,
+              ghi_clear: np.ndarray, rng: np.random.Generator,
+              config: dict = STOCHASTIC_CONFIG) -> np.ndarray:
+    """
+    kc orario (anni × ore): kc giornaliero più rumore AR(1), più ampio nei giorni
+    di nuvolosità variabile, riscalato perché l'energia del giorno resti quella del kc giornaliero
+    """
+    phi = config["hourly_phi"]
+    noise = lfilter([np.sqrt(1 - phi ** 2)], [1, -phi], rng.standard_normal((len(daily_kc), len(day_idx))), axis=1)
+    kc_day = daily_kc[:, day_idx]
+    kc = np.clip(kc_day + config["hourly_sigma"] * 4 * kc_day * (1 - kc_day) * noise, 0, config["kc_max"])
+
+    target = np.add.reduceat(kc_day * ghi_clear, day_starts, axis=1)
+    actual = np.add.reduceat(kc * ghi_clear, day_starts, axis=1)
+    scale = np.divide(target, actual, out=np.ones_like(target), where=actual > 0)
+    return kc * scale[:, day_idx]
+
+
+# ==================== ANNO DI RIFERIMENTO ====================
+
+def _erbs_diffuse_fraction(kt: np.ndarray) -> np.ndarray:
+    """Frazione diffusa di Erbs in funzione dell'indice di chiarezza"""
+    return np.where(
+        kt <= 0.22, 1 - 0.09 * kt,
+        np.where(kt <= 0.8, 0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4, 0.165)
+    )
+
+
+def reference_year(params: dict) -> dict:
+    """
+    Grandezze dell'anno di riferimento (cielo sereno) su cui si applicano gli anni sintetici
+
+    Returns:
+        dict: array orari di irradianza, fattori di trasposizione sul piano dei
+              moduli, temperatura ambiente e peso DLI (ombra), più gli indici di
+              inizio giorno e mese
+    """
+    # Ore intere: il rumore del kc orario e gli indici di giorno assumono 24 campioni uniformi
+    year = {**params, "data": pd.Timestamp(f"{ATLAS_CONFIG['year']}-01-01").date(),
+            "giorni": 365, "freq": "1h", "griglia": "uniforme", "weather_file": None}
+    out, _ = run_stages(year, {})
+    times, solpos, irradiance = out["times"], out["solpos"], out["irradiance"]
+
+    cos_zenith = np.cos(np.radians(solpos["zenith"].to_numpy()))
+    dni_extra = pvlib.irradiance.get_extra_radiation(times).to_numpy()
+    kt_scale = dni_extra * np.maximum(cos_zenith, 0.065)
+    ghi, dni, dhi = (irradiance[k].to_numpy() for k in ("ghi", "dni", "dhi"))
+    kt_clear = np.clip(np.divide(ghi, kt_scale, out=np.zeros_like(ghi), where=kt_scale > 0), 0, 1)
+
+    # POA isotropico (come calculate_poa_global) = dni·a_beam + dhi·a_sky + ghi·a_ground
+    tilt = np.radians(params["tilt_pannello"])
+    aoi = pvlib.irradiance.aoi(params["tilt_pannello"], params["azimuth_pannello"],
+                               solpos["zenith"], solpos["azimuth"]).to_numpy()
+
+    shaded = out["shaded_fraction"].to_numpy()
+    transmission = shaded * TRANSMISSION_COEFF["under_panel"] + (1 - shaded)
+    dates = times.date
+    day_starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]])
+
+    return {
+        "times": times,
+        "ghi": ghi, "dni": dni, "dhi": dhi,
+        "kt_scale": kt_scale,
+        "diffuse_ratio": dhi / np.maximum(ghi, 1e-9) / _erbs_diffuse_fraction(kt_clear),
+        "beam_clear": ghi - dhi,
+        "a_beam": np.maximum(np.cos(np.radians(aoi)), 0),
+        "a_sky": (1 + np.cos(tilt)) / 2,
+        "a_ground": params["albedo"] * (1 - np.cos(tilt)) / 2,
+        "t_amb": out["t_amb"].to_numpy(),
+        "dli_weight": PAR_FRACTION * PAR_TO_UMOL * 3600 / 1e6 * transmission,
+        "day_idx": np.repeat(np.arange(len(day_starts)), np.diff(np.r_[day_starts, len(times)])),
+        "day_starts": day_starts,
+        "day_months": times.month.to_numpy()[day_starts] - 1,
+        "month_starts": np.flatnonzero(np.r_[True, times.month[1:] != times.month[:-1]]),
+    }
+
+
+# ==================== ENSEMBLE ====================
+
+def _batch_outputs(ref: dict, params: dict, kc: np.ndarray) -> dict:
+    """Energia e DLI di un blocco di anni sintetici dal kc orario"""
+    ghi = kc * ref["ghi"]
+    kt = np.clip(ghi / np.where(ref["kt_scale"] > 0, ref["kt_scale"], np.inf), 0, 1)
+    dhi = np.minimum(ghi * _erbs_diffuse_fraction(kt) * ref["diffuse_ratio"], ghi)
+    beam_ratio = np.divide(ghi - dhi, ref["beam_clear"], out=np.zeros_like(ghi), where=ref["beam_clear"] > 0)
+    dni = ref["dni"] * beam_ratio
+
+    poa = np.round(dni * ref["a_beam"] + dhi * ref["a_sky"] + ghi * ref["a_ground"])
+    T_cell = ref["t_amb"] + (poa / 800) * (params["noct"] - 20)
+    eff_corr = params["eff"] * (1 + params["temp_coeff"] * (T_cell - 25))
+    power_single = np.round(poa * params["area_pannello"] * eff_corr * (1 - params["losses"]))
+    energy_kWh = power_single * params["num_panels_total"] / 1000
+
+    return {
+        "energy_monthly_kWh": np.add.reduceat(energy_kWh, ref["month_starts"], axis=1),
+        "dli_daily": np.add.reduceat(np.round(ghi) * ref["dli_weight"], ref["day_starts"], axis=1),
+    }
+
+
+def exceedance(values: np.ndarray, p: float) -> np.ndarray:
+    """Valore superato con probabilità p% sugli anni (asse 0)"""
+    return np.percentile(values, 100 - p, axis=0)
+
+
+def yield_ensemble(params: dict, years: int = STOCHASTIC_CONFIG["years"], seed: int = None,
+                   progress=None, cancelled=None) -> dict:
+    """
+    Simula `years` anni sintetici e ne riassume energia e DLI in bande di probabilità
+
+    La catena è calibrata sul file meteo di params["weather_file"] se presente,
+    altrimenti sulla climatologia di STOCHASTIC_CONFIG.
+
+    Args:
+        params: parametri impianto
+        years: anni sintetici
+        seed: seme del generatore (riproducibilità)
+        progress, cancelled: come per i job (jobs.submit_job)
+
+    Returns:
+        dict: "annual" (P10/P50/P90 di energia, DLI medio e adeguatezza),
+              "monthly" e "daily_dli" (DataFrame con le bande), "years" e "calibration"
+    """
+    config = STOCHASTIC_CONFIG
+    rng = np.random.default_rng(seed)
+    if params.get("weather_file"):
+        transitions = calibrate_transitions(weather_daily_kc(params["weather_file"], params["lat"], params["lon"]))
+        calibration = "file meteo"
+    else:
+        transitions = default_transitions()
+        calibration = "climatologia"
+
+    ref = reference_year(params)
+    daily = sample_daily_kc(transitions, ref["day_months"], years, rng)
+
+    monthly, dli = [], []
+    for start in range(0, years, config["batch_years"]):
+        if cancelled is not None and cancelled():
+            raise JobCancelled()
+        batch = daily[start:start + config["batch_years"]]
+        kc = hourly_kc(batch, ref["day_idx"], ref["day_starts"], ref["ghi"], rng)
+        out = _batch_outputs(ref, params, kc)
+        monthly.append(out["energy_monthly_kWh"])
+        dli.append(out["dli_daily"])
+        if progress is not None:
+            progress(start + len(batch), years)
+
+    monthly, dli = np.concatenate(monthly), np.concatenate(dli)
+    annual_energy = monthly.sum(axis=1)
+    annual_dli = dli.mean(axis=1)
+    dli_opt = evaluate_crop_suitability(1.0, params.get("crops", "Cereali"))["DLI_opt"]
+    adequacy = (dli / dli_opt * 100).mean(axis=1)
+
+    bands = (10, 50, 90)
+    months = pd.Index(range(1, 13), name="mese")
+    days = pd.Index(ref["times"][ref["day_starts"]].strftime("%m-%d"), name="giorno")
+    return {
+        "annual": {
+            f"P{p}": {
+                "energy_kWh": float(exceedance(annual_energy, p)),
+                "DLI_mol_m2_day": float(exceedance(annual_dli, p)),
+                "crop_light_adequacy_pct": float(exceedance(adequacy, p)),
+            } for p in bands
+        },
+        "monthly": pd.DataFrame({f"P{p}": exceedance(monthly, p) for p in bands}, index=months),
+        "daily_dli": pd.DataFrame({f"P{p}": exceedance(dli, p) for p in bands}, index=days),
+        "years": years,
+        "calibration": calibration,
+    }
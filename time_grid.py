@@ -0,0 +1,128 @@
+"""
+Modulo Griglia Temporale - Campioni solo nelle ore di luce, con pesi di integrazione
+Alba e tramonto si calcolano una volta per giornata e si scartano gli istanti
+del passo scelto che cadono di notte, oltre un margine prima dell'alba e dopo
+il tramonto. Gli istanti restanti sono gli stessi della griglia uniforme: di
+notte irradianza, produzione e luce sono nulle, quindi i totali non cambiano
+ma i campioni da valutare si riducono a circa metà.
+
+Ogni istante pesa la durata del passo (in ore), così anche "15min" integra
+correttamente energia e DLI. Le medie si riferiscono all'intero periodo (stadio
+"period"): la notte conta con temperatura ambiente e ombra e irradianza nulle,
+quindi le due griglie danno gli stessi valori.
+"""
+
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import pvlib
+from calculations import TIME_INDEX_KEYS, build_time_index, calculate_ambient_temperature, step_hours
+from config import TIME_GRID_CONFIG
+from weather import load_weather, weather_for_times
+
+# Parametri da cui dipendono gli istanti (la griglia delle ore di luce dipende anche dal sito)
+TIME_GRID_KEYS = TIME_INDEX_KEYS + ("griglia", "lat", "lon", "weather_file")
+
+NS_PER_HOUR = 3_600_000_000_000
+
+
+def is_daylight_grid(params: dict) -> bool:
+    """Griglia delle sole ore di luce solo se richiesta: senza indicazione resta uniforme"""
+    return params.get("griglia") == "luce"
+
+
+def simulation_days(params: dict) -> list:
+    """Giornate simulate (consecutive o selezionate)"""
+    if params.get("giorni_selezionati"):
+        return sorted(params["giorni_selezionati"])
+    return [params["data"] + timedelta(days=d) for d in range(params.get("giorni", 1))]
+
+
+# ==================== ALBA E TRAMONTO ====================
+
+def sun_events(days: list, lat: float, lon: float) -> tuple:
+    """
+    Alba e tramonto per giornata, con il sole a TIME_GRID_CONFIG["horizon_deg"]
+    (sotto l'orizzonte geometrico, per coprire la rifrazione) in forma chiusa:
+    declinazione ed equazione del tempo di Spencer, angolo orario all'orizzonte
+
+    Returns:
+        tuple: (alba, tramonto) come int64 ns UTC attorno al mezzogiorno solare
+               della data; nella notte polare coincidono, nel giorno polare
+               distano 24 ore
+    """
+    midnight = pd.DatetimeIndex(pd.to_datetime(days)).tz_localize("UTC")
+    doy = midnight.dayofyear
+    declination = pvlib.solarposition.declination_spencer71(doy)
+    equation_of_time = pvlib.solarposition.equation_of_time_spencer71(doy)  # minuti
+
+    phi, horizon = np.radians(lat), np.radians(TIME_GRID_CONFIG["horizon_deg"])
+    cos_omega = (np.sin(horizon) - np.sin(phi) * np.sin(declination)) / (np.cos(phi) * np.cos(declination))
+    half_day = np.degrees(np.arccos(np.clip(cos_omega, -1.0, 1.0))) / 15 * NS_PER_HOUR
+
+    transit = midnight.asi8 + (12 - lon / 15 - equation_of_time / 60) * NS_PER_HOUR
+    return (transit - half_day).astype(np.int64), (transit + half_day).astype(np.int64)
+
+
+# ==================== GRIGLIA DELLE ORE DI LUCE ====================
+
+def build_time_grid(params: dict) -> pd.DatetimeIndex:
+    """Istanti della griglia uniforme nelle ore di luce (più un passo) di ogni giornata"""
+    times = build_time_index(params)
+    if len(times) == 0:
+        return times
+    ns = times.asi8
+
+    # Un passo di margine: si tiene l'ultimo istante buio prima dell'alba e il primo
+    # dopo il tramonto, così ogni istante di luce della griglia uniforme resta. I file
+    # meteo hanno medie orarie (etichetta a inizio o fine ora) interpolate: la luce
+    # può proseguire fino a due ore oltre il tramonto
+    margin = pd.Timedelta(params.get("freq", "1h"))
+    if params.get("weather_file"):
+        margin = max(margin, pd.Timedelta(hours=TIME_GRID_CONFIG["weather_margin_h"]))
+    margin = margin.value
+
+    # La luce di un istante può appartenere alla data locale o a quelle adiacenti
+    # (fuso diverso dalla longitudine, giorno polare)
+    dates, day = np.unique(times.tz_localize(None).normalize(), return_inverse=True)
+    keep = np.zeros(len(times), dtype=bool)
+    for shift in (-1, 0, 1):
+        rise_ns, set_ns = sun_events(dates + np.timedelta64(shift, "D"), float(params["lat"]), float(params["lon"]))
+        rise_ns, set_ns = rise_ns[day], set_ns[day]
+        keep |= (set_ns > rise_ns) & (ns > rise_ns - margin) & (ns < set_ns + margin)
+    return times[keep]
+
+
+# ==================== INTERFACCIA PER LA PIPELINE ====================
+
+def time_index(params: dict) -> pd.DatetimeIndex:
+    """Istanti della simulazione: solo ore di luce o uniforme secondo params["griglia"]"""
+    if is_daylight_grid(params):
+        return build_time_grid(params)
+    return build_time_index(params)
+
+
+def sample_weights(params: dict, times: pd.DatetimeIndex) -> pd.Series:
+    """Peso di ogni istante in ore (durata che rappresenta nell'integrale)"""
+    return pd.Series(step_hours(params), index=times)
+
+
+def period_grid(params: dict, t_amb: pd.Series) -> dict:
+    """
+    Istanti dell'intero periodo per le medie, notte inclusa
+
+    Con le ore di luce la temperatura ambiente notturna non è tra i campioni: si
+    valuta sulla griglia uniforme (modello sinusoidale o file meteo, senza
+    posizione solare né irradianza).
+
+    Returns:
+        dict: "t_amb" (temperatura ambiente sulla griglia uniforme) e "step_h"
+              (ore per istante); la durata del periodo è len(t_amb) * step_h
+    """
+    if is_daylight_grid(params):
+        times = build_time_index(params)
+        weather = {}
+        if params.get("weather_file"):
+            weather = weather_for_times(load_weather(params["weather_file"]), times)
+        t_amb = calculate_ambient_temperature(times, params["lat"], weather)
+    return {"t_amb": t_amb, "step_h": step_hours(params)}
@@ -0,0 +1,120 @@
+"""
+Modulo Archivio Serie Temporali - Totali e medie su finestre di date in tempo costante
+Per ogni campione della simulazione si conservano i contributi di energia,
+irradiazione POA, PAR e DLI (già moltiplicati per la durata del campione) come
+somme cumulative, più l'indice del primo campione di ogni giornata. Il totale
+di una finestra [inizio, fine] è la differenza di due elementi: nessun
+resample dell'intera serie quando cambia l'intervallo scelto.
+"""
+
+from datetime import date
+import numpy as np
+import pandas as pd
+from agri_calculations import PAR_FRACTION, PAR_TO_UMOL, TRANSMISSION_COEFF, evaluate_crop_suitability
+
+# Grandezza -> etichetta (contributi per campione, sommabili su qualsiasi finestra)
+SERIES = {
+    "energy_kWh": "Energia [kWh]",
+    "POA_kWh_m2": "Irradiazione POA [kWh/m²]",
+    "PAR_mol_m2": "PAR a cielo aperto [mol/m²]",
+    "DLI_mol_m2": "Luce per la coltura [mol/m²]",
+    "adequacy_pct": "Adeguatezza luminosa [% × giorni]",  # lineare nel DLI: media = totale / giorni
+}
+
+# Da irradianza [W/m²] per ore a PAR [mol/m²]
+PAR_MOL_PER_WH = PAR_FRACTION * PAR_TO_UMOL * 3600 / 1e6
+
+
+# ==================== COSTRUZIONE ====================
+
+def sample_contributions(out: dict, params: dict,
+                         transmission_under: float = TRANSMISSION_COEFF["under_panel"]) -> dict:
+    """Contributi per campione dagli output degli stadi, con le formule di daily_totals"""
+    hours = out["weights"].to_numpy(dtype=float)
+    par = out["irradiance"]["ghi"].round(0).to_numpy(dtype=float) * hours * PAR_MOL_PER_WH
+    shaded = out["shaded_fraction"].to_numpy(dtype=float)
+    dli = par * (shaded * transmission_under + (1 - shaded))
+    dli_opt = evaluate_crop_suitability(1.0, params.get("crops", "Cereali"))["DLI_opt"]
+    return {
+        "energy_kWh": out["production"]["power_total_W"].to_numpy(dtype=float) * hours / 1000,
+        "POA_kWh_m2": out["poa"].to_numpy(dtype=float) * hours / 1000,
+        "PAR_mol_m2": par,
+        "DLI_mol_m2": dli,
+        "adequacy_pct": dli / dli_opt * 100,
+    }
+
+
+def build_store(start: date, days: int, day_of_sample: np.ndarray, contributions: dict) -> dict:
+    """
+    Somme cumulative dei contributi e indice delle giornate
+
+    Args:
+        start, days: periodo coperto (giornate consecutive)
+        day_of_sample: giornata di ogni campione (0 = start), non decrescente
+        contributions: array per campione per ogni grandezza di SERIES
+
+    Returns:
+        dict: "start", "days", "offsets" (primo campione di ogni giornata, più la
+              fine) e "cumsum" (per grandezza, con uno zero iniziale)
+    """
+    return {
+        "start": start,
+        "days": days,
+        "offsets": np.searchsorted(day_of_sample, np.arange(days + 1)),
+        "cumsum": {name: np.concatenate([[0.0], np.cumsum(contributions[name])]) for name in SERIES},
+    }
+
+
+def day_of_samples(times: pd.DatetimeIndex, start: date) -> np.ndarray:
+    """Giornata locale di ogni istante rispetto a start"""
+    return ((times.tz_localize(None).normalize() - pd.Timestamp(start)) // pd.Timedelta(days=1)).to_numpy()
+
+
+def store_from_daily(daily: pd.DataFrame) -> dict:
+    """Archivio con un campione per giornata dai totali di simulate_days (es. giornate tipiche)"""
+    contributions = {
+        "energy_kWh": daily["energy_total_kWh"].to_numpy(dtype=float),
+        "POA_kWh_m2": daily["POA_kWh_m2"].to_numpy(dtype=float),
+        "PAR_mol_m2": daily["GHI_kWh_m2"].to_numpy(dtype=float) * 1000 * PAR_MOL_PER_WH,
+        "DLI_mol_m2": daily["DLI_mol_m2_day"].to_numpy(dtype=float),
+        "adequacy_pct": daily["crop_light_adequacy_pct"].to_numpy(dtype=float),
+    }
+    return build_store(daily.index[0], len(daily), np.arange(len(daily)), contributions)
+
+
+# ==================== INTERROGAZIONE ====================
+
+def _day_range(store: dict, start: date = None, end: date = None) -> tuple:
+    """Giornate [start, end] come intervallo semiaperto di indici, limitato al periodo"""
+    first = 0 if start is None else min(max((start - store["start"]).days, 0), store["days"])
+    last = store["days"] if end is None else min(max((end - store["start"]).days + 1, first), store["days"])
+    return first, last
+
+
+def window_totals(store: dict, start: date, end: date) -> dict:
+    """
+    Totali delle grandezze nelle giornate da start a end (incluse), in tempo costante
+
+    Returns:
+        dict: totale per grandezza di SERIES più "days" (giornate nella finestra)
+    """
+    first, last = _day_range(store, start, end)
+    s0, s1 = store["offsets"][first], store["offsets"][last]
+    totals = {name: float(cumsum[s1] - cumsum[s0]) for name, cumsum in store["cumsum"].items()}
+    totals["days"] = last - first
+    return totals
+
+
+def window_means(store: dict, start: date, end: date) -> dict:
+    """Medie giornaliere delle grandezze nella finestra (es. DLI medio in mol/m²/d)"""
+    totals = window_totals(store, start, end)
+    days = totals.pop("days")
+    return {name: value / days if days else 0.0 for name, value in totals.items()}
+
+
+def daily_values(store: dict, name: str, start: date = None, end: date = None) -> pd.Series:
+    """Totali giornalieri di una grandezza nella finestra (per i grafici)"""
+    first, last = _day_range(store, start, end)
+    offsets = store["offsets"][first:last + 1]
+    index = pd.date_range(store["start"], periods=store["days"], freq="D").date[first:last]
+    return pd.Series(np.diff(store["cumsum"][name][offsets]), index=pd.Index(index, name="data"), name=name)
@@ -0,0 +1,138 @@
+"""
+Modulo Incertezza - Monte Carlo sui coefficienti del modello
+Efficienza, NOCT, coefficiente di temperatura, perdite, trasmissione sotto i
+pannelli, frazione PAR e conversione µmol/J sono stime puntuali: qui vengono
+campionati da distribuzioni scelte dall'utente e valutati tutti insieme come
+array (campioni × istanti) sugli stessi output solari e di ombra della pipeline,
+senza ripetere posizione solare, POA o ombre per ogni campione.
+"""
+
+import numpy as np
+import pandas as pd
+from agri_calculations import PAR_FRACTION, PAR_TO_UMOL, TRANSMISSION_COEFF, evaluate_crop_suitability
+from calculations import calculate_energy_batch
+from config import UNCERTAINTY_CONFIG
+from pipeline import run_stages
+from time_grid import simulation_days
+
+DISTRIBUTIONS = ("normale", "uniforme", "triangolare", "fisso")
+
+# Parametro -> (etichetta, limiti fisici per il campionamento)
+PARAMETERS = {
+    "eff": ("Efficienza moduli", (0.01, 1.0)),
+    "noct": ("NOCT [°C]", (20.0, 80.0)),
+    "temp_coeff": ("Coeff. temperatura [1/°C]", (-0.02, 0.0)),
+    "losses": ("Perdite di sistema", (0.0, 0.99)),
+    "transmission_under": ("Trasmissione sotto i pannelli", (0.0, 1.0)),
+    "par_fraction": ("Frazione PAR", (0.0, 1.0)),
+    "par_to_umol": ("Conversione PAR [µmol/J]", (3.0, 6.0)),
+}
+
+
+def nominal_values(params: dict) -> dict:
+    """Valori puntuali usati dal modello per ogni parametro incerto"""
+    return {
+        "eff": params["eff"],
+        "noct": params["noct"],
+        "temp_coeff": params["temp_coeff"],
+        "losses": params["losses"],
+        "transmission_under": TRANSMISSION_COEFF["under_panel"],
+        "par_fraction": PAR_FRACTION,
+        "par_to_umol": PAR_TO_UMOL,
+    }
+
+
+def default_spec(params: dict) -> pd.DataFrame:
+    """Tabella delle distribuzioni (una riga per parametro) con i default di config"""
+    nominal = nominal_values(params)
+    return pd.DataFrame([
+        {"parametro": name, "descrizione": PARAMETERS[name][0], "valore": nominal[name],
+         "distribuzione": UNCERTAINTY_CONFIG["defaults"][name][0],
+         "incertezza": UNCERTAINTY_CONFIG["defaults"][name][1]}
+        for name in PARAMETERS
+    ]).set_index("parametro")
+
+
+def sample_parameters(spec: pd.DataFrame, n: int, rng: np.random.Generator) -> dict:
+    """
+    Estrae n campioni per parametro
+
+    "incertezza" è la deviazione standard per la normale e la semiampiezza per
+    uniforme e triangolare (moda nel valore centrale); i campioni sono limitati
+    all'intervallo fisico del parametro.
+    """
+    samples = {}
+    for name, row in spec.iterrows():
+        center, width = float(row["valore"]), abs(float(row["incertezza"]))
+        if row["distribuzione"] == "normale":
+            values = rng.normal(center, width, n)
+        elif row["distribuzione"] == "uniforme":
+            values = rng.uniform(center - width, center + width, n)
+        elif row["distribuzione"] == "triangolare" and width > 0:
+            values = rng.triangular(center - width, center, center + width, n)
+        else:
+            values = np.full(n, center)
+        samples[name] = np.clip(values, *PARAMETERS[name][1])
+    return samples
+
+
+def evaluate_samples(params: dict, out: dict, samples: dict) -> dict:
+    """
+    Energia, DLI e adeguatezza per ogni campione, con le formule di
+    calculate_pv_production (calculate_energy_batch) e calculate_dli in broadcast
+
+    Args:
+        out: output degli stadi (run_stages) per i parametri nominali
+        samples: array di campioni per parametro (stessa lunghezza)
+
+    Returns:
+        dict: array per campione di energy_total_kWh, DLI_mol_m2_day e crop_light_adequacy_pct
+    """
+    poa = out["poa"].to_numpy(dtype=float)
+    t_amb = out["t_amb"].to_numpy(dtype=float)
+    n = len(samples["eff"])
+    chunk = max(1, UNCERTAINTY_CONFIG["chunk_values"] // max(len(poa), 1))
+
+    energy = np.empty(n)
+    for start in range(0, n, chunk):
+        s = slice(start, start + chunk)
+        energy[s] = calculate_energy_batch(poa, t_amb, {
+            **params, **{k: samples[k][s, None] for k in ("noct", "eff", "temp_coeff", "losses")}
+        }, out["weights"].to_numpy(dtype=float))
+
+    # Il DLI è lineare nella trasmissione: bastano le somme pesate di GHI in ombra e al sole
+    ghi = out["irradiance"]["ghi"].round(0).to_numpy(dtype=float) * out["weights"].to_numpy(dtype=float)
+    shaded = out["shaded_fraction"].to_numpy(dtype=float)
+    ghi_shaded, ghi_open = (ghi * shaded).sum(), (ghi * (1 - shaded)).sum()
+    dli = (samples["par_fraction"] * samples["par_to_umol"] * 3600 / 1e6 / len(simulation_days(params))
+           * (ghi_shaded * samples["transmission_under"] + ghi_open))
+
+    dli_opt = evaluate_crop_suitability(1.0, params.get("crops", "Cereali"))["DLI_opt"]
+    return {
+        "energy_total_kWh": energy,
+        "DLI_mol_m2_day": dli,
+        "crop_light_adequacy_pct": dli / dli_opt * 100,
+    }
+
+
+def summarize(values: dict, quantiles=UNCERTAINTY_CONFIG["quantiles"]) -> pd.DataFrame:
+    """Media, deviazione standard e quantili di ogni grandezza (una riga per grandezza)"""
+    return pd.DataFrame({
+        name: {"media": v.mean(), "dev_std": v.std(ddof=1) if len(v) > 1 else 0.0,
+               **{f"P{round(q * 100)}": np.quantile(v, q) for q in quantiles}}
+        for name, v in values.items()
+    }).T
+
+
+def run_uncertainty(params: dict, spec: pd.DataFrame, memo: dict,
+                    n_samples: int = UNCERTAINTY_CONFIG["samples"], seed: int = None) -> dict:
+    """
+    Analisi di incertezza completa: stadi della pipeline (riusati dal memo) e campioni
+
+    Returns:
+        dict: "samples" (parametri campionati), "values" (grandezze per campione), "summary"
+    """
+    out, _ = run_stages(params, memo)
+    samples = sample_parameters(spec, n_samples, np.random.default_rng(seed))
+    values = evaluate_samples(params, out, samples)
+    return {"samples": samples, "values": values, "summary": summarize(values)}
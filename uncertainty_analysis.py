@@ -0,0 +1,73 @@
+"""
+Modulo Analisi Incertezza - Intervalli di confidenza su energia, DLI e adeguatezza
+Le distribuzioni dei coefficienti si modificano in tabella; il calcolo riusa gli
+stadi della pipeline già in sessione ed è abbastanza rapido da girare nel rerun.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from config import UNCERTAINTY_CONFIG
+from uncertainty import DISTRIBUTIONS, default_spec, run_uncertainty
+
+OUTPUTS = {
+    "energy_total_kWh": ("Energia", "kWh", 0),
+    "DLI_mol_m2_day": ("DLI", "mol/m²/d", 1),
+    "crop_light_adequacy_pct": ("Adeguatezza", "%", 0),
+}
+
+
+def display_uncertainty_result(result: dict):
+    """Intervalli P5-P95, istogrammi e campioni esportabili"""
+    summary = result["summary"]
+    n = len(result["values"]["energy_total_kWh"])
+    st.caption(f"{n} campioni · intervallo P5-P95")
+
+    for col, (name, (label, unit, decimals)) in zip(st.columns(len(OUTPUTS)), OUTPUTS.items()):
+        row = summary.loc[name]
+        col.metric(
+            f"{label} P50", f"{row['P50']:,.{decimals}f} {unit}",
+            help=f"P5 {row['P5']:,.{decimals}f} · P95 {row['P95']:,.{decimals}f} {unit}"
+        )
+        counts, edges = np.histogram(result["values"][name], bins=30)
+        col.bar_chart(pd.Series(counts, index=np.round((edges[:-1] + edges[1:]) / 2, decimals)), height=160)
+
+    st.dataframe(summary.round(3), width="stretch")
+    st.download_button(
+        "Scarica campioni CSV",
+        pd.DataFrame({**result["samples"], **result["values"]}).to_csv(index=False).encode("utf-8"),
+        file_name="incertezza_campioni.csv",
+        mime="text/csv",
+        key="uncertainty_csv"
+    )
+
+
+def display_uncertainty(params: dict):
+    """Tabella delle distribuzioni, avvio del Monte Carlo e risultato"""
+    with st.expander("📊 Incertezza del modello", expanded=False):
+        spec = st.data_editor(
+            default_spec(params),
+            key="uncertainty_spec",
+            disabled=("parametro", "descrizione", "valore"),
+            column_config={
+                "distribuzione": st.column_config.SelectboxColumn(options=DISTRIBUTIONS, required=True),
+                "incertezza": st.column_config.NumberColumn(
+                    help="Deviazione standard (normale) o semiampiezza (uniforme, triangolare)",
+                    format="%.4f", min_value=0.0
+                ),
+            },
+            width="stretch"
+        )
+
+        col1, col2 = st.columns([3, 1], vertical_alignment="bottom")
+        n_samples = col1.number_input(
+            "Campioni", min_value=100, max_value=50_000, step=500,
+            value=UNCERTAINTY_CONFIG["samples"], key="uncertainty_samples"
+        )
+        if col2.button("Calcola", key="uncertainty_start", width="stretch"):
+            st.session_state["uncertainty_result"] = run_uncertainty(
+                params, spec, st.session_state.setdefault("pipeline_memo", {}), int(n_samples)
+            )
+
+        if "uncertainty_result" in st.session_state:
+            display_uncertainty_result(st.session_state["uncertainty_result"])
@@ -3,391 +3,158 @@ Modulo Visualizzazione 3D - Campo Fotovoltaico Interattivo
 Crea una rappresentazione tridimensionale del layout dei pannelli
 """
 
+import base64
+import hashlib
+import io
+import json
+import os
+import numpy as np
 import streamlit as st
 import streamlit.components.v1 as components
-import math
+from PIL import Image
+import profiling
+from agri_calculations import calculate_dli_raster
 
 
-def create_3d_field_visualization(params: dict) -> str:
+# ==================== COMPONENTE PERSISTENTE ====================
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "field3d")
+
+# Il componente resta montato tra i rerun: riceve la scena come argomento
+# e applica nel browser solo le differenze rispetto all'ultima ricevuta
+_field3d_component = components.declare_component("field3d", path=FRONTEND_DIR)
+
+
+def build_scene_spec(params: dict) -> dict:
     """
-    Genera il codice HTML/JS per la visualizzazione 3D del campo fotovoltaico
+    Estrae dai parametri impianto la descrizione compatta della scena 3D
     
     Args:
         params: dizionario con tutti i parametri dell'impianto
         
     Returns:
-        str: codice HTML completo per il rendering 3D
+        dict: parametri geometrici serializzabili inviati al componente
     """
-    
-    # Estrazione parametri
-    num_panels_per_row = params.get("num_panels_per_row", 5)
-    num_rows = params.get("num_rows", 2)
-    lato_maggiore = params.get("lato_maggiore", 2.5)
-    lato_minore = params.get("lato_minore", 2.0)
-    tilt = params.get("tilt_pannello", 30)
-    azimuth = params.get("azimuth_pannello", 180)
-    pitch_laterale = params.get("pitch_laterale", 3.0)
-    carreggiata = params.get("carreggiata", 5.0)
-    altezza_suolo = params.get("altezza_suolo", 1.0)
-    
-    # Calcolo dimensioni campo per centratura
-    campo_larghezza = num_panels_per_row * pitch_laterale
-    campo_profondita = num_rows * (lato_minore + carreggiata)
-    
-    html_code = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <style>
-            body {{ 
-                margin: 0; 
-                overflow: hidden; 
-                font-family: 'Inter', sans-serif;
-                background: linear-gradient(135deg, #e8f5e9 0%, #c8e6c9 100%);
-            }}
-            #canvas-container {{ 
-                width: 100%; 
-                height: 600px; 
-                position: relative;
-                border-radius: 12px;
-                overflow: hidden;
-                box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-            }}
-            #info-panel {{
-                position: absolute;
-                top: 15px;
-                left: 15px;
-                background: rgba(255,255,255,0.95);
-                padding: 15px 20px;
-                border-radius: 10px;
-                font-size: 13px;
-                box-shadow: 0 4px 15px rgba(0,0,0,0.15);
-                z-index: 100;
-                backdrop-filter: blur(10px);
-            }}
-            #info-panel h4 {{
-                margin: 0 0 10px 0;
-                color: #74a65b;
-                font-size: 16px;
-                font-weight: 600;
-            }}
-            #info-panel p {{
-                margin: 5px 0;
-                color: #333;
-            }}
-            .info-value {{
-                font-weight: 600;
-                color: #74a65b;
-            }}
-            #controls {{
-                position: absolute;
-                bottom: 15px;
-                left: 15px;
-                background: rgba(255,255,255,0.95);
-                padding: 12px 15px;
-                border-radius: 10px;
-                font-size: 12px;
-                box-shadow: 0 4px 15px rgba(0,0,0,0.15);
-                z-index: 100;
-                backdrop-filter: blur(10px);
-            }}
-            #controls p {{
-                margin: 3px 0;
-                color: #666;
-            }}
-            .control-icon {{
-                display: inline-block;
-                width: 18px;
-                text-align: center;
-                color: #74a65b;
-                font-weight: bold;
-            }}
-        </style>
-    </head>
-    <body>
-        <div id="canvas-container">
-            <div id="info-panel">
-                <h4> Layout Impianto</h4>
-                <p><span class="info-value">{num_panels_per_row * num_rows}</span> pannelli totali</p>
-                <p><span class="info-value">{num_panels_per_row}</span> × <span class="info-value">{num_rows}</span> (file × pannelli)</p>
-                <p>Tilt: <span class="info-value">{tilt}°</span></p>
-                <p>Azimuth: <span class="info-value">{azimuth}°</span></p>
-            </div>
-            
-            <div id="controls">
-                <p><span class="control-icon">🖱️</span> Trascina per ruotare</p>
-                <p><span class="control-icon">🔍</span> Scroll per zoom</p>
-                <p><span class="control-icon">👆</span> Tasto destro per muovere</p>
-            </div>
-        </div>
-
-        <script src="https://cdnjs.cloudflare.com/ajax/libs/three.js/r128/three.min.js"></script>
-        <script>
-            // ========== SETUP SCENA ==========
-            const container = document.getElementById('canvas-container');
-            const scene = new THREE.Scene();
-            scene.background = new THREE.Color(0xe8f5e9);
-            scene.fog = new THREE.Fog(0xe8f5e9, 50, 200);
-
-            // Camera
-            const camera = new THREE.PerspectiveCamera(
-                60, 
-                container.clientWidth / container.clientHeight, 
-                0.1, 
-                1000
-            );
-            camera.position.set(
-                {campo_larghezza * 0.8}, 
-                {campo_profondita * 0.6}, 
-                {campo_larghezza * 0.8}
-            );
-            camera.lookAt(0, 0, 0);
-
-            // Renderer
-            const renderer = new THREE.WebGLRenderer({{ 
-                antialias: true,
-                alpha: true 
-            }});
-            renderer.setSize(container.clientWidth, container.clientHeight);
-            renderer.setPixelRatio(window.devicePixelRatio);
-            renderer.shadowMap.enabled = true;
-            renderer.shadowMap.type = THREE.PCFSoftShadowMap;
-            container.appendChild(renderer.domElement);
-
-            // ========== LUCI ==========
-            const ambientLight = new THREE.AmbientLight(0xffffff, 0.6);
-            scene.add(ambientLight);
-
-            const sunLight = new THREE.DirectionalLight(0xfff5e1, 0.8);
-            sunLight.position.set({campo_larghezza * 2}, {campo_profondita * 3}, {campo_larghezza});
-            sunLight.castShadow = true;
-            sunLight.shadow.mapSize.width = 2048;
-            sunLight.shadow.mapSize.height = 2048;
-            sunLight.shadow.camera.near = 0.5;
-            sunLight.shadow.camera.far = 500;
-            sunLight.shadow.camera.left = -100;
-            sunLight.shadow.camera.right = 100;
-            sunLight.shadow.camera.top = 100;
-            sunLight.shadow.camera.bottom = -100;
-            scene.add(sunLight);
-
-            // ========== TERRENO ==========
-            const groundGeometry = new THREE.PlaneGeometry(
-                {campo_larghezza * 1.5}, 
-                {campo_profondita * 1.5}
-            );
-            const groundMaterial = new THREE.MeshLambertMaterial({{ 
-                color: 0x8bc34a,
-                side: THREE.DoubleSide 
-            }});
-            const ground = new THREE.Mesh(groundGeometry, groundMaterial);
-            ground.rotation.x = -Math.PI / 2;
-            ground.receiveShadow = true;
-            scene.add(ground);
-
-            // Griglia
-            const gridHelper = new THREE.GridHelper(
-                {campo_larghezza * 1.5}, 
-                20, 
-                0x74a65b, 
-                0xa3c68b
-            );
-            gridHelper.material.opacity = 0.3;
-            gridHelper.material.transparent = true;
-            scene.add(gridHelper);
-
-            // ========== CREAZIONE PANNELLI ==========
-            const tiltRad = {tilt} * Math.PI / 180;
-            const azimuthRad = ({azimuth} - 180) * Math.PI / 180;
-
-            // Materiale pannelli
-            const panelMaterial = new THREE.MeshPhongMaterial({{ 
-                color: 0x1a237e,
-                shininess: 60,
-                specular: 0x4444ff,
-                side: THREE.DoubleSide
-            }});
-
-            // Materiale frame
-            const frameMaterial = new THREE.MeshStandardMaterial({{ 
-                color: 0x424242,
-                metalness: 0.6,
-                roughness: 0.4
-            }});
-
-            // Funzione per creare un singolo pannello
-            function createPanel(x, z) {{
-                const panelGroup = new THREE.Group();
-
-                // Superficie del pannello
-                const panelGeom = new THREE.BoxGeometry(
-                    {lato_maggiore}, 
-                    {lato_minore}, 
-                    0.05
-                );
-                const panel = new THREE.Mesh(panelGeom, panelMaterial);
-                panel.castShadow = true;
-                panel.receiveShadow = true;
-                panelGroup.add(panel);
-
-                // Frame perimetrale
-                const frameThickness = 0.08;
-                const frameDepth = 0.06;
-                
-                // Frame superiore
-                const frameTop = new THREE.Mesh(
-                    new THREE.BoxGeometry({lato_maggiore}, frameThickness, frameDepth),
-                    frameMaterial
-                );
-                frameTop.position.y = {lato_minore}/2;
-                panelGroup.add(frameTop);
-                
-                // Frame inferiore
-                const frameBottom = frameTop.clone();
-                frameBottom.position.y = -{lato_minore}/2;
-                panelGroup.add(frameBottom);
-                
-                // Frame sinistro
-                const frameLeft = new THREE.Mesh(
-                    new THREE.BoxGeometry(frameThickness, {lato_minore}, frameDepth),
-                    frameMaterial
-                );
-                frameLeft.position.x = -{lato_maggiore}/2;
-                panelGroup.add(frameLeft);
-                
-                // Frame destro
-                const frameRight = frameLeft.clone();
-                frameRight.position.x = {lato_maggiore}/2;
-                panelGroup.add(frameRight);
+    return {
+        "num_panels_per_row": int(params.get("num_panels_per_row", 5)),
+        "num_rows": int(params.get("num_rows", 2)),
+        "lato_maggiore": float(params.get("lato_maggiore", 2.5)),
+        "lato_minore": float(params.get("lato_minore", 2.0)),
+        "tilt": float(params.get("tilt_pannello", 30)),
+        "azimuth": float(params.get("azimuth_pannello", 180)),
+        "pitch_laterale": float(params.get("pitch_laterale", 3.0)),
+        "carreggiata": float(params.get("carreggiata", 5.0)),
+        "altezza_suolo": float(params.get("altezza_suolo", 1.0)),
+    }
 
-                // Applicazione rotazioni
-                panelGroup.rotation.x = -tiltRad;
-                panelGroup.rotation.y = azimuthRad;
 
-                // Posizionamento
-                const heightOffset = {altezza_suolo} + ({lato_minore}/2) * Math.sin(tiltRad);
-                panelGroup.position.set(x, heightOffset, z);
+# ==================== TEXTURE DLI AL SUOLO ====================
 
-                return panelGroup;
-            }}
+# Parametri che determinano la distribuzione dell'ombra (chiave di cache)
+LAYOUT_KEYS = (
+    "num_panels_per_row", "num_rows", "lato_maggiore", "lato_minore",
+    "tilt_pannello", "azimuth_pannello", "pitch_laterale", "carreggiata", "altezza_suolo",
+)
 
-            // Generazione array di pannelli
-            const startX = -({campo_larghezza} / 2) + ({pitch_laterale} / 2);
-            const startZ = -({campo_profondita} / 2) + (({lato_minore} + {carreggiata}) / 2);
+# Scala colori: rosso → arancio fino a DLI_min, arancio → verde fino a DLI_opt
+DLI_COLOR_STOPS = ("#e74c3c", "#f39c12", "#74a65b", "#38761d")
 
-            for (let row = 0; row < {num_rows}; row++) {{
-                for (let col = 0; col < {num_panels_per_row}; col++) {{
-                    const x = startX + col * {pitch_laterale};
-                    const z = startZ + row * ({lato_minore} + {carreggiata});
-                    const panel = createPanel(x, z);
-                    scene.add(panel);
-                }}
-            }}
 
-            // ========== CONTROLLI MOUSE ==========
-            let isDragging = false;
-            let isPanning = false;
-            let previousMousePosition = {{ x: 0, y: 0 }};
-            const rotationSpeed = 0.005;
-            const panSpeed = 0.05;
+def _hex_to_rgb(color: str) -> list:
+    return [int(color[i:i + 2], 16) for i in (1, 3, 5)]
 
-            renderer.domElement.addEventListener('mousedown', (e) => {{
-                if (e.button === 0) isDragging = true;
-                if (e.button === 2) isPanning = true;
-                previousMousePosition = {{ x: e.clientX, y: e.clientY }};
-            }});
 
-            renderer.domElement.addEventListener('mouseup', () => {{
-                isDragging = false;
-                isPanning = false;
-            }});
+def dli_to_rgb(dli: np.ndarray, dli_min: float, dli_opt: float) -> np.ndarray:
+    """Converte la matrice DLI in pixel RGB (uint8) con la scala della coltura"""
+    stops = [0.0, dli_min, dli_opt, dli_opt * 1.25]
+    colors = np.array([_hex_to_rgb(c) for c in DLI_COLOR_STOPS], dtype=float)
+    rgb = np.stack([np.interp(dli, stops, colors[:, c]) for c in range(3)], axis=-1)
+    return rgb.round().astype(np.uint8)
 
-            renderer.domElement.addEventListener('mousemove', (e) => {{
-                if (isDragging) {{
-                    const deltaX = e.clientX - previousMousePosition.x;
-                    const deltaY = e.clientY - previousMousePosition.y;
 
-                    const rotationQuaternion = new THREE.Quaternion()
-                        .setFromEuler(new THREE.Euler(
-                            deltaY * rotationSpeed,
-                            deltaX * rotationSpeed,
-                            0,
-                            'XYZ'
-                        ));
-
-                    const currentPosition = camera.position.clone();
-                    currentPosition.sub(scene.position);
-                    currentPosition.applyQuaternion(rotationQuaternion);
-                    currentPosition.add(scene.position);
-                    camera.position.copy(currentPosition);
-                    camera.lookAt(scene.position);
-                }}
-
-                if (isPanning) {{
-                    const deltaX = (e.clientX - previousMousePosition.x) * panSpeed;
-                    const deltaY = (e.clientY - previousMousePosition.y) * panSpeed;
-
-                    const right = new THREE.Vector3();
-                    camera.getWorldDirection(right);
-                    right.cross(camera.up).normalize();
-
-                    const up = new THREE.Vector3();
-                    camera.getWorldDirection(up);
-                    up.cross(right).normalize();
-
-                    camera.position.addScaledVector(right, -deltaX);
-                    camera.position.addScaledVector(up, deltaY);
-                }}
-
-                previousMousePosition = {{ x: e.clientX, y: e.clientY }};
-            }});
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_dli_texture(layout: dict, data, lat: float, lon: float,
+                    dli_min: float, dli_opt: float, weather_file, griglia, freq,
+                    _ghi, _solpos, _weights) -> dict:
+    """
+    Genera la texture PNG del DLI al suolo, in cache per layout, data, località
+    e sorgente dell'irradianza
+    
+    GHI, posizione solare e pesi dei campioni (argomenti con underscore) non
+    entrano nella chiave: sono determinati da data, coordinate, file meteo
+    (None = cielo sereno), griglia temporale e passo, passati esplicitamente.
+    """
+    dli = calculate_dli_raster(layout, _ghi, _solpos, weights=_weights)
 
-            renderer.domElement.addEventListener('wheel', (e) => {{
-                e.preventDefault();
-                const zoomSpeed = 0.1;
-                const direction = new THREE.Vector3();
-                camera.getWorldDirection(direction);
-                camera.position.addScaledVector(direction, -e.deltaY * zoomSpeed);
-            }});
+    buffer = io.BytesIO()
+    Image.fromarray(dli_to_rgb(dli, dli_min, dli_opt)).save(buffer, format="PNG", optimize=True)
+    png = buffer.getvalue()
 
-            renderer.domElement.addEventListener('contextmenu', (e) => e.preventDefault());
+    return {
+        "key": hashlib.sha1(png).hexdigest()[:16],
+        "url": "data:image/png;base64," + base64.b64encode(png).decode("ascii"),
+        "dli_min": float(dli_min),
+        "dli_opt": float(dli_opt),
+        "dli_max": float(dli.max()),
+        "colors": list(DLI_COLOR_STOPS),
+    }
 
-            // ========== ANIMAZIONE ==========
-            function animate() {{
-                requestAnimationFrame(animate);
-                renderer.render(scene, camera);
-            }}
-            animate();
 
-            // ========== RESPONSIVE ==========
-            window.addEventListener('resize', () => {{
-                camera.aspect = container.clientWidth / container.clientHeight;
-                camera.updateProjectionMatrix();
-                renderer.setSize(container.clientWidth, container.clientHeight);
-            }});
-        </script>
-    </body>
-    </html>
+def create_3d_field_visualization(params: dict) -> str:
     """
+    Genera il codice HTML/JS autonomo per la visualizzazione 3D del campo fotovoltaico
+    
+    Usa lo stesso frontend del componente, con la scena incorporata nella pagina
+    al posto dei messaggi di Streamlit (utile per esportazioni statiche).
     
-    return html_code
+    Args:
+        params: dizionario con tutti i parametri dell'impianto
+        
+    Returns:
+        str: codice HTML completo per il rendering 3D
+    """
+    with open(os.path.join(FRONTEND_DIR, "index.html"), encoding="utf-8") as f:
+        html_code = f.read()
+
+    scene_script = (
+        "<script>window.FIELD3D_STATIC_SCENE = "
+        f"{json.dumps(build_scene_spec(params))};</script>\n"
+    )
+    return html_code.replace("<script src=", scene_script + "    <script src=", 1)
 
 
-def display_3d_field(params: dict):
+def display_3d_field(params: dict, results: dict = None):
     """
     Visualizza il campo fotovoltaico in 3D nella pagina Streamlit
     
     Args:
         params: dizionario parametri impianto
+        results: risultati PV con "agri_results" (abilita la mappa DLI al suolo)
     """
     st.markdown(
         '<p class="section-header" style="margin-top: 2rem;">Visualizzazione 3D Campo Fotovoltaico</p>',
         unsafe_allow_html=True
     )
     
-    html_content = create_3d_field_visualization(params)
-    components.html(html_content, height=620, scrolling=False)
+    ground = None
+    show_dli = results is not None and st.toggle(
+        "Mostra DLI al suolo",
+        key="field3d_dli_overlay",
+        help="Distribuzione del DLI giornaliero sul terreno, con soglie della coltura"
+    )
+
+    with profiling.timed("3d_scene", n_panels=params.get("num_panels_total"), dli_overlay=show_dli):
+        if show_dli:
+            agri = results["agri_results"]
+            ground = get_dli_texture(
+                {k: params[k] for k in LAYOUT_KEYS},
+                params["data"], params["lat"], params["lon"],
+                agri["DLI_min"], agri["DLI_opt"],
+                params.get("weather_file"), params.get("griglia"), params.get("freq"),
+                results["GHI_Wm2"], results["solpos"], results["sample_weights_h"]
+            )
+
+        _field3d_component(scene=build_scene_spec(params), ground=ground, key="field3d", default=None)
     
     # Info aggiuntive sotto la visualizzazione
     col1, col2, col3 = st.columns(3)
@@ -0,0 +1,234 @@
+"""
+Modulo Meteo - File meteo locali (EPW, TMY3, PVGIS TMY, CSV generico)
+Sostituiscono l'irradianza cielo sereno e la temperatura sinusoidale con dati
+misurati o tipici. Ogni file viene convertito una sola volta in una cache a colonne
+(.npy, un array per grandezza) letta poi in memory-map: un anno intero si carica
+in pochi millisecondi invece di ripetere il parsing del testo.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pvlib
+from config import CACHE_DIR, TIMEZONE
+
+WEATHER_CACHE_DIR = os.path.join(CACHE_DIR, "weather")
+COLUMNS = ("ghi", "dni", "dhi", "temp_air")
+YEAR_S = 365 * 86400
+
+# Nomi accettati per le colonne di un CSV generico (confronto senza maiuscole)
+CSV_ALIASES = {
+    "time": ("time", "timestamp", "datetime", "date", "data", "time(utc)", "ora"),
+    "ghi": ("ghi", "g(h)", "ghi_wm2", "global"),
+    "dni": ("dni", "gb(n)", "dni_wm2", "beam"),
+    "dhi": ("dhi", "gd(h)", "dhi_wm2", "diffuse"),
+    "temp_air": ("temp_air", "t2m", "temp", "temperature", "t_amb", "temperatura"),
+}
+
+
+# ==================== LETTURA FILE ====================
+
+def detect_format(path: str) -> str:
+    """Formato del file: "epw", "tmy3", "pvgis" o "csv" generico"""
+    if path.lower().endswith(".epw"):
+        return "epw"
+    with open(path, encoding="utf-8", errors="replace") as f:
+        first, second = f.readline(), f.readline()
+    if first.startswith("Latitude"):
+        return "pvgis"
+    if second.startswith("Date (MM/DD/YYYY)"):
+        return "tmy3"
+    return "csv"
+
+
+def _read_generic_csv(path: str) -> pd.DataFrame:
+    raw = pd.read_csv(path, sep=None, engine="python")
+    by_name = {c.strip().lower(): c for c in raw.columns}
+
+    columns = {}
+    for name, aliases in CSV_ALIASES.items():
+        found = next((by_name[a] for a in aliases if a in by_name), None)
+        if found is not None:
+            columns[name] = found
+    missing = [c for c in ("time", "ghi", "dni", "dhi") if c not in columns]
+    if missing:
+        raise ValueError(f"Colonne mancanti nel CSV: {', '.join(missing)}")
+
+    times = pd.DatetimeIndex(pd.to_datetime(raw[columns["time"]]))
+    if times.tz is None:
+        # Orari senza fuso: ora locale del simulatore
+        times = times.tz_localize(TIMEZONE, ambiguous="NaT", nonexistent="shift_forward")
+    data = pd.DataFrame(
+        {c: pd.to_numeric(raw[columns[c]], errors="coerce").to_numpy() for c in COLUMNS if c in columns},
+        index=times
+    )
+    return data[data.index.notna()]
+
+
+def read_weather_file(path: str) -> tuple:
+    """
+    Legge un file meteo
+
+    Returns:
+        tuple: (DataFrame con ghi, dni, dhi e, se presente, temp_air; metadati)
+    """
+    fmt = detect_format(path)
+    if fmt == "epw":
+        data, meta = pvlib.iotools.read_epw(path)
+    elif fmt == "tmy3":
+        data, meta = pvlib.iotools.read_tmy3(path, map_variables=True)
+    elif fmt == "pvgis":
+        data, meta = pvlib.iotools.read_pvgis_tmy(path, pvgis_format="csv", map_variables=True)
+    else:
+        data, meta = _read_generic_csv(path), {}
+
+    meta = {
+        "format": fmt,
+        # Anni tipici: i mesi provengono da anni diversi, conta solo la posizione nell'anno
+        "typical_year": fmt != "csv",
+        # EPW e TMY3 riportano la media dell'ora precedente: la si centra a metà intervallo
+        "shift_s": -1800 if fmt in ("epw", "tmy3") else 0,
+        "source": os.path.basename(path),
+        "latitude": meta.get("latitude") if isinstance(meta, dict) else None,
+        "longitude": meta.get("longitude") if isinstance(meta, dict) else None,
+    }
+    return data[[c for c in COLUMNS if c in data.columns]], meta
+
+
+# ==================== CACHE A COLONNE ====================
+
+def _cache_key(path: str) -> str:
+    stat = os.stat(path)
+    ident = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(ident.encode()).hexdigest()[:16]
+
+
+def build_weather_cache(path: str, cache_dir: str) -> None:
+    """Converte il file in array .npy (tempi int64 ns UTC, grandezze float32) più meta.json"""
+    data, meta = read_weather_file(path)
+    data = data.sort_index().dropna(subset=["ghi", "dni", "dhi"])
+    if "temp_air" in data:
+        data["temp_air"] = data["temp_air"].interpolate(limit_direction="both")
+
+    tmp_dir = f"{cache_dir}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    times = data.index.tz_convert("UTC").asi8 + meta["shift_s"] * 10**9
+    np.save(os.path.join(tmp_dir, "times.npy"), times)
+    for col in data.columns:
+        np.save(os.path.join(tmp_dir, f"{col}.npy"), data[col].to_numpy(dtype=np.float32))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({**meta, "columns": list(data.columns), "rows": len(data)}, f, default=str)
+
+    # Pubblicazione atomica: un altro processo non vede mai una cache a metà
+    try:
+        os.replace(tmp_dir, cache_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+@lru_cache(maxsize=16)
+def _load_cached(cache_dir: str) -> dict:
+    with open(os.path.join(cache_dir, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    weather = {"meta": meta, "times": np.load(os.path.join(cache_dir, "times.npy"), mmap_mode="r")}
+    for col in meta["columns"]:
+        weather[col] = np.load(os.path.join(cache_dir, f"{col}.npy"), mmap_mode="r")
+    return weather
+
+
+def load_weather(path: str) -> dict:
+    """
+    Dati del file meteo come array in memory-map, creando la cache al primo uso
+
+    Returns:
+        dict: "times" (int64 ns UTC), una voce per grandezza e "meta"
+    """
+    cache_dir = os.path.join(WEATHER_CACHE_DIR, _cache_key(path))
+    if not os.path.exists(os.path.join(cache_dir, "meta.json")):
+        build_weather_cache(path, cache_dir)
+    return _load_cached(cache_dir)
+
+
+def save_uploaded_weather(name: str, content: bytes) -> tuple:
+    """
+    Salva un file caricato dall'utente (nome derivato dal contenuto) e ne crea la cache
+
+    Returns:
+        tuple: (percorso del file salvato, metadati della cache)
+    """
+    upload_dir = os.path.join(WEATHER_CACHE_DIR, "uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha1(content).hexdigest()[:16]
+    path = os.path.join(upload_dir, f"{digest}{os.path.splitext(name)[1].lower()}")
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(content)
+    return path, load_weather(path)["meta"]
+
+
+# ==================== ALLINEAMENTO ALLA SIMULAZIONE ====================
+
+def _seconds_in_year(ns: np.ndarray) -> np.ndarray:
+    """Secondi trascorsi dall'inizio dell'anno (UTC) per tempi in ns"""
+    years = ns.astype("datetime64[ns]").astype("datetime64[Y]")
+    return (ns - years.astype("datetime64[ns]").astype(np.int64)) / 1e9
+
+
+def _coverage_error(source: np.ndarray, target: np.ndarray) -> str:
+    """Messaggio se gli istanti target (ns UTC) escono dalla serie storica source, altrimenti None"""
+    if target[0] >= source[0] and target[-1] <= source[-1]:
+        return None
+    return (
+        f"Il file meteo copre {pd.Timestamp(source[0], tz='UTC'):%d/%m/%Y}"
+        f"–{pd.Timestamp(source[-1], tz='UTC'):%d/%m/%Y}, fuori dal periodo simulato"
+    )
+
+
+def coverage_error(path: str, start, days: int = 1, freq: str = "1h") -> str:
+    """
+    Controlla prima della simulazione che il file copra le giornate da start
+
+    Gli anni tipici valgono per qualsiasi anno; per i dati storici si verifica
+    la serie uniforme del periodo (la griglia delle ore di luce ne è un sottoinsieme).
+
+    Returns:
+        str: messaggio per l'utente, None se il periodo è coperto
+    """
+    weather = load_weather(path)
+    if weather["meta"]["typical_year"]:
+        return None
+    start = pd.Timestamp(start)
+    times = pd.date_range(start, start + pd.Timedelta(days=days), freq=freq, tz=TIMEZONE, inclusive="left")
+    return _coverage_error(np.asarray(weather["times"]), times.tz_convert("UTC").asi8)
+
+
+def weather_for_times(weather: dict, times: pd.DatetimeIndex) -> pd.DataFrame:
+    """
+    Interpola i dati meteo sugli istanti della simulazione
+
+    Per gli anni tipici conta solo la posizione nell'anno (con continuità tra
+    31/12 e 1/1); per i dati storici il periodo simulato deve essere coperto dal file.
+    """
+    target = times.tz_convert("UTC").asi8
+    source = np.asarray(weather["times"])
+
+    if weather["meta"]["typical_year"]:
+        x, xp = _seconds_in_year(target), _seconds_in_year(source)
+        order = np.argsort(xp, kind="stable")
+        interp = lambda values: np.interp(x, xp[order], np.asarray(values)[order], period=YEAR_S)
+    else:
+        error = _coverage_error(source, target)
+        if error:
+            raise ValueError(error)
+        interp = lambda values: np.interp(target, source, np.asarray(values))
+
+    data = {}
+    for col in weather["meta"]["columns"]:
+        values = interp(weather[col])
+        data[col] = np.clip(values, 0, None) if col != "temp_air" else values
+    return pd.DataFrame(data, index=times)